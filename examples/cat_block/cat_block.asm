@@ -0,0 +1,16 @@
+IOVALUE:
+    WORD 0
+
+BEGIN:  ; input(len(text))
+    IN
+    LD #BUFFER
+    LD IOVALUE
+    INB         ; BUFFER <- text, TOS = BUFFER + len(text)
+    POP
+    LD #BUFFER
+    LD IOVALUE
+    OUTB        ; text -> output
+    HLT
+
+BUFFER:
+    WORD 0
@@ -0,0 +1,64 @@
+import pytest
+from src.components.alu import ALU, MAX_NUMBER, MIN_NUMBER
+from src.isa import ISA, Opcode
+
+# opcode, x (TOS), y (second operand), result, N, Z, V
+ALU_CASES = [
+    (Opcode.CLA, MAX_NUMBER, 0, 0, 0, 1, 0),
+    (Opcode.CLA, MIN_NUMBER, 0, 0, 0, 1, 0),
+    (Opcode.NEG, MAX_NUMBER, 0, -MAX_NUMBER, 1, 0, 0),
+    (Opcode.NEG, MIN_NUMBER, 0, MIN_NUMBER, 1, 0, 1),
+    (Opcode.INC, MAX_NUMBER, 0, MIN_NUMBER, 1, 0, 1),
+    (Opcode.INC, MIN_NUMBER, 0, MIN_NUMBER + 1, 1, 0, 0),
+    (Opcode.DEC, MIN_NUMBER, 0, MAX_NUMBER, 0, 0, 1),
+    (Opcode.DEC, MAX_NUMBER, 0, MAX_NUMBER - 1, 0, 0, 0),
+    (Opcode.NOT, MAX_NUMBER, 0, MIN_NUMBER, 1, 0, 0),
+    (Opcode.NOT, MIN_NUMBER, 0, MAX_NUMBER, 0, 0, 0),
+    (Opcode.NOT, -1, 0, 0, 0, 1, 0),
+    (Opcode.AND, MAX_NUMBER, MIN_NUMBER, 0, 0, 1, 0),
+    (Opcode.AND, -1, MIN_NUMBER, MIN_NUMBER, 1, 0, 0),
+    (Opcode.AND, 0x0F0F, 0x00FF, 0x000F, 0, 0, 0),
+    (Opcode.OR, MAX_NUMBER, MIN_NUMBER, -1, 1, 0, 0),
+    (Opcode.OR, MAX_NUMBER, 0, MAX_NUMBER, 0, 0, 0),
+    (Opcode.ADD, MAX_NUMBER, 1, MIN_NUMBER, 1, 0, 1),
+    (Opcode.ADD, MIN_NUMBER, -1, MAX_NUMBER, 0, 0, 1),
+    (Opcode.ADD, MAX_NUMBER, MIN_NUMBER, -1, 1, 0, 0),
+    (Opcode.ADD, MAX_NUMBER, MAX_NUMBER, -2, 1, 0, 1),
+    (Opcode.SUB, MIN_NUMBER, 1, MAX_NUMBER, 0, 0, 1),
+    (Opcode.SUB, MAX_NUMBER, -1, MIN_NUMBER, 1, 0, 1),
+    (Opcode.SUB, MIN_NUMBER, MIN_NUMBER, 0, 0, 1, 0),
+    (Opcode.CMP, MAX_NUMBER, MAX_NUMBER, 0, 0, 1, 0),
+    (Opcode.CMP, MIN_NUMBER, MAX_NUMBER, 1, 0, 0, 1),
+    (Opcode.MUL, MAX_NUMBER, 2, -2, 1, 0, 1),
+    (Opcode.MUL, MIN_NUMBER, -1, MIN_NUMBER, 1, 0, 1),
+    (Opcode.MUL, MIN_NUMBER, MIN_NUMBER, 0, 0, 1, 1),
+    (Opcode.MUL, MAX_NUMBER, -1, -MAX_NUMBER, 1, 0, 0),
+    (Opcode.DIV, MAX_NUMBER, 2, MAX_NUMBER // 2, 0, 0, 0),
+    (Opcode.DIV, MIN_NUMBER, -1, MIN_NUMBER, 1, 0, 1),
+    (Opcode.DIV, MIN_NUMBER, MAX_NUMBER, -1, 1, 0, 0),
+    (Opcode.DIV, -7, 2, -3, 1, 0, 0),
+    (Opcode.DIV, 7, -2, -3, 1, 0, 0),
+    (Opcode.DIV, 1, MIN_NUMBER, 0, 0, 1, 0),
+    (Opcode.SXTB, MAX_NUMBER, 0, -1, 1, 0, 0),
+    (Opcode.SXTB, MIN_NUMBER, 0, 0, 0, 1, 0),
+    (Opcode.SXTB, 0x7F, 0, 0x7F, 0, 0, 0),
+    (Opcode.BEQ, MAX_NUMBER, MAX_NUMBER, 1, 0, 0, 0),
+    (Opcode.BEQ, MAX_NUMBER, MIN_NUMBER, 0, 0, 1, 0),
+    (Opcode.BGT, MIN_NUMBER, MAX_NUMBER, 0, 0, 1, 0),
+    (Opcode.BGT, MAX_NUMBER, MAX_NUMBER, 1, 0, 0, 0),
+    (Opcode.BLT, MIN_NUMBER, MAX_NUMBER, 1, 0, 0, 0),
+    (Opcode.BLT, MAX_NUMBER, MIN_NUMBER, 0, 0, 1, 0),
+]
+
+
+@pytest.mark.parametrize(("opcode", "x", "y", "result", "n_flag", "z_flag", "v_flag"), ALU_CASES)
+def test_alu_boundaries(opcode, x, y, result, n_flag, z_flag, v_flag):
+    alu = ALU()
+    alu.first_value, alu.second_value = x, y
+    alu.do_operation(opcode)
+    assert isinstance(alu.value, int)
+    assert (alu.value, alu.n_flag, alu.z_flag, alu.v_flag) == (result, n_flag, z_flag, v_flag)
+
+
+def test_alu_covers_all_operations():
+    assert {case[0] for case in ALU_CASES} == {opcode for opcode, info in ISA.items() if info.alu is not None}
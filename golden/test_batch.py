@@ -0,0 +1,57 @@
+import io
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+import src.batch as batch
+import src.machine as machine
+import src.translator as translator
+
+INPUTS = ["i wanna die", "", "hello\nworld", "[20, 1, 2]"]
+
+
+def expected_result(code_file, input_file, output_mode):
+    input_tokens = machine.load_input(input_file)
+    output = io.StringIO()
+    instructions, ticks = machine.simulation(
+        machine.load_code(code_file), input_tokens, machine.INSTRUCTION_LIMIT, output, output_mode)
+    return {"case": input_file, "output": output.getvalue(), "instructions": instructions, "ticks": ticks}
+
+
+@pytest.mark.golden_test("golden/cat.yml")
+def test_run_batch_directory_and_manifest(golden):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        code_file = os.path.join(tmpdir, "code.json")
+        translator.write_code(code_file, translator.translate(golden["in_source"]))
+        inputs_dir = os.path.join(tmpdir, "inputs")
+        Path(inputs_dir).mkdir()
+        for number, text in enumerate(INPUTS):
+            with open(os.path.join(inputs_dir, "{}.txt".format(number)), "w", encoding="utf-8") as file:
+                file.write(text)
+        broken = os.path.join(inputs_dir, "9.txt")
+        with open(broken, "w", encoding="utf-8") as file:
+            file.write("[1, x]")
+        manifest = os.path.join(tmpdir, "manifest.txt")
+        with open(manifest, "w", encoding="utf-8") as file:
+            file.write("inputs/3.txt\n\ninputs/9.txt\ninputs/0.txt\n")
+
+        input_files = batch.list_inputs(inputs_dir)
+        assert input_files == [os.path.join(inputs_dir, "{}.txt".format(number)) for number in (0, 1, 2, 3, 9)]
+        results = batch.run_batch(code_file, input_files, golden["output_mode"], workers=2)
+        expected = [expected_result(code_file, name, golden["output_mode"]) for name in input_files[:-1]]
+        assert results[:-1] == expected
+        assert results[-1]["case"] == broken
+        assert "InputFormatError" in results[-1]["error"]
+
+        manifest_files = batch.list_inputs(manifest)
+        assert manifest_files == [os.path.join(tmpdir, "inputs", name) for name in ("3.txt", "9.txt", "0.txt")]
+        results = batch.run_batch(code_file, manifest_files, golden["output_mode"], workers=1)
+        assert [results[0], results[2]] == [expected[3], expected[0]]
+        assert "error" in results[1]
+
+
+def test_simulate_case_error():
+    code = machine.to_machine_code(translator.translate("IOVALUE:\n    WORD 0\n    IN\n    IN\n    HLT"))
+    assert "error" in batch.simulate_case(code, [0], "text")
+    assert batch.simulate_case(code, [1, "a"], "text") == {"output": "", "instructions": 2, "ticks": 14}
@@ -0,0 +1,44 @@
+import pytest
+import src.bench as bench
+
+
+def test_no_regressions_against_baseline():
+    # ratios are compared, the stored baseline is valid on any host
+    results = bench.check(names=bench.GATE_CASES, measure_memory=False)
+    assert {name.split("/")[0] for name in results} == set(bench.GATE_CASES)
+
+
+def test_compare_reports_regressions():
+    baseline = {
+        "hello/fast": {"instructions": 10, "ticks": 80, "relative_speed": 1.0, "speedup": 5.0, "peak_memory": 1000},
+        "cat/fast": {"instructions": 10, "ticks": 80, "relative_speed": 1.0, "speedup": 5.0},
+    }
+    results = {
+        "hello/fast": {"instructions": 10, "ticks": 80, "relative_speed": 0.8, "speedup": 3.0, "peak_memory": 1500},
+        "cat/fast": {"instructions": 11, "ticks": 80, "relative_speed": 1.5, "speedup": 6.0},
+        "new/fast": {"instructions": 1, "ticks": 1, "relative_speed": 0.1},
+    }
+    assert bench.compare(results, baseline, 0.3) == [
+        "hello/fast speedup: 3.000 < 5.000",
+        "hello/fast peak_memory: 1500 > 1000",
+        "cat/fast instructions: 11 != 10",
+    ]
+
+
+def test_median_results():
+    runs = [{"hello/fast": {"instructions": 10, "speedup": speedup, "relative_speed": 0.1}} for speedup in (3, 9, 5)]
+    assert bench.median_results(runs) == {"hello/fast": {"instructions": 10, "speedup": 5, "relative_speed": 0.1}}
+
+
+def test_regression_fails_check(tmp_path, monkeypatch):
+    baseline_file = tmp_path / "baseline.json"
+    case = bench.long_loop(1)
+    case.source, case.expected = case.source.replace("WORD 20000", "WORD 500"), "500 "
+    monkeypatch.setattr(bench, "BASELINE_RUNS", 1)
+    monkeypatch.setattr(bench, "TRANSLATE_LINES", 100)
+    monkeypatch.setattr(bench, "cases", lambda scale: [case])
+    bench.main("save", baseline_file)
+    # the fast engine runs the reference one: the speedup is gone, the counters are the same
+    monkeypatch.setitem(bench.ENGINES, "fast", bench.machine.simulation)
+    with pytest.raises(bench.BenchmarkRegressionError, match="long_loop/fast speedup"):
+        bench.check(baseline_file, names=["long_loop"], measure_memory=False)
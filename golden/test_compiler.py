@@ -0,0 +1,98 @@
+import io
+import itertools
+
+import pytest
+import src.bench as bench
+import src.compiler as compiler
+import src.machine as machine
+import src.snapshot as snapshot
+import src.translator as translator
+from src.fast import FastControlUnit
+from src.isa import ISA
+
+# the instruction at PATCH is replaced by DEC after the first iteration
+SELF_MODIFYING = "\n".join([
+    "IOVALUE:", "    WORD 0", "BEGIN:", "    CLA",
+    *bench.counted_loop(["PATCH:", "    INC", "    LD NEWOP", "    ST PATCH", "    POP"]),
+    "    ST IOVALUE", "    OUT", "    HLT",
+    "NEWOP:", "    DEC",
+    "CNT:", "    WORD 5",
+])
+STACK_OVERFLOW = "IOVALUE:\n    WORD 0\nBEGIN:\nLOOP:\n    DUP\n    INC\n    JUMP LOOP"
+STACK_UNDERFLOW = "IOVALUE:\n    WORD 0\nBEGIN:\n    LD #1\nLOOP:\n    ADD\n    JUMP LOOP"
+
+CASES = [
+    ("long_loop", bench.long_loop(1)),
+    ("deep_calls", bench.deep_calls(1)),
+    ("post_inc", bench.post_inc(1, 50)),
+    ("big_input", bench.big_input(1, 200)),
+    ("self_modifying", bench.Case("self_modifying", SELF_MODIFYING, [0], "numeric")),
+    *((case.name, case) for case in bench.examples()),
+]
+# every cut point of the first instructions and then a sparse grid through the loops
+LIMITS = [*range(1, 60), *range(60, 3000, 89)]
+
+
+def machine_code(source):
+    return machine.to_machine_code(translator.translate(source))
+
+
+def final_state(engine, code, input_tokens, limit):
+    data_path = machine.DataPath(code, machine.INSTRUCTION_LIMIT, input_tokens[0])
+    io_controller = machine.IOController(data_path, input_tokens, 0, io.StringIO(), "numeric")
+    control_unit = engine(data_path, io_controller)
+    instructions = control_unit.run(limit)
+    return snapshot.capture(control_unit, instructions, control_unit.halted)
+
+
+@pytest.mark.parametrize(("name", "case"), CASES, ids=[name for name, _ in CASES])
+def test_state_matches_fast_engine(name, case):
+    code = machine_code(case.source)
+    for limit in LIMITS:
+        expected = final_state(FastControlUnit, code, case.input_tokens, limit)
+        actual = final_state(compiler.BlockControlUnit, code, case.input_tokens, limit)
+        assert snapshot.diff(expected, actual) == [], "{} differs after {} instructions".format(name, limit)
+        if expected["halted"]:
+            break
+
+
+def test_self_modifying_code():
+    code = machine_code(SELF_MODIFYING)
+    results = []
+    for simulation in (machine.simulation, compiler.compiled_simulation):
+        output = io.StringIO()
+        results.append((simulation(code, [0], machine.INSTRUCTION_LIMIT, output, "numeric"), output.getvalue()))
+    assert results[0] == results[1]
+    assert results[0][1] == "-3 "
+
+
+@pytest.mark.parametrize("source", [STACK_OVERFLOW, STACK_UNDERFLOW])
+def test_stack_errors(source):
+    code = machine_code(source)
+    errors = []
+    for simulation in (machine.simulation, compiler.compiled_simulation):
+        with pytest.raises(Exception) as error:  # noqa: PT011
+            simulation(code, [0], machine.INSTRUCTION_LIMIT, io.StringIO(), "numeric")
+        errors.append((type(error.value), str(error.value)))
+    assert errors[0] == errors[1]
+
+
+def test_alu_expressions():
+    values = [0, 1, -1, 7, -7, 255, 256, 2 ** 31 - 1, -2 ** 31, 2 ** 40]
+    for opcode, expression in compiler.ALU_EXPRESSIONS.items():
+        for x, y in itertools.product(values, values):
+            if opcode == "DIV" and y == 0:
+                continue
+            actual = eval(expression.format(x=compiler.atom(x), y=compiler.atom(y)),
+                          {"div": compiler.div_toward_zero})
+            assert int(actual) == ISA[opcode].alu(x, y), "{} {} {}".format(opcode, x, y)
+
+
+def test_regions_are_reused():
+    code = machine_code(bench.long_loop(1).source)
+    compiler.compiled_simulation(code, [0], 1000, io.StringIO(), "numeric")
+    compiled = len(compiler._code_cache)
+    regions = sum(len(regions) for regions in compiler._region_cache.values())
+    compiler.compiled_simulation(code, [0], 1000, io.StringIO(), "numeric")
+    assert len(compiler._code_cache) == compiled
+    assert sum(len(regions) for regions in compiler._region_cache.values()) == regions
@@ -0,0 +1,77 @@
+import io
+import os
+import tempfile
+
+import pytest
+import src.cost as cost
+import src.machine as machine
+import src.profiler as profiler
+import src.translator as translator
+from src.isa import BLOCK_WORD_TICKS, BRANCH_TAKEN_TICKS, ISA, OpcodeKind
+
+SOURCE = """
+IOVALUE:
+    WORD 0
+BEGIN:
+    LD #3
+    CALL PRINT
+LOOP:
+    DEC
+    DUP
+    LD #0
+    BEQ
+    JUMP NEXT
+    HLT
+NEXT:
+    POP
+    JUMP LOOP
+PRINT:
+    ST IOVALUE
+    OUT
+    RET
+"""
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_static_ticks_match_profile(golden):
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "input.txt")
+        with open(input_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+        input_tokens = machine.load_input(input_file)
+    profile = profiler.Profile()
+    profiler.profile_simulation(code, input_tokens, machine.INSTRUCTION_LIMIT, io.StringIO(),
+                                golden["output_mode"], profile)
+
+    analysis = cost.Analysis(code)
+
+    for ip, (count, ticks) in profile.by_ip.items():
+        cell = analysis.cells[ip]
+        static = cost.instruction_ticks(cell) * count
+        if ISA[cell.opcode].kind is OpcodeKind.BRANCH:
+            assert static <= ticks <= static + BRANCH_TAKEN_TICKS * count
+        elif ISA[cell.opcode].opcode in cost.BLOCK_WORD_OPCODES:
+            assert (ticks - static) % BLOCK_WORD_TICKS == 0
+        else:
+            assert ticks == static
+
+
+def test_loops_and_paths():
+    code = machine.to_machine_code(translator.translate(SOURCE))
+    output = io.StringIO()
+    _, ticks = machine.simulation(code, [0], machine.INSTRUCTION_LIMIT, output, "numeric")
+
+    analysis = cost.Analysis(code)
+
+    assert output.getvalue() == "3 "
+    assert sorted(analysis.blocks) == [1, 3, 7, 8, 9, 11]
+    assert list(analysis.loops) == [(3, 9)]
+    loop = analysis.loops[3, 9]
+    assert loop.body == [3, 7, 9]
+    assert loop.iteration.ticks == sum(cost.instruction_ticks(code[adr]) for adr in (3, 4, 5, 6, 7, 9, 10))
+    assert analysis.paths[11].ticks == 11 + 5 + 5
+    assert analysis.worst().blocks == [1, 3, 7, 9]
+    # the loop body runs twice, then the exit: LOOP block, taken branch and HLT
+    exit_ticks = analysis.blocks[3].ticks + BRANCH_TAKEN_TICKS + analysis.blocks[8].ticks
+    assert ticks == analysis.worst().ticks + loop.iteration.ticks + exit_ticks
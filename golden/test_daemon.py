@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+import io
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+import src.daemon as daemon
+import src.fast as fast
+import src.machine as machine
+import src.translator as translator
+
+
+@contextlib.contextmanager
+def serving(address, executor):
+    # the daemon runs in a thread of the test process
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    task = loop.create_task(daemon.Daemon(executor).serve(address, started))
+    thread = threading.Thread(target=loop.run_until_complete, args=(asyncio.wait([task]),))
+    thread.start()
+    started.wait(5)
+    try:
+        yield address
+    finally:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join()
+        # connection handlers end on the closed client sockets
+        loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
+        loop.close()
+
+
+@pytest.fixture()
+def address(tmp_path):
+    # jobs run on a thread pool to see the program cache from the test
+    with ThreadPoolExecutor(2) as executor, serving(str(tmp_path / "daemon.sock"), executor) as address:
+        yield address
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_daemon_matches_reference(golden, address):
+    data = golden["in_stdin"]
+    tokens = json.loads(data) if data.startswith("[") else data
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    expected = io.StringIO()
+    instructions, ticks = machine.simulation(
+        code, [len(tokens), *tokens], machine.INSTRUCTION_LIMIT, expected, golden["output_mode"])
+    job = {"source": golden["in_source"], "input": tokens, "output_mode": golden["output_mode"]}
+    daemon.load_program.cache_clear()
+
+    with daemon.Client(address) as client:
+        results = client.run_batch([{"input": tokens}] * 40, source=job["source"], output_mode=job["output_mode"])
+        single = client.run(job)
+
+    assert results == [{"output": expected.getvalue(), "instructions": instructions, "ticks": ticks}] * 40
+    assert single == results[0]
+    assert daemon.load_program.cache_info().misses == 1
+
+
+def test_daemon_errors(address):
+    with daemon.Client(address) as client:
+        assert "error" in client.request([1, 2])
+        assert "error" in client.run({"source": "LD"})
+        assert "error" in client.run({"source": "HLT", "input": [1, "a"]})
+        results = client.run_batch([{"code": '[{"index": 0, "opcode": "HLT", "arg": null, "addressing": 5}]'},
+                                    {"source": "IOVALUE:\n    WORD 0\n    HLT"}, "job"])
+        assert "error" in results[0]  # no instruction at ip 1
+        assert results[1] == {"output": "", "instructions": 0, "ticks": 4}
+        assert "error" in results[2]
+
+
+@pytest.mark.golden_test("golden/hello-username.yml")
+def test_daemon_process_pool(golden, tmp_path):
+    # jobs and results are pickled to the worker processes, every worker fills its own program cache
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    inputs = [golden["in_stdin"][:length] for length in range(0, len(golden["in_stdin"]) + 1, 3)]
+    expected = []
+    for tokens in inputs:
+        output = io.StringIO()
+        instructions, ticks = machine.simulation(
+            code, [len(tokens), *tokens], machine.INSTRUCTION_LIMIT, output, golden["output_mode"])
+        expected.append({"output": output.getvalue(), "instructions": instructions, "ticks": ticks})
+
+    with ProcessPoolExecutor(2) as executor, serving(str(tmp_path / "daemon.sock"), executor) as address:
+        with daemon.Client(address) as client:
+            for _ in range(2):
+                results = client.run_batch([{"input": tokens} for tokens in inputs] * 10,
+                                           source=golden["in_source"], output_mode=golden["output_mode"])
+                assert results == expected * 10
+
+
+def test_cached_program_records():
+    source = "IOVALUE:\n    WORD 0\nBEGIN:\n    LD #5\n    ST IOVALUE\n    OUT\n    HLT"
+    daemon.load_program.cache_clear()
+    code, program = daemon.load_program("source", source)
+    assert program == fast.predecode_code(code)
+    assert [record[0] for record in program] == code[1:]
+
+    job = {"source": source, "output_mode": "numeric"}
+    assert daemon.run_job(job) == daemon.run_job(job) == {"output": "5 ", "instructions": 3, "ticks": 27}
+    assert daemon.load_program.cache_info().misses == 1
+    # every run decodes new objects into its own copy
+    assert daemon.load_program("source", source)[1] is program
+    assert len(program) == len(code) - 1
+
+
+def test_limit_is_clamped(monkeypatch):
+    monkeypatch.setattr(daemon, "MAX_LIMIT", 10)
+    source = "IOVALUE:\n    WORD 0\nBEGIN:\nLOOP:\n    JUMP LOOP"
+    assert daemon.run_job({"source": source, "limit": 10 ** 9})["instructions"] == 10
+    assert daemon.run_job({"source": source, "limit": 5})["instructions"] == 5
+    assert daemon.run_job({"source": source})["instructions"] == 10
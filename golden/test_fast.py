@@ -0,0 +1,82 @@
+import io
+import os
+import tempfile
+
+import pytest
+import src.bench as bench
+import src.compiler as compiler
+import src.fast as fast
+import src.machine as machine
+import src.translator as translator
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_fast_matches_reference(golden):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "input.txt")
+        with open(input_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+
+        code = translator.translate(golden["in_source"])
+        results = []
+        for simulation in (machine.simulation, fast.fast_simulation, compiler.compiled_simulation):
+            output_file = os.path.join(tmpdir, simulation.__name__ + ".txt")
+            machine_code = [instr.arg if instr.opcode == "NOP" else instr for instr in code]
+            counters = simulation(
+                machine_code, machine.load_input(input_file), machine.INSTRUCTION_LIMIT, output_file,
+                golden["output_mode"]
+            )
+            with open(output_file, encoding="utf-8") as file:
+                results.append((counters, file.read()))
+
+        assert results[0] == results[1] == results[2]
+
+
+def test_bench_cases():
+    # generated programs check their own result, the fast engine is compared with the reference above
+    for case in (bench.long_loop(1), bench.deep_calls(1), bench.post_inc(1), bench.big_input(1, 1000)):
+        code = machine.to_machine_code(translator.translate(case.source))
+        assert bench.run_case(case, fast.fast_simulation, code)[2] == case.expected
+
+
+BLOCK_MOVE_SOURCE = """
+IOVALUE:
+    WORD 0
+BEGIN:
+    IN
+    LD #SRC
+    LD #DST
+    LD #SRC
+    LD IOVALUE
+    INB         ; SRC <- input
+    POP
+    LD IOVALUE
+    MOVB        ; DST <- SRC, the ranges overlap
+    POP
+    LD #DST
+    LD #DST
+    INC
+    LD #2
+    MOVB        ; DST + 1 <- DST
+    POP
+    LD #DST
+    LD IOVALUE
+    OUTB
+    HLT
+SRC:
+    WORD 0
+DST:
+    WORD 0
+"""
+
+
+def test_block_move():
+    code = machine.to_machine_code(translator.translate(BLOCK_MOVE_SOURCE))
+    results = []
+    for simulation in (machine.simulation, fast.fast_simulation, compiler.compiled_simulation):
+        output = io.StringIO()
+        counters = simulation(code, [5, *"hello"], machine.INSTRUCTION_LIMIT, output, "text")
+        results.append((counters, output.getvalue()))
+
+    assert results[0][1] == "hhelo"
+    assert results[0] == results[1] == results[2]
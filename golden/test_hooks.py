@@ -0,0 +1,84 @@
+import io
+import os
+import tempfile
+
+import pytest
+import src.hooks as hooks
+import src.machine as machine
+import src.translator as translator
+from src.isa import OpcodeKind
+
+SOURCE = """
+IOVALUE:
+    WORD 0
+BEGIN:
+    LD #2
+LOOP:
+    CALL PRINT
+    DEC
+    DUP
+    LD #0
+    BEQ
+    JUMP NEXT
+    HLT
+NEXT:
+    POP
+    JUMP LOOP
+PRINT:
+    ST IOVALUE
+    OUT
+    RET
+"""
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_hooks_do_not_change_results(golden):
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "input.txt")
+        with open(input_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+        input_tokens = machine.load_input(input_file)
+    events = []
+    registry = hooks.Hooks()
+    for kind in OpcodeKind:
+        registry.on_opcode(kind, lambda control_unit, ip, instruction: events.append(ip))
+
+    output = io.StringIO()
+    counters = hooks.hooked_simulation(
+        code, input_tokens, machine.INSTRUCTION_LIMIT, output, golden["output_mode"], registry)
+
+    expected = io.StringIO()
+    assert counters == machine.simulation(
+        code, input_tokens, machine.INSTRUCTION_LIMIT, expected, golden["output_mode"])
+    assert output.getvalue() == expected.getvalue()
+    assert len(events) == counters[0]
+
+
+def test_breakpoints_and_events():
+    code = machine.to_machine_code(translator.translate(SOURCE))
+    data_path = machine.DataPath(code, machine.INSTRUCTION_LIMIT, 0)
+    io_controller = machine.IOController(data_path, [0], 0, io.StringIO(), "numeric")
+    events = []
+    registry = hooks.Hooks()
+    registry.add_breakpoint(3, lambda control_unit, ip: events.append(("break", control_unit.data_path.tos)) or True)
+    registry.add_watchpoint(0, lambda control_unit, ip, address: events.append(("watch", ip)))
+    registry.on_call(lambda control_unit, ip, target: events.append(("call", ip, target)))
+    registry.on_return(lambda control_unit, ip, address: events.append(("ret", ip, address)))
+    registry.on_io(lambda control_unit, ip, instruction: events.append(("io", instruction.opcode)))
+    control_unit = hooks.HookedControlUnit(data_path, io_controller, registry)
+
+    # DEC at 3 is the first instruction after the return
+    assert control_unit.run(100) == 5
+    assert control_unit.stopped == 3
+    assert events == [("call", 2, 11), ("watch", 11), ("io", "OUT"), ("ret", 13, 3), ("break", 2)]
+
+    events.clear()
+    control_unit.run(100)
+    assert events == [("call", 2, 11), ("watch", 11), ("io", "OUT"), ("ret", 13, 3), ("break", 1)]
+
+    events.clear()
+    control_unit.run(100)
+    assert control_unit.halted
+    assert events == []
+    assert io_controller.outputBuffer == [2, 1]
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import pytest
+import src.inputs as inputs
+
+
+def write(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as file:
+        file.write(data)
+    return path
+
+
+def test_formats():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        text = write(tmpdir, "text.txt", "ab\nвд\n".encode())
+        numeric = write(tmpdir, "numeric.txt", b"[20, -1,\n 2 3]\n")
+        binary = os.path.join(tmpdir, "numeric.bin")
+
+        assert list(inputs.load_input(text)) == [6, *map(ord, "ab\nвд\n")]
+        assert list(inputs.load_input(numeric)) == [4, 20, -1, 2, 3]
+        assert inputs.write_binary(numeric, binary) == 4
+        assert list(inputs.load_input(binary)) == [4, 20, -1, 2, 3]
+        assert list(inputs.load_input(write(tmpdir, "empty.bin", b""))) == [0]
+
+
+def test_long_numeric_input(monkeypatch):
+    # numbers cut by chunk borders
+    monkeypatch.setattr(inputs, "INPUT_CHUNK", 7)
+    numbers = [x * 7919 - 100000 for x in range(300)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        numeric = write(tmpdir, "numeric.txt", str(numbers).encode())
+        assert list(inputs.load_input(numeric)) == [len(numbers), *numbers]
+
+
+@pytest.mark.parametrize("data", [b"[1, __import__('os')]", b"[1, 2", b"", b"[1] 2", b"[99999999999999999999]"])
+def test_bad_numeric_input(data):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write(tmpdir, "numeric.txt", data)
+        with pytest.raises(inputs.InputFormatError):
+            inputs.load_input(path, "numeric")
+
+
+def test_truncated_binary_input():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with pytest.raises(inputs.InputFormatError):
+            inputs.load_input(write(tmpdir, "input.bin", b"\x01\x00\x00\x00\x02"))
@@ -1,11 +1,26 @@
+import io
 import logging
 import os
 import re
 import tempfile
 
 import pytest
+import src.cache as cache
+import src.compiler as compiler
+import src.fast as fast
 import src.machine as machine
+import src.trace as trace
 import src.translator as translator
+from src.isa import (
+    BINARY_HEADER,
+    BINARY_WORD,
+    Instruction,
+    Opcode,
+    WordRangeError,
+    WrongBinaryFormatError,
+    decode_code,
+    encode_code,
+)
 
 
 def replace_multiple_spaces_with_one(s):
@@ -40,3 +55,124 @@ def test_bar(golden, caplog):
         expected = replace_multiple_spaces_with_one(caplog.text.rstrip("\n").replace("\t", "   "))
         result = replace_multiple_spaces_with_one(golden.out["out_log"].rstrip("\n").replace("\t", "    "))
         assert expected == result
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_binary_code(golden):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source_file = os.path.join(tmpdir, "code.asm")
+        target_file = os.path.join(tmpdir, "translator_output.txt")
+        binary_file = os.path.join(tmpdir, "translator_output.bin")
+
+        with open(source_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_source"])
+
+        translator.main(source_file, target_file, binary_file)
+
+        def dump(code):
+            return [word if isinstance(word, int) else word.__dict__ for word in code]
+
+        assert dump(machine.load_code(binary_file)) == dump(machine.load_code(target_file))
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_trace(golden):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source_file = os.path.join(tmpdir, "code.asm")
+        target_file = os.path.join(tmpdir, "translator_output.txt")
+        input_file = os.path.join(tmpdir, "input.txt")
+        output_file = os.path.join(tmpdir, "output.txt")
+        trace_file = os.path.join(tmpdir, "trace.bin")
+
+        with open(input_file, "w", encoding="utf-8") as inp_file:
+            inp_file.write(golden["in_stdin"])
+
+        with open(source_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_source"])
+
+        translator.main(source_file, target_file)
+        machine.main(target_file, input_file, output_file, golden["output_mode"], trace_file)
+
+        rendered = [trace.render(raw) for raw in trace.read_trace(trace_file)]
+        expected = [line.split("machine:simulation", 1)[1] for line in golden.out["out_log"].splitlines()]
+        expected = [line for line in expected if "TICK" in line]
+        assert list(map(replace_multiple_spaces_with_one, rendered)) == list(map(replace_multiple_spaces_with_one, expected))
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_translation_cache(golden):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        translation_cache = cache.TranslationCache(tmpdir)
+        expected = cache.encode_entry(translator.translate(golden["in_source"]))
+
+        first = cache.cached_translate(golden["in_source"], translation_cache)
+        second = cache.cached_translate(golden["in_source"], translation_cache)
+
+        assert (translation_cache.misses, translation_cache.hits) == (1, 1)
+        assert cache.encode_entry(first) == cache.encode_entry(second) == expected
+        assert expected.rstrip("\n") == golden.out["out_code"].rstrip("\n")
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_stream_translation(golden):
+    code = translator.translate(golden["in_source"])
+    binary = io.BytesIO()
+    source_map = translator.SourceMap()
+    count = translator.assemble(io.StringIO(golden["in_source"]), translator.BinarySink(binary, 2), source_map)
+
+    assert count == len(code) == len(source_map.entries)
+    assert binary.getvalue() == encode_code(code)
+    source_lines = golden["in_source"].splitlines()
+    for instruction, (line, _, _) in zip(code, source_map.entries):
+        assert source_lines[line - 1].split(";", 1)[0].split()[0] in (instruction.opcode, "WORD")
+
+
+def test_binary_code_wide_words():
+    source = "IOVALUE:\n    WORD 0xFFFFFFFF\n    LD IOVALUE\n    ST IOVALUE\n    OUT\n    HLT"
+    code = translator.translate(source)
+    assert decode_code(encode_code(code))[0].arg == 0xFFFFFFFF
+
+    too_wide = "IOVALUE:\n    WORD 0\n    HLT\nBIG:\n    WORD 0x10000000000000000"
+    with pytest.raises(WordRangeError, match="word 2"):
+        encode_code(translator.translate(too_wide))
+    with pytest.raises(translator.TranslationError, match="line 5"):
+        translator.assemble(too_wide.splitlines(), translator.BinarySink(io.BytesIO()))
+
+
+def test_binary_code_unknown_opcode():
+    binary = bytearray(encode_code(translator.translate("IOVALUE:\n    WORD 0\n    HLT")))
+    binary[BINARY_HEADER.size + BINARY_WORD.size] = 255
+    with pytest.raises(WrongBinaryFormatError, match="unknown opcode 255 in word 1"):
+        decode_code(binary)
+
+
+CALL_RET_SOURCE = """
+IOVALUE:
+    WORD 0
+BEGIN:
+    LD #1
+    CALL PRINT
+    INC
+    CALL PRINT
+    HLT
+PRINT:
+    ST IOVALUE
+    OUT
+    RET
+"""
+
+
+def test_call_ret_loaded_code():
+    # loaded code carries str opcodes, CALL has to push its return address for them too
+    with tempfile.TemporaryDirectory() as tmpdir:
+        json_file = os.path.join(tmpdir, "code.json")
+        binary_file = os.path.join(tmpdir, "code.bin")
+        translator.write_code(json_file, translator.translate(CALL_RET_SOURCE))
+        translator.write_binary_code(binary_file, translator.translate(CALL_RET_SOURCE))
+        for code_file in (json_file, binary_file):
+            code = machine.load_code(code_file)
+            assert not any(type(cell.opcode) is Opcode for cell in code if isinstance(cell, Instruction))
+            for simulation in (machine.simulation, fast.fast_simulation, compiler.compiled_simulation):
+                output = io.StringIO()
+                assert simulation(code, [0], machine.INSTRUCTION_LIMIT, output, "numeric") == (10, 81)
+                assert output.getvalue() == "1 2 "
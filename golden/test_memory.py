@@ -0,0 +1,74 @@
+import io
+import os
+import tempfile
+
+import pytest
+import src.compiler as compiler
+import src.fast as fast
+import src.machine as machine
+import src.paged as paged
+import src.translator as translator
+
+HEAP_SOURCE = """
+IOVALUE:
+    WORD 0
+BEGIN:
+    LD #7
+    ST 1000000
+    POP
+    LD #HEAP
+    LD #3000000
+    LD #2
+    MOVB        ; 3000000 <- HEAP
+    POP
+    LD 1000000
+    LD 3000001
+    ADD
+    ST IOVALUE
+    OUT
+    HLT
+HEAP:
+    WORD 1000000
+    WORD 3000000
+"""
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_paged_matches_dense(golden):
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "input.txt")
+        with open(input_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+        input_tokens = machine.load_input(input_file)
+
+    stats = []
+    for simulation in (machine.simulation, fast.fast_simulation, compiler.compiled_simulation):
+        dense, paged_output = io.StringIO(), io.StringIO()
+        counters = simulation(code, input_tokens, machine.INSTRUCTION_LIMIT, dense, golden["output_mode"])
+        # small pages, so blocks and the code cross page borders
+        instr_counter, ticks, memory = paged.paged_simulation(
+            code, input_tokens, machine.INSTRUCTION_LIMIT, paged_output, golden["output_mode"], page_size=8,
+            simulate=simulation)
+        assert (instr_counter, ticks, paged_output.getvalue()) == (*counters, dense.getvalue())
+        stats.append(memory.stats())
+    # instruction fetches are reads of every engine
+    assert stats[0] == stats[1] == stats[2]
+    assert sum(reads for reads, _ in stats[0].values()) > counters[0]
+
+
+def test_sparse_heap():
+    code = machine.to_machine_code(translator.translate(HEAP_SOURCE))
+    output = io.StringIO()
+
+    _, _, memory = paged.paged_simulation(code, [0], machine.INSTRUCTION_LIMIT, output, "numeric")
+
+    assert output.getvalue() == "3000007 "
+    *_, reference = paged.paged_simulation(code, [0], machine.INSTRUCTION_LIMIT, io.StringIO(), "numeric",
+                                           simulate=machine.simulation)
+    assert memory.stats() == reference.stats()
+    assert sorted(memory.pages) == [0, 1000000 // memory.page_size, 3000000 // memory.page_size]
+    assert memory.stats()[3000000 // memory.page_size] == (1, 2)
+    with pytest.raises(IndexError):
+        memory.read(memory.size)
+
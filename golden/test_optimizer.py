@@ -0,0 +1,58 @@
+import io
+
+import src.machine as machine
+import src.optimizer as optimizer
+import src.translator as translator
+
+SOURCE = """
+IOVALUE:
+    WORD 0
+BEGIN:
+    LD CNT
+    ST X
+    POP
+    LD X
+    SWAP
+    SWAP
+    JUMP LOOP
+LOOP:
+    LD CNT
+    LD #0
+    BEQ
+    JUMP BODY
+    HLT
+BODY:
+    DUP
+    POP
+    LD CNT
+    DEC
+    ST CNT
+    ST IOVALUE
+    OUT
+    POP
+    POP
+    JUMP LOOP
+X:
+    WORD 0
+CNT:
+    WORD 3
+"""
+
+
+def run(code):
+    output = io.StringIO()
+    machine_code = [instr.arg if instr.opcode == "NOP" else instr for instr in code]
+    counters = machine.simulation(machine_code, [0], machine.INSTRUCTION_LIMIT, output, "numeric")
+    return counters, output.getvalue()
+
+
+def test_peephole():
+    code, report = optimizer.optimized_translate(SOURCE)
+    (_, ticks), output = run(translator.translate(SOURCE))
+    (_, optimized_ticks), optimized_output = run(code)
+
+    assert optimized_output == output == "2 1 0 "
+    assert report.removed == len(translator.translate(SOURCE)) - len(code) == 7
+    assert set(report.rewrites.values()) == {1}
+    # DUP/POP is executed on every of three passes of the loop
+    assert ticks - optimized_ticks == report.ticks + 2 * 10
@@ -0,0 +1,29 @@
+import io
+import os
+import tempfile
+
+import pytest
+import src.machine as machine
+import src.profiler as profiler
+import src.translator as translator
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_profile_totals(golden):
+    source_map = translator.SourceMap()
+    code = machine.to_machine_code(translator.assemble(golden["in_source"].splitlines(), source_map=source_map))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "input.txt")
+        with open(input_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+        input_tokens = machine.load_input(input_file)
+    profile = profiler.Profile(source_map)
+
+    counters = profiler.profile_simulation(
+        code, input_tokens, machine.INSTRUCTION_LIMIT, io.StringIO(), golden["output_mode"], profile)
+
+    assert counters == machine.simulation(
+        code, input_tokens, machine.INSTRUCTION_LIMIT, io.StringIO(), golden["output_mode"])
+    assert sum(ticks for _, ticks in profile.by_ip.values()) == counters[1]
+    assert sum(ticks for _, ticks in profile.by_operation.values()) == counters[1]
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in profile.collapsed()) == counters[1]
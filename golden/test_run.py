@@ -0,0 +1,37 @@
+import io
+import json
+
+import pytest
+import src.machine as machine
+import src.run as run
+import src.translator as translator
+from src.isa import Instruction
+
+
+def fields(code):
+    return [(cell.index, cell.opcode, cell.arg, cell.addressing) if isinstance(cell, Instruction) else cell
+            for cell in code]
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_run_source_matches_reference(golden):
+    data = golden["in_stdin"]
+    tokens = json.loads(data) if data.startswith("[") else data
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    expected = io.StringIO()
+    instructions, ticks = machine.simulation(
+        code, [len(tokens), *tokens], machine.INSTRUCTION_LIMIT, expected, golden["output_mode"])
+
+    assert fields(run.assemble_code(golden["in_source"])) == fields(code)
+    for engine in run.ENGINES:
+        assert run.run_source(golden["in_source"], tokens, golden["output_mode"], engine=engine) == (
+            expected.getvalue(), instructions, ticks)
+
+
+def test_run_source_input():
+    source = "IOVALUE:\n    WORD 0\n    IN\n    OUT\n    HLT"
+    # the input length is the first token
+    assert run.run_source(source, "ab", "numeric") == run.run_source(source, [7, 1], "numeric")
+    assert run.run_source(source, "ab", "numeric")[:2] == ("2 ", 2)
+    with pytest.raises(AssertionError):
+        run.input_tokens([1, "a"])
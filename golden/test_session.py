@@ -0,0 +1,69 @@
+import asyncio
+import io
+import os
+import tempfile
+
+import pytest
+import src.machine as machine
+import src.session as session
+import src.translator as translator
+
+
+async def tokens_of(values, delay=0, waiting=None):
+    # waiting: [sessions waiting now, most sessions waiting at once]
+    for value in values:
+        if delay:
+            waiting[0] += 1
+            waiting[1] = max(waiting)
+            await asyncio.sleep(delay)
+            waiting[0] -= 1
+        yield value
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_session_matches_reference(golden):
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "input.txt")
+        with open(input_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+        input_tokens = machine.load_input(input_file)
+    expected = io.StringIO()
+    counters = machine.simulation(code, input_tokens, machine.INSTRUCTION_LIMIT, expected, golden["output_mode"])
+
+    chunks = []
+
+    async def sink(text):
+        chunks.append(text)
+
+    result = asyncio.run(session.async_simulation(
+        code, tokens_of(input_tokens), sink, golden["output_mode"], buff_size=input_tokens[0], yield_every=7))
+
+    assert result == counters
+    assert "".join(chunks) == expected.getvalue()
+
+
+def test_concurrent_sessions():
+    with open("examples/hello_user/hello_user.asm", encoding="utf-8") as file:
+        code = machine.to_machine_code(translator.translate(file.read()))
+    names = ["user{}".format(number) for number in range(50)]
+    outputs = {name: [] for name in names}
+    waiting = [0, 0]
+
+    async def run(name):
+        async def sink(text):
+            outputs[name].append(text)
+
+        return await session.async_simulation(code, tokens_of([len(name), *name], 0.001, waiting), sink, "text")
+
+    async def run_all():
+        return await asyncio.gather(*map(run, names))
+
+    results = asyncio.run(run_all())
+
+    for name, counters in zip(names, results):
+        expected = io.StringIO()
+        assert counters == machine.simulation(code, [len(name), *name], machine.INSTRUCTION_LIMIT, expected, "text")
+        assert "".join(outputs[name]) == expected.getvalue()
+    # all sessions wait for input at the same time in one thread
+    assert waiting == [0, len(names)]
@@ -0,0 +1,89 @@
+import contextlib
+import io
+import os
+import tempfile
+
+import pytest
+import src.machine as machine
+import src.snapshot as snapshot
+import src.translator as translator
+from src.fast import FastControlUnit
+from src.isa import Instruction, Opcode
+
+
+class BrokenControlUnit(machine.ControlUnit):
+    # every OUT sends the next character, an injected divergence for bisect
+    def execute(self):
+        cell = self.data_path.memory.read(self.data_path.ip)
+        super().execute()
+        if isinstance(cell, Instruction) and cell.opcode == Opcode.OUT:
+            self.io_controller.outputBuffer[-1] += 1
+
+
+def prepare(golden, tmpdir):
+    code_file = os.path.join(tmpdir, "code.json")
+    input_file = os.path.join(tmpdir, "input.txt")
+    translator.write_code(code_file, translator.translate(golden["in_source"]))
+    with open(input_file, "w", encoding="utf-8") as file:
+        file.write(golden["in_stdin"])
+    return code_file, input_file
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_resume_matches_full_run(golden):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        code_file, input_file = prepare(golden, tmpdir)
+        code, input_tokens = machine.load_code(code_file), machine.load_input(input_file)
+        expected = io.StringIO()
+        instructions, ticks = machine.simulation(
+            code, input_tokens, machine.INSTRUCTION_LIMIT, expected, golden["output_mode"])
+
+        data_path = machine.DataPath(code, machine.INSTRUCTION_LIMIT, input_tokens[0])
+        io_controller = machine.IOController(data_path, input_tokens, 0, io.StringIO(), golden["output_mode"])
+        control_unit = machine.ControlUnit(data_path, io_controller)
+        executed, halted = snapshot.run_until_tick(control_unit, ticks // 2, machine.INSTRUCTION_LIMIT)
+        assert not halted
+        snapshot_file = os.path.join(tmpdir, "state.snapshot")
+        snapshot.save(snapshot.capture(control_unit, executed, halted), snapshot_file)
+        state = snapshot.load(snapshot_file)
+        assert state["instructions"] == executed
+
+        for engine in (machine.ControlUnit, FastControlUnit):
+            output = io.StringIO()
+            resumed = snapshot.restore(state, input_tokens, output, golden["output_mode"], engine)
+            rest, halted = snapshot.run_instructions(resumed, machine.INSTRUCTION_LIMIT)
+            resumed.io_controller.finish()
+            assert halted
+            assert (executed + rest, resumed._tick) == (instructions, ticks)
+            assert output.getvalue() == expected.getvalue()
+
+        output_file = os.path.join(tmpdir, "output.txt")
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            snapshot.main_save(code_file, input_file, ticks // 2, snapshot_file)
+            snapshot.main_resume(snapshot_file, input_file, output_file, golden["output_mode"])
+        with open(output_file, encoding="utf-8") as file:
+            assert file.read() == expected.getvalue()
+        assert stdout.getvalue().splitlines()[-1] == "instructions_executed: {} ticks: {}".format(instructions, ticks)
+
+
+@pytest.mark.golden_test("golden/hello.yml")
+def test_bisect_finds_divergence(golden):
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    input_tokens = [len(golden["in_stdin"]), *golden["in_stdin"]]
+    state = snapshot.initial_state(code, input_tokens)
+    assert snapshot.bisect(state, state, input_tokens, 1000) is None
+
+    # instructions executed up to and including the first OUT
+    control_unit = snapshot.restore(state, input_tokens, io.StringIO(), "text")
+    first_out = 0
+    while not control_unit.io_controller.outputBuffer:
+        snapshot.run_instructions(control_unit, 1)
+        first_out += 1
+
+    found = snapshot.bisect(state, state, input_tokens, 1000, second_engine=BrokenControlUnit)
+    assert found is not None
+    instructions, first, second, differences = found
+    assert instructions == first_out
+    assert differences == ["io"]
+    assert first["io"]["output"][-1] + 1 == second["io"]["output"][-1]
@@ -0,0 +1,121 @@
+import io
+import itertools
+import os
+import tempfile
+
+import pytest
+import src.machine as machine
+import src.stream as stream
+import src.translator as translator
+
+PRINT_LOOP = """
+IOVALUE:
+    WORD 0
+BEGIN:
+    LD #65
+LOOP:
+    ST IOVALUE
+    OUT
+    JUMP LOOP
+"""
+
+READ_TOO_MUCH = """
+IOVALUE:
+    WORD 0
+BEGIN:
+    LD #66
+    ST IOVALUE
+    OUT
+    IN
+    IN
+    IN
+    HLT
+"""
+
+
+class RecordingOutput(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+        return super().write(text)
+
+
+def machine_code(source):
+    return machine.to_machine_code(translator.translate(source))
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_stream_matches_reference(golden):
+    code = machine_code(golden["in_source"])
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "input.txt")
+        with open(input_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+        expected = io.StringIO()
+        counters = machine.simulation(
+            code, machine.load_input(input_file), machine.INSTRUCTION_LIMIT, expected, golden["output_mode"])
+
+        # the stream reader gives text input, numeric input goes through the same lazy path from an iterator
+        if golden["in_stdin"].startswith("["):
+            input_tokens = iter(machine.load_input(input_file))
+        else:
+            size, input_tokens = stream.stream_input(input_file)
+            assert size == len(golden["in_stdin"])
+        output = io.StringIO()
+        assert stream.stream_simulation(
+            code, input_tokens, machine.INSTRUCTION_LIMIT, output, golden["output_mode"]) == counters
+    assert output.getvalue() == expected.getvalue()
+
+
+def test_output_is_flushed_in_chunks(monkeypatch):
+    monkeypatch.setattr(stream, "OUTPUT_CHUNK", 4)
+    output = RecordingOutput()
+    # the limit stops the endless loop, the output written before is kept
+    assert stream.stream_simulation(machine_code(PRINT_LOOP), [0], 30, output, "text")[0] == 30
+    assert output.chunks == ["AAAA", "AAAA", "AA"]
+
+
+def test_output_survives_crash():
+    output = io.StringIO()
+    with pytest.raises(AssertionError, match="not enough symbols"):
+        stream.stream_simulation(machine_code(READ_TOO_MUCH), iter([1, "a"]), 100, output, "text")
+    assert output.getvalue() == "B"
+
+
+def test_input_is_read_lazily():
+    consumed = []
+    tokens = itertools.chain([1000000], (consumed.append(char) or char for char in itertools.cycle("ab")))
+    source = READ_TOO_MUCH.replace("    IN\n    HLT", "    HLT")
+    output = io.StringIO()
+    assert stream.stream_simulation(machine_code(source), tokens, 100, output, "text")[0] == 5
+    assert consumed == ["a"]
+
+
+def test_block_io_with_bounded_buffer(monkeypatch):
+    monkeypatch.setattr(stream, "OUTPUT_CHUNK", 8)
+    source = """
+    IOVALUE:
+        WORD 0
+    BEGIN:
+        IN
+        LD #BUFFER
+        LD IOVALUE
+        INB
+        POP
+        LD #BUFFER
+        LD IOVALUE
+        OUTB
+        HLT
+    BUFFER:
+        WORD 0
+    """
+    text = "stream" * 5
+    output = RecordingOutput()
+    stream.stream_simulation(machine_code(source), iter([len(text), *text]), 100, output, "text", len(text))
+    assert output.getvalue() == text
+    assert output.chunks == [text, ""]
+    with pytest.raises(IndexError):
+        stream.stream_simulation(machine_code(source), iter([len(text), *text]), 100, io.StringIO(), "text", 8)
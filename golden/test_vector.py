@@ -0,0 +1,70 @@
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+import src.machine as machine
+import src.translator as translator
+import src.vector as vector
+
+
+def separate_run(code, input_tokens, limit, output_mode):
+    output = io.StringIO()
+    try:
+        instr_counter, ticks = machine.simulation(code, input_tokens, limit, output, output_mode)
+    except Exception as e:
+        return {"error": "{}: {}".format(type(e).__name__, e)}
+    return {"output": output.getvalue(), "instructions": instr_counter, "ticks": ticks}
+
+
+@pytest.mark.skipif(vector.np is None, reason="numpy is not installed")
+@pytest.mark.golden_test("golden/*.yml")
+def test_vector_matches_reference(golden):
+    code = machine.to_machine_code(translator.translate(golden["in_source"]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = os.path.join(tmpdir, "input.txt")
+        with open(input_file, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+        input_tokens = machine.load_input(input_file)
+    # shorter inputs diverge in control flow, some of them run out of input
+    inputs = [input_tokens, *([length, *input_tokens[1:length + 1]] for length in range(len(input_tokens) - 1))]
+    inputs.append([2, "ab", "c"])
+
+    for limit in (machine.INSTRUCTION_LIMIT, 40):
+        results = vector.vector_simulation(code, inputs, limit, golden["output_mode"])
+        assert results == [separate_run(code, tokens, limit, golden["output_mode"]) for tokens in inputs]
+
+
+@pytest.mark.skipif(vector.np is None, reason="numpy is not installed")
+@pytest.mark.golden_test("golden/cat.yml")
+def test_main_reports_broken_inputs(golden, capsys):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        code_file = os.path.join(tmpdir, "code.json")
+        translator.write_code(code_file, translator.translate(golden["in_source"]))
+        inputs_dir = os.path.join(tmpdir, "inputs")
+        Path(inputs_dir).mkdir()
+        for name, text in (("0.txt", "i wanna die"), ("1.txt", "[1, x]"), ("2.txt", "ok")):
+            with open(os.path.join(inputs_dir, name), "w", encoding="utf-8") as file:
+                file.write(text)
+        result_file = os.path.join(tmpdir, "result.json")
+        vector.main(code_file, inputs_dir, result_file, golden["output_mode"])
+        with open(result_file, encoding="utf-8") as file:
+            results = json.load(file)
+
+        code = machine.load_code(code_file)
+        names = [os.path.join(inputs_dir, name) for name in ("0.txt", "1.txt", "2.txt")]
+        assert [result["case"] for result in results] == names
+        for number in (0, 2):
+            expected = separate_run(code, machine.load_input(names[number]), machine.INSTRUCTION_LIMIT,
+                                    golden["output_mode"])
+            assert results[number] == {"case": names[number], **expected}
+        assert results[1]["error"].startswith("InputFormatError")
+        assert capsys.readouterr().out == "cases: 3 failed: 1\n"
+
+        Path(names[0]).unlink()
+        Path(names[2]).unlink()
+        vector.main(code_file, inputs_dir, result_file, golden["output_mode"])
+        with open(result_file, encoding="utf-8") as file:
+            assert [result["case"] for result in json.load(file)] == [names[1]]
@@ -0,0 +1,70 @@
+import io
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from src.fast import fast_simulation
+from src.machine import INSTRUCTION_LIMIT, load_code, load_input
+
+# Batch runner: one translated program against many input files. Every worker process loads
+# the program once and then runs the cases it gets with the fast engine.
+CHUNK_SIZE = 16
+
+_program = None
+
+
+def _load_program(code_file):
+    global _program
+    _program = load_code(code_file)
+
+
+def simulate_case(code, input_tokens, output_mode, limit=INSTRUCTION_LIMIT, program=None):
+    output = io.StringIO()
+    try:
+        instr_counter, ticks = fast_simulation(code, input_tokens, limit, output, output_mode, program=program)
+    except Exception as e:
+        return {"error": "{}: {}".format(type(e).__name__, e)}
+    return {"output": output.getvalue(), "instructions": instr_counter, "ticks": ticks}
+
+
+def run_case(input_file, output_mode, limit=INSTRUCTION_LIMIT):
+    result = {"case": input_file}
+    try:
+        input_tokens = load_input(input_file)
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+        return result
+    result.update(simulate_case(_program, input_tokens, output_mode, limit))
+    return result
+
+
+def list_inputs(source):
+    # a directory with input files or a manifest with one input path per line
+    source = Path(source)
+    if source.is_dir():
+        return [str(path) for path in sorted(source.iterdir()) if path.is_file()]
+    with open(source, encoding="utf-8") as file:
+        return [str(source.parent / line.strip()) for line in file if line.strip()]
+
+
+def run_batch(code_file, input_files, output_mode, workers=None):
+    with ProcessPoolExecutor(max_workers=workers, initializer=_load_program, initargs=(code_file,)) as executor:
+        cases = executor.map(run_case, input_files, [output_mode] * len(input_files), chunksize=CHUNK_SIZE)
+        return list(cases)
+
+
+def main(code_file, inputs, result_file, output_mode, workers=None):
+    input_files = list_inputs(inputs)
+    results = run_batch(code_file, input_files, output_mode, None if workers is None else int(workers))
+
+    with open(result_file, "w", encoding="utf-8") as file:
+        file.write(json.dumps(results, indent=4))
+    failed = sum(1 for result in results if "error" in result)
+    print("cases: {} failed: {}".format(len(results), failed))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (5, 6), (
+        "Wrong arguments: batch.py <code_file> <inputs_dir_or_manifest> <result_file> <output_mode> [<workers>]")
+    main(*sys.argv[1:])
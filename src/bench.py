@@ -0,0 +1,374 @@
+import functools
+import gc
+import io
+import json
+import logging
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import src.compiler as compiler
+import src.fast as fast
+import src.machine as machine
+import src.translator as translator
+
+# Benchmark suite: examples and generated programs are run on every engine, translator is measured
+# on a generated source. Absolute speed depends on the host, so the baseline is compared by ratios:
+# the speedup of an engine over the reference engine on the same case and the speed relative to
+# a calibration loop run in the same process. A ratio drop or a memory growth bigger than
+# the tolerance raises BenchmarkRegressionError.
+EXAMPLES_DIR = Path(__file__).parent.parent / "examples"
+DEFAULT_BASELINE = Path(__file__).parent.parent / "benchmarks" / "baseline.json"
+DEFAULT_TOLERANCE = 0.4
+# the stored ratios are medians of several runs, a single run may catch a quiet or a busy host
+BASELINE_RUNS = 3
+EXAMPLE_REPEAT = 100
+TIMING_ROUNDS = 5
+TRANSLATE_LINES = 100000
+BIG_INPUT_SIZE = 2 * 1024 * 1024
+CALIBRATION_LOOPS = 300000
+ENGINES = {
+    "reference": machine.simulation,
+    "fast": fast.fast_simulation,
+    "compiled": compiler.compiled_simulation,
+}
+# peak memory is measured once per case, tracemalloc makes a run about 5 times slower
+MEMORY_ENGINE = "fast"
+# cases checked by the test suite, they take a few seconds on the reference engine
+GATE_CASES = ("translate", "hello", "cat", "fibonachi", "hello_user")
+# bigger is better for speed metrics, smaller for memory
+SPEED_METRICS = ("relative_speed", "speedup")
+MEMORY_METRICS = ("peak_memory",)
+
+
+class BenchmarkRegressionError(Exception):
+    def __init__(self, regressions):
+        super().__init__("Error: performance regression\n" + "\n".join(regressions))
+
+
+class WrongBenchmarkResultError(Exception):
+    def __init__(self, case, expected, actual):
+        super().__init__(f"Error: benchmark {case} produced wrong output: expected {expected[:40]!r}, got {actual[:40]!r}")
+
+
+class Case:
+    def __init__(self, name, source, input_tokens, output_mode, expected=None, repeat=1, engines=tuple(ENGINES),
+                 measure_memory=True):
+        self.name = name
+        self.source = source
+        self.input_tokens = input_tokens
+        self.output_mode = output_mode
+        self.expected = expected
+        self.repeat = repeat
+        self.engines = engines
+        self.measure_memory = measure_memory
+
+
+def counted_loop(body, counter="CNT"):
+    # repeats `body` until the counter in memory drops to zero, TOS is kept
+    return [
+        "LOOP:",
+        *body,
+        "    LD {}".format(counter),
+        "    DEC",
+        "    ST {}".format(counter),
+        "    LD #0",
+        "    BEQ",
+        "    JUMP NEXT",
+        "    JUMP END",
+        "NEXT:",
+        "    POP",
+        "    JUMP LOOP",
+        "END:",
+        "    POP",
+    ]
+
+
+def long_loop(scale):
+    count = 20000 * scale
+    source = ["IOVALUE:", "    WORD 0", "BEGIN:", "    CLA",
+              *counted_loop(["    INC"]),
+              "    ST IOVALUE", "    OUT", "    HLT",
+              "CNT:", "    WORD {}".format(count)]
+    return Case("long_loop", "\n".join(source), [0], "numeric", "{} ".format(count))
+
+
+def deep_calls(scale, depth=60):
+    # return stack holds up to machine.STACK_SIZE addresses
+    count = 300 * scale
+    source = ["IOVALUE:", "    WORD 0", "BEGIN:", "    CLA",
+              *counted_loop(["    LD DEPTH", "    CALL REC", "    POP"]),
+              "    LD HITS", "    ST IOVALUE", "    OUT", "    HLT",
+              "REC:",
+              "    DEC",
+              "    DUP",
+              "    LD #0",
+              "    BEQ",
+              "    JUMP DEEPER",
+              "    JUMP BOTTOM",
+              "DEEPER:",
+              "    POP",
+              "    CALL REC",
+              "    RET",
+              "BOTTOM:",
+              "    POP",
+              "    LD HITS",
+              "    INC",
+              "    ST HITS",
+              "    POP",
+              "    RET",
+              "CNT:", "    WORD {}".format(count),
+              "DEPTH:", "    WORD {}".format(depth),
+              "HITS:", "    WORD 0"]
+    return Case("deep_calls", "\n".join(source), [0], "numeric", "{} ".format(count))
+
+
+def post_inc(scale, size=2000):
+    # sums an array with LD [PTR]+ several times
+    rounds = 5 * scale
+    values = [i % 97 for i in range(size)]
+    source = ["IOVALUE:", "    WORD 0", "BEGIN:", "    CLA",
+              *counted_loop(["    LD #ARRAY", "    ST PTR", "    POP", "    LD SIZE", "    ST INNER", "    POP",
+                             *(line.replace("LOOP", "SUM").replace("NEXT", "SUMNEXT").replace("END", "SUMEND")
+                               for line in counted_loop(["    LD [PTR]+", "    ADD"], "INNER"))], "ROUNDS"),
+              "    ST IOVALUE", "    OUT", "    HLT",
+              "ROUNDS:", "    WORD {}".format(rounds),
+              "SIZE:", "    WORD {}".format(size),
+              "INNER:", "    WORD 0",
+              "PTR:", "    WORD 0",
+              "ARRAY:", *("    WORD {}".format(value) for value in values)]
+    return Case("post_inc", "\n".join(source), [0], "numeric", "{} ".format(sum(values) * rounds))
+
+
+def big_input(scale, size=BIG_INPUT_SIZE):
+    # about 10 instructions per symbol, too slow for the reference and the fast engine;
+    # tracemalloc makes a run of several megabytes 20 times slower, memory is not measured
+    size *= scale
+    text = ("The quick brown fox jumps over the lazy dog. " * (size // 45 + 1))[:size]
+    source = ["IOVALUE:", "    WORD 0", "BEGIN:",
+              "    IN", "    LD IOVALUE", "    ST CNT", "    POP",
+              *counted_loop(["    IN", "    OUT"]),
+              "    HLT",
+              "CNT:", "    WORD 0"]
+    return Case("big_input", "\n".join(source), [len(text), *text], "text", text, engines=("compiled",),
+                measure_memory=False)
+
+
+def examples():
+    cases = []
+    for name in ("hello", "cat", "fibonachi", "hello_user"):
+        directory = EXAMPLES_DIR / name
+        source = (directory / "{}.asm".format(name)).read_text(encoding="utf-8")
+        input_tokens = machine.load_input(directory / "input.txt")
+        cases.append(Case(name, source, input_tokens, "text" if name != "fibonachi" else "numeric",
+                          repeat=EXAMPLE_REPEAT))
+    return cases
+
+
+def cases(scale=1):
+    return [*examples(), long_loop(scale), deep_calls(scale), post_inc(scale), big_input(scale)]
+
+
+def run_case(case, simulate, code):
+    output = io.StringIO()
+    instructions, ticks = simulate(code, case.input_tokens, sys.maxsize, output, case.output_mode)
+    return instructions, ticks, output.getvalue()
+
+
+def calibration_loop(loops):
+    # a fixed interpreter-like workload: dispatch on a table, integer arithmetic and list access
+    table = [1, 3, 5, 7, 11, 13, 17, 19]
+    memory = [0] * 64
+    acc = 0
+    for i in range(loops):
+        acc = (acc + table[i & 7] * (acc & 15)) & 0xFFFFFFFF
+        memory[i & 63] = acc
+    return acc
+
+
+def timed(function, *args):
+    # as in timeit, a collection in the middle of a run is noise
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = function(*args)
+        return time.perf_counter() - start, result
+    finally:
+        gc.enable()
+
+
+def best_rounds(runs):
+    # every round runs the calibration loop and all measured functions next to each other, so a slow
+    # period of the host hits them alike; the best time of each is kept, slower rounds are noise
+    best = {}
+    for _ in range(TIMING_ROUNDS):
+        for name, run in [("calibration", lambda: calibration_loop(CALIBRATION_LOOPS)), *runs.items()]:
+            seconds, result = timed(run)
+            if name not in best or seconds < best[name][0]:
+                best[name] = (seconds, result)
+    return best
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def repeat_case(case, simulate, code):
+    instructions = ticks = 0
+    for _ in range(case.repeat):
+        executed, spent, output = run_case(case, simulate, code)
+        instructions += executed
+        ticks += spent
+    return instructions, ticks, output
+
+
+def measure_case(case, engines, memory_engine=None):
+    code = machine.to_machine_code(translator.translate(case.source))
+    best = best_rounds({engine: functools.partial(repeat_case, case, ENGINES[engine], code) for engine in engines})
+    loops_per_sec = CALIBRATION_LOOPS / best["calibration"][0]
+    results = {}
+    for engine in engines:
+        seconds, (instructions, ticks, output) = best[engine]
+        if case.expected is not None and output != case.expected:
+            raise WrongBenchmarkResultError(case.name, case.expected, output)
+        result = {"instructions": instructions, "ticks": ticks, "seconds": seconds,
+                  "instr_per_sec": instructions / seconds, "ticks_per_sec": ticks / seconds}
+        result["relative_speed"] = result["instr_per_sec"] / loops_per_sec
+        if "reference" in results:
+            result["speedup"] = result["instr_per_sec"] / results["reference"]["instr_per_sec"]
+        if engine == memory_engine:
+            # separate run, tracemalloc slows the simulation down
+            result["peak_memory"] = peak_memory(run_case, case, ENGINES[engine], code)
+        results[engine] = result
+    return results
+
+
+def generated_source(lines):
+    source = ["IOVALUE:", "    WORD 0", "BEGIN:"]
+    for i in range(lines // 4):
+        source += ["L{}:".format(i), "    LD L{}".format(i + 1), "    ADD", "    ST [PTR]+"]
+    source += ["L{}:".format(lines // 4), "    HLT", "PTR:", "    WORD 0"]
+    return "\n".join(source)
+
+
+def measure_translator(lines=TRANSLATE_LINES, measure_memory=True):
+    source = generated_source(lines)
+    line_count = source.count("\n") + 1
+    best = best_rounds({"translate": functools.partial(translator.translate, source)})
+    seconds = best["translate"][0]
+    result = {"lines": line_count, "seconds": seconds, "lines_per_sec": line_count / seconds,
+              "relative_speed": line_count / seconds / (CALIBRATION_LOOPS / best["calibration"][0])}
+    if measure_memory:
+        result["peak_memory"] = peak_memory(translator.translate, source)
+    return result
+
+
+def run_suite(scale=1, engines=tuple(ENGINES), measure_memory=True, names=None):
+    results = {}
+    if names is None or "translate" in names:
+        results["translate"] = measure_translator(TRANSLATE_LINES * scale, measure_memory)
+    for case in cases(scale):
+        if names is not None and case.name not in names:
+            continue
+        case_engines = [engine for engine in engines if engine in case.engines]
+        memory_engine = None
+        if measure_memory and case.measure_memory:
+            memory_engine = MEMORY_ENGINE if MEMORY_ENGINE in case_engines else case_engines[-1]
+        for engine, result in measure_case(case, case_engines, memory_engine).items():
+            results["{}/{}".format(case.name, engine)] = result
+    return results
+
+
+def median_results(runs):
+    results = runs[0]
+    for name, metrics in results.items():
+        for metric in SPEED_METRICS:
+            if metric in metrics:
+                metrics[metric] = statistics.median(run[name][metric] for run in runs)
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for name, metrics in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        # counters are deterministic, any change is a change of the machine behaviour
+        for metric in ("instructions", "ticks"):
+            if metric in metrics and metric in expected and metrics[metric] != expected[metric]:
+                regressions.append("{} {}: {} != {}".format(name, metric, metrics[metric], expected[metric]))
+        for metric in SPEED_METRICS:
+            if metric in metrics and metric in expected and metrics[metric] < expected[metric] * (1 - tolerance):
+                regressions.append("{} {}: {:.3f} < {:.3f}".format(name, metric, metrics[metric], expected[metric]))
+        for metric in MEMORY_METRICS:
+            if metric in metrics and metric in expected and metrics[metric] > expected[metric] * (1 + tolerance):
+                regressions.append("{} {}: {} > {}".format(name, metric, metrics[metric], expected[metric]))
+    return regressions
+
+
+def report(results):
+    for name, metrics in results.items():
+        line = "{:28} {:8.3f}s".format(name, metrics["seconds"])
+        if "instr_per_sec" in metrics:
+            line += " instr/s: {:10.0f} ticks/s: {:11.0f}".format(metrics["instr_per_sec"], metrics["ticks_per_sec"])
+        if "lines_per_sec" in metrics:
+            line += " lines/s: {:10.0f}".format(metrics["lines_per_sec"])
+        if "relative_speed" in metrics:
+            line += " relative: {:7.3f}".format(metrics["relative_speed"])
+        if "speedup" in metrics:
+            line += " speedup: {:6.2f}".format(metrics["speedup"])
+        if "peak_memory" in metrics:
+            line += " peak: {:8.1f} KiB".format(metrics["peak_memory"] / 1024)
+        print(line)
+
+
+def load_baseline(baseline_file, scale):
+    path = Path(baseline_file)
+    if not path.exists():
+        return None
+    baseline = json.loads(path.read_text(encoding="utf-8"))
+    assert baseline["scale"] == scale, "Baseline is stored for scale {}".format(baseline["scale"])
+    return baseline["results"]
+
+
+def check(baseline_file=DEFAULT_BASELINE, scale=1, tolerance=DEFAULT_TOLERANCE, names=None, measure_memory=True):
+    baseline = load_baseline(baseline_file, scale)
+    assert baseline is not None, "Baseline not found: {}".format(baseline_file)
+    results = run_suite(scale, measure_memory=measure_memory, names=names)
+    # a regression stays on the second run, a busy host usually does not
+    failed = {name.split("/")[0] for name in results if compare({name: results[name]}, baseline, tolerance)}
+    if failed:
+        results.update(run_suite(scale, measure_memory=measure_memory, names=failed))
+    regressions = compare(results, baseline, tolerance)
+    if regressions:
+        raise BenchmarkRegressionError(regressions)
+    return results
+
+
+def main(command, baseline_file=DEFAULT_BASELINE, scale="1", tolerance=str(DEFAULT_TOLERANCE)):
+    logging.getLogger().setLevel(logging.WARNING)
+    scale = int(scale)
+    if command == "check":
+        report(check(baseline_file, scale, float(tolerance)))
+        print("no regressions against", baseline_file)
+        return
+    runs = [run_suite(scale) for _ in range(BASELINE_RUNS)]
+    results = median_results(runs)
+    report(results)
+    Path(baseline_file).parent.mkdir(parents=True, exist_ok=True)
+    Path(baseline_file).write_text(json.dumps({"scale": scale, "results": results}, indent=4), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    usage = "Wrong arguments: bench.py check|save [<baseline_file>] [<scale>] [<tolerance>]"
+    assert 2 <= len(sys.argv) <= 5, usage
+    assert sys.argv[1] in ("check", "save"), usage
+    main(*sys.argv[1:])
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import src.translator as translator
+from src.isa import CodeEncoder, Instruction, Opcode
+
+# Content-addressed translation cache: the key is sha256 of the translator version and the source text,
+# the entry is the resolved machine code in the same JSON form the translator writes.
+# Entries are evicted by age of the last use and by total size (least recently used first).
+CACHE_DIR_ENV = "CSA_CACHE_DIR"
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "csa-lab3"
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+ENTRY_SUFFIX = ".json"
+
+
+def cache_key(text: str) -> str:
+    hasher = hashlib.sha256()
+    hasher.update("{}\0".format(translator.TRANSLATOR_VERSION).encode())
+    hasher.update(text.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def encode_entry(code: list) -> str:
+    return json.dumps(code, cls=CodeEncoder, indent=4)
+
+
+def decode_entry(data: str) -> list:
+    code = []
+    for fields in json.loads(data):
+        instruction = Instruction(**fields)
+        instruction.opcode = Opcode(instruction.opcode)
+        code.append(instruction)
+    return code
+
+
+class TranslationCache:
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE, max_age=DEFAULT_MAX_AGE):
+        if directory is None:
+            directory = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> Path:
+        return self.directory / (key + ENTRY_SUFFIX)
+
+    def entries(self):
+        if not self.directory.is_dir():
+            return []
+        return [entry for entry in self.directory.iterdir() if entry.suffix == ENTRY_SUFFIX]
+
+    def get(self, key: str) -> str | None:
+        path = self.path(key)
+        try:
+            data = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # last use time is the age of the entry
+        path.touch()
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: str):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # write and rename, so a concurrent reader never sees a partial entry
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(data)
+        Path(tmp_name).replace(self.path(key))
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        alive = []
+        for entry in self.entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                entry.unlink(missing_ok=True)
+            else:
+                alive.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in alive)
+        for _, size, entry in sorted(alive):
+            if total <= self.max_size:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for entry in self.entries():
+            entry.unlink(missing_ok=True)
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self.entries())
+
+
+def cached_translate_entry(text: str, cache: TranslationCache | None = None) -> str:
+    if cache is None:
+        cache = TranslationCache()
+    key = cache_key(text)
+    data = cache.get(key)
+    if data is None:
+        data = encode_entry(translator.translate(text))
+        cache.put(key, data)
+    return data
+
+
+def cached_translate(text: str, cache: TranslationCache | None = None) -> list:
+    return decode_entry(cached_translate_entry(text, cache))
+
+
+def main(source: str, target: str, binary_target: str | None = None):
+    cache = TranslationCache()
+    translator.main(source, target, binary_target, lambda text: cached_translate(text, cache))
+    print("cache hits:", cache.hits, "misses:", cache.misses)
+
+
+def main_clear():
+    TranslationCache().clear()
+
+
+def main_stats():
+    cache = TranslationCache()
+    print("cache dir:", cache.directory, "entries:", len(cache.entries()), "size:", cache.size())
+
+
+if __name__ == "__main__":
+    usage = ("Wrong arguments: cache.py translate <input_file> <target_file> [<binary_file>]"
+             " | cache.py clear | cache.py stats")
+    assert len(sys.argv) >= 2, usage
+    if sys.argv[1] == "translate":
+        assert len(sys.argv) in (4, 5), usage
+        main(*sys.argv[2:])
+    else:
+        assert len(sys.argv) == 2, usage
+        assert sys.argv[1] in ("clear", "stats"), usage
+        if sys.argv[1] == "clear":
+            main_clear()
+        else:
+            main_stats()
@@ -0,0 +1,553 @@
+import logging
+import sys
+import weakref
+
+import src.machine as machine
+from src.components.alu import MAX_NUMBER, SIGN_BIT, WORD_MASK
+from src.fast import FastControlUnit, decode
+from src.isa import BLOCK_WORD_TICKS, ISA, Addressing, Instruction, Opcode, OpcodeKind, div_toward_zero
+from src.machine import STACK_SIZE, DataPath, IOController
+
+# Region compiler: code reachable from an address is turned into one generated Python function.
+# A region is a set of segments, a segment is a trace: straight-line code continues through static
+# JUMP and CALL targets and both outcomes of a branch (the conditional skip BEQ; JUMP X; ... included),
+# so a loop body is usually one segment and the loop runs inside the function.
+# Inside a segment registers and the data stack are symbolic: every value is a local or a constant
+# and the registers are written back only on the segment edges, the fetch bookkeeping of skipped
+# instructions disappears. Ticks and instruction counters are added once per path.
+# Segments check the data stack depth and the instruction budget on entry, so stack errors and the
+# limit are left to the fast engine. A write to an address of compiled code leaves the region and
+# drops all compiled code.
+MAX_REGION_SIZE = 256  # compiled instructions of a region, traces are counted with duplicates
+MAX_SEGMENTS = 16
+MAX_BRANCH_DEPTH = 3  # nested branches traced inside one segment
+WRITERS = {Opcode.ST, Opcode.IN, Opcode.INB, Opcode.MOVB}
+REGISTERS = ("ip", "tos", "ar", "dr", "br", "cr", "af", "av", "asv", "fr")
+NOT_COMPILABLE = None
+
+# python expressions of ALU operations and branch conditions over atoms x and y, see ISA_TABLE
+ALU_EXPRESSIONS = {
+    Opcode.CLA: "0",
+    Opcode.NEG: "-{x}",
+    Opcode.INC: "{x} + 1",
+    Opcode.DEC: "{x} - 1",
+    Opcode.NOT: "~{x}",
+    Opcode.AND: "{x} & {y}",
+    Opcode.OR: "{x} | {y}",
+    Opcode.ADD: "{x} + {y}",
+    Opcode.SUB: "{x} - {y}",
+    Opcode.CMP: "{x} - {y}",
+    Opcode.MUL: "{x} * {y}",
+    Opcode.DIV: "div({x}, {y})",
+    Opcode.SXTB: "(({x} & 255) ^ 128) - 128",
+    Opcode.BEQ: "{x} == {y}",
+    Opcode.BGT: "{x} >= {y}",
+    Opcode.BLT: "{x} <= {y}",
+}
+assert set(ALU_EXPRESSIONS) == {info.opcode for info in ISA.values() if info.alu is not None}, (
+    "Every ALU operation needs an expression")
+WRAP = "(({} + %d) & %d) - %d" % (SIGN_BIT, WORD_MASK, SIGN_BIT)
+
+_code_cache = {}
+# first instruction of a region -> regions compiled from it, reused while memory holds the same instructions
+_region_cache = weakref.WeakKeyDictionary()
+
+
+def constant(atom):
+    if atom is None:
+        return None
+    try:
+        return int(atom.strip("()"))
+    except ValueError:
+        return None
+
+
+def atom(value):
+    return "({})".format(value) if value < 0 else str(value)
+
+
+def wrap(value):
+    return ((value + SIGN_BIT) & WORD_MASK) - SIGN_BIT
+
+
+class State:
+    # symbolic state of a path: registers, values pushed to the data stack, values popped below the
+    # depth of the segment entry, executed instructions and static ticks since the entry
+    __slots__ = ("regs", "stack", "consumed", "count", "ticks")
+
+    def __init__(self):
+        self.regs = {name: name for name in REGISTERS}
+        self.stack = []
+        self.consumed = 0
+        self.count = 0
+        self.ticks = 0
+
+    def copy(self):
+        state = State()
+        state.regs = dict(self.regs)
+        state.stack = list(self.stack)
+        state.consumed, state.count, state.ticks = self.consumed, self.count, self.ticks
+        return state
+
+
+class Region:
+    def __init__(self, function, cells):
+        self.function = function
+        self.cells = cells  # (address, instruction) pairs the code was compiled from
+
+    def matches(self, memory):
+        return all(memory.read(adr) is cell for adr, cell in self.cells)
+
+
+class RegionGenerator:
+    def __init__(self, memory, start):
+        self.memory = memory
+        self.start = start
+        self.lines = []
+        self.indent = 0
+        self.temps = 0
+        self.size = 0
+        self.cells = {}  # address -> instruction
+        self.names = {}  # id(instruction) -> closure name
+        self.objects = []
+        self.segments = []
+        self.successors = []
+        # per segment: max executed instructions, values popped below the entry depth, peak depth
+        self.longest = self.low = self.peak = 0
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def temp(self, expression):
+        name = "t{}".format(self.temps)
+        self.temps += 1
+        self.emit("{} = {}".format(name, expression))
+        return name
+
+    def cell_name(self, cell):
+        name = self.names.get(id(cell))
+        if name is None:
+            name = self.names[id(cell)] = "i{}".format(len(self.objects))
+            self.objects.append(cell)
+        return name
+
+    def decode(self, adr):
+        if not 0 <= adr < len(self.memory) or not 0 < adr + 2 <= MAX_NUMBER:
+            return None
+        cell = self.memory.read(adr)
+        record = decode(cell)
+        if record is None:
+            return None
+        self.cells[adr] = cell
+        return record
+
+    # data stack
+
+    def push(self, state, value):
+        state.stack.append(value)
+        self.peak = max(self.peak, len(state.stack) - state.consumed)
+
+    def pop(self, state):
+        if state.stack:
+            return state.stack.pop()
+        state.consumed += 1
+        self.low = max(self.low, state.consumed)
+        return self.temp("items[sp - {}]".format(state.consumed))
+
+    def touch(self, state):
+        # a push immediately followed by a pop, the stack must have room for it
+        self.peak = max(self.peak, len(state.stack) - state.consumed + 1)
+
+    # values
+
+    def alu(self, opcode, x, y):
+        first, second = constant(x), constant(y)
+        if first is not None and (second is not None or ISA[opcode].operands == 1):
+            try:
+                return atom(ISA[opcode].alu(first, second))
+            except ArithmeticError:
+                pass
+        return self.temp(ALU_EXPRESSIONS[opcode].format(x=x, y=y))
+
+    def wrap(self, raw):
+        value = constant(raw)
+        if value is not None:
+            return atom(wrap(value))
+        return self.temp(WRAP.format(raw))
+
+    # edges
+
+    def flush(self, state, halts=False):
+        # writes the symbolic state to the locals, they hold the machine state on segment edges
+        for offset, value in enumerate(state.stack, -state.consumed):
+            position = "sp + {}".format(offset) if offset > 0 else "sp - {}".format(-offset) if offset else "sp"
+            self.emit("items[{}] = {}".format(position, value))
+        pending = {name: value for name, value in state.regs.items() if value != name}
+        while pending:
+            free = [name for name in pending if name not in pending.values()]
+            if not free:
+                # a cycle of registers, one of them is saved first
+                name = next(iter(pending))
+                saved = self.temp(name)
+                pending = {key: saved if value == name else value for key, value in pending.items()}
+                continue
+            for name in free:
+                self.emit("{} = {}".format(name, pending.pop(name)))
+        delta = len(state.stack) - state.consumed
+        if delta:
+            self.emit("sp += {}".format(delta))
+        if state.ticks:
+            self.emit("tick += {}".format(state.ticks))
+        if state.count:
+            self.emit("left -= {}".format(state.count))
+        # HLT is not counted but needs the budget of one instruction
+        self.longest = max(self.longest, state.count + halts)
+
+    def edge(self, state):
+        target = constant(state.regs["ip"])
+        if target is not None:
+            self.successors.append(target)
+        self.flush(state)
+        self.emit("continue")
+
+    def leave(self, state, flag):
+        self.flush(state, flag == "halted")
+        self.emit("cu.{} = True".format(flag))
+        self.emit("break")
+
+    def check(self, state, condition):
+        # leaves the region after the instruction if it wrote to compiled code
+        self.emit("if {}:".format(condition))
+        self.indent += 1
+        self.leave(state, "stale")
+        self.indent -= 1
+
+    # instructions
+
+    def fetch(self, state, adr, cell):
+        regs = state.regs
+        regs["ar"] = regs["af"] = str(adr)
+        regs["dr"] = regs["cr"] = self.cell_name(cell)
+        regs["ip"] = regs["av"] = str(adr + 1)
+        regs["fr"] = "1"  # set_flags(1) clears all flags
+
+    def address(self, state, addressing, arg, checks):
+        regs = state.regs
+        if addressing == Addressing.DIRECT_ABS.value:
+            self.touch(state)
+            regs["af"] = regs["av"] = regs["ar"] = atom(arg)
+            regs["dr"] = self.temp("read({})".format(atom(arg)))
+        elif addressing == Addressing.LOAD.value:
+            regs["af"] = regs["av"] = regs["dr"] = atom(arg)
+        elif addressing == Addressing.DIRECT_SHIFT.value:
+            self.push(state, regs["tos"])
+            self.touch(state)
+            regs["tos"] = atom(arg)
+            regs["asv"] = regs["ip"]
+            regs["fr"] = self.alu(Opcode.ADD, regs["af"], regs["asv"])
+            regs["av"] = regs["ar"] = self.wrap(regs["fr"])
+            regs["dr"] = self.temp("read({})".format(regs["ar"]))
+        elif addressing in {Addressing.POST_INC.value, Addressing.POST_DEC.value}:
+            self.touch(state)
+            pointer = self.temp("read({})".format(atom(arg)))
+            regs["af"] = pointer
+            regs["fr"] = self.alu(Opcode.INC if addressing == Addressing.POST_INC.value else Opcode.DEC,
+                                  pointer, None)
+            self.emit("write({}, {})".format(atom(arg), self.wrap(regs["fr"])))
+            checks.append("{} in watched".format(atom(arg)))
+            regs["av"] = regs["ar"] = pointer
+            regs["dr"] = self.temp("read({})".format(pointer))
+
+    def execute(self, state, info, checks):
+        regs = state.regs
+        opcode = info.opcode
+        if info.kind is OpcodeKind.ALU:
+            regs["af"] = x = regs["tos"]
+            if info.operands == 2:
+                regs["asv"] = self.pop(state)
+            regs["fr"] = self.alu(opcode, x, regs["asv"])
+            regs["tos"] = regs["av"] = self.wrap(regs["fr"])
+        elif opcode is Opcode.LD:
+            self.push(state, regs["tos"])
+            regs["tos"] = regs["dr"]
+        elif opcode is Opcode.ST:
+            regs["af"] = regs["av"] = regs["dr"] = regs["tos"]
+            self.emit("write({}, {})".format(regs["ar"], regs["tos"]))
+            checks.append("{} in watched".format(regs["ar"]))
+        elif opcode is Opcode.JUMP:
+            regs["ip"] = regs["av"]
+        elif opcode is Opcode.CALL:
+            self.emit("rs.push({})".format(regs["ip"]))
+            regs["ip"] = regs["av"]
+        elif opcode is Opcode.RET:
+            regs["ip"] = self.temp("rs.pop()")
+        elif opcode is Opcode.SWAP:
+            regs["br"] = self.pop(state)
+            self.push(state, regs["tos"])
+            regs["tos"] = regs["br"]
+        elif opcode is Opcode.DUP:
+            self.push(state, regs["tos"])
+        elif opcode is Opcode.POP:
+            regs["tos"] = self.pop(state)
+        elif opcode is Opcode.IN:
+            self.emit("io.get()")
+            checks.append("io.memAddr in watched")
+        elif opcode is Opcode.OUT:
+            self.emit("io.send()")
+        elif opcode in {Opcode.INB, Opcode.OUTB, Opcode.MOVB}:
+            regs["af"] = count = regs["tos"]
+            regs["asv"] = adr = self.pop(state)
+            regs["fr"] = self.alu(Opcode.ADD, count, adr)
+            regs["av"] = self.wrap(regs["fr"])
+            if opcode is Opcode.INB:
+                self.emit("io.get_block({}, {})".format(adr, count))
+            elif opcode is Opcode.OUTB:
+                self.emit("io.send_block({}, {})".format(adr, count))
+            else:
+                regs["br"] = self.pop(state)
+                self.emit("move({}, {}, {})".format(regs["br"], adr, count))
+            self.emit("tick += max({}, 0) * {}".format(count, BLOCK_WORD_TICKS))
+            regs["tos"] = regs["av"]
+            if opcode is not Opcode.OUTB:
+                checks.append("not watched.isdisjoint(range({0}, {0} + {1}))".format(adr, count))
+
+    def branch(self, state, info, adr, depth, visited):
+        regs = state.regs
+        regs["af"] = x = regs["tos"]
+        regs["asv"] = y = self.pop(state)
+        taken = state.copy()
+        taken.ticks += 1
+        taken.regs["af"] = str(adr + 1)
+        taken.regs["ip"] = taken.regs["av"] = str(adr + 2)
+        taken.regs["fr"] = "1"
+        regs["av"] = regs["fr"] = "0"
+
+        outcome = self.alu(info.opcode, x, y) if constant(x) is not None and constant(y) is not None else None
+        if outcome != "0":
+            if outcome is None:
+                self.emit("if {}:".format(ALU_EXPRESSIONS[info.opcode].format(x=x, y=y)))
+                self.indent += 1
+            self.follow(taken, adr + 2, depth, visited)
+            if outcome is None:
+                self.indent -= 1
+        if outcome != "1":
+            self.follow(state, adr + 1, depth, visited)
+
+    def follow(self, state, adr, depth, visited):
+        if depth < MAX_BRANCH_DEPTH:
+            self.trace(state, adr, depth + 1, visited)
+        else:
+            self.edge(state)
+
+    def trace(self, state, adr, depth=0, visited=frozenset()):
+        # emits the code of the path from adr until it leaves the segment
+        while True:
+            record = None
+            # a path coming back to the region start or into itself goes through the dispatch
+            if adr not in visited and (adr != self.start or not visited) and self.size < MAX_REGION_SIZE:
+                record = self.decode(adr)
+            if record is None:
+                self.edge(state)
+                return
+            visited = visited | {adr}
+            cell, _, arg, ticks = record
+            info = ISA[cell.opcode]
+            self.size += 1
+            state.count += 1
+            state.ticks += ticks
+            checks = []
+            self.fetch(state, adr, cell)
+            self.address(state, cell.addressing, arg, checks)
+            if info.opcode is Opcode.HLT:
+                state.count -= 1
+                self.leave(state, "halted")
+                return
+            if info.kind is OpcodeKind.BRANCH:
+                self.branch(state, info, adr, depth, visited)
+                return
+            self.execute(state, info, checks)
+            for condition in checks:
+                self.check(state, condition)
+            if info.opcode is Opcode.CALL:
+                # the return address is likely to become a segment
+                self.successors.append(adr + 1)
+            if info.opcode in {Opcode.JUMP, Opcode.CALL, Opcode.RET}:
+                target = constant(state.regs["ip"])
+                if target is None or target == self.start:
+                    self.edge(state)
+                    return
+                adr = target
+            else:
+                adr += 1
+
+    def segment(self, start):
+        self.longest = self.low = self.peak = 0
+        outer, self.lines = self.lines, []
+        self.indent = 4
+        self.trace(State(), start)
+        body, self.lines = self.lines, outer
+
+        guards = ["left < {}".format(self.longest)]
+        if self.low:
+            guards.append("sp < {}".format(self.low))
+        if self.peak > 0:
+            guards.append("sp > {}".format(STACK_SIZE - self.peak))
+        self.indent = 3
+        self.emit("if ip == {}:".format(start))
+        self.emit("    if {}:".format(" or ".join(guards)))
+        self.emit("        break")
+        self.lines += body
+
+    def generate(self):
+        queue = [self.start]
+        while queue and len(self.segments) < MAX_SEGMENTS and self.size < MAX_REGION_SIZE:
+            start = queue.pop(0)
+            if start in self.segments or self.decode(start) is None:
+                continue
+            self.segments.append(start)
+            self.successors = []
+            self.segment(start)
+            queue += self.successors
+        if not self.segments:
+            return None
+
+        names = ", ".join("i{}".format(number) for number in range(len(self.objects)))
+        source = [
+            "def make({}):".format(names),
+            "    def region(cu, budget):",
+            "        dp = cu.data_path",
+            "        alu = dp.alu",
+            "        ds = dp.data_stack",
+            "        items, sp = ds.items, ds.depth",
+            "        memory = dp.memory",
+            "        read, write, move = memory.read, memory.write, memory.move",
+            "        rs = cu.return_stack",
+            "        io = cu.io_controller",
+            "        watched = cu.watched",
+            "        ip, tos, ar, dr, br, cr = dp.ip, dp.tos, dp.ar, dp.dr, dp.br, cu.cr",
+            "        af, av, asv = alu.first_value, alu.value, alu.second_value",
+            "        fr = None",
+            "        tick = cu._tick",
+            "        left = budget",
+            "        while True:",
+            *self.lines,
+            "            break",
+            "        dp.ip, dp.tos, dp.ar, dp.dr, dp.br, cu.cr = ip, tos, ar, dr, br, cr",
+            "        alu.first_value, alu.value, alu.second_value = af, av, asv",
+            "        if fr is not None:",
+            "            alu.set_flags(fr)",
+            "        ds.depth = sp",
+            "        cu._tick = tick",
+            "        return budget - left",
+            "    return region",
+        ]
+        return "\n".join(source) + "\n"
+
+
+def compile_region(memory, start):
+    cell = memory.read(start)
+    if not isinstance(cell, Instruction):
+        return NOT_COMPILABLE
+    for region in _region_cache.get(cell, ()):
+        if region.matches(memory):
+            return region
+    generator = RegionGenerator(memory, start)
+    source = generator.generate()
+    if source is None:
+        return NOT_COMPILABLE
+    make = _code_cache.get(source)
+    if make is None:
+        namespace = {"div": div_toward_zero}
+        exec(compile(source, "<region {}>".format(start), "exec"), namespace)
+        make = _code_cache[source] = namespace["make"]
+    region = Region(make(*generator.objects), tuple(generator.cells.items()))
+    _region_cache.setdefault(cell, []).append(region)
+    return region
+
+
+def may_write(cell):
+    if not isinstance(cell, Instruction):
+        return True
+    return ISA[cell.opcode].opcode in WRITERS or cell.addressing in {
+        Addressing.POST_INC.value, Addressing.POST_DEC.value}
+
+
+class BlockControlUnit(FastControlUnit):
+    def __init__(self, data_path: DataPath, io_controller: IOController):
+        super().__init__(data_path, io_controller)
+        self.regions = {}
+        self.watched = set()
+        self.stale = False
+
+    def invalidate(self):
+        self.regions.clear()
+        self.watched.clear()
+        self.stale = False
+
+    def region(self, ip):
+        region = compile_region(self.data_path.memory, ip)
+        if region is not NOT_COMPILABLE:
+            self.watched.update(adr for adr, _ in region.cells)
+            region = region.function
+        self.regions[ip] = region
+        return region
+
+    def step(self):
+        # a single instruction does not check writes to compiled code
+        cell = self.data_path.memory.read(self.data_path.ip)
+        self.execute()
+        if self.watched and may_write(cell):
+            self.invalidate()
+
+    def run(self, limit, trace=None):
+        # regions read the memory to compile and to check the code, read statistics would count these reads
+        if trace is not None or logging.getLogger().isEnabledFor(logging.DEBUG) or self.data_path.memory.counts_reads:
+            return super().run(limit, trace)
+
+        dp = self.data_path
+        regions = self.regions
+        instr_counter = 0
+        try:
+            while instr_counter < limit:
+                ip = dp.ip
+                region = regions[ip] if ip in regions else self.region(ip)
+                executed = 0 if region is NOT_COMPILABLE else region(self, limit - instr_counter)
+                instr_counter += executed
+                if self.halted:
+                    break
+                if self.stale:
+                    self.invalidate()
+                elif executed == 0:
+                    # the guards of the segment failed, the fast engine reports stack errors and the limit
+                    self.step()
+                    instr_counter += 1
+        except (StopIteration, EOFError):
+            self.halted = True
+        return instr_counter
+
+
+def compiled_simulation(code, input_tokens, limit, output_file, output_mode, trace=None, memory=None):
+    data_path = DataPath(code, limit, input_tokens[0], memory)
+    io_controller = IOController(data_path, input_tokens, 0, output_file, output_mode)
+    control_unit = BlockControlUnit(data_path, io_controller)
+
+    logging.debug("%s", control_unit)
+    if trace is not None:
+        trace.record(control_unit)
+    instr_counter = control_unit.run(limit, trace)
+    if control_unit.halted:
+        io_controller.finish()
+
+    if instr_counter >= limit:
+        logging.warning("Limit exceeded!")
+    return instr_counter, control_unit._tick
+
+
+def main(code_file, input_file, output_file, output_mode, trace_file=None):
+    machine.main(code_file, input_file, output_file, output_mode, trace_file, compiled_simulation)
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (5, 6), (
+        "Wrong arguments: compiler.py <code_file> <input_file> <output_file> <output_mode> [<trace_file>]")
+    main(*sys.argv[1:])
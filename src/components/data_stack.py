@@ -2,26 +2,42 @@ class StackOverflowError(Exception):
     def __init__(self, max_size):
         super().__init__(f"Error: stack is overflowed (max_size is {max_size})")
 
+
+class StackUnderflowError(Exception):
+    def __init__(self):
+        super().__init__("Error: stack is underflowed (pop from empty stack)")
+
+
 class Stack:
-    stack = None
-    max_size = None
+    # preallocated cells, `depth` points to the first free cell
+    __slots__ = ("items", "depth", "max_size")
 
     def __init__(self, max_size):
-        self.stack = []
+        self.items = [0] * max_size
+        self.depth = 0
         self.max_size = max_size
 
     def push(self, arg):
-        if len(self.stack) == self.max_size:
+        depth = self.depth
+        if depth == self.max_size:
             raise StackOverflowError(self.max_size)
-        if arg is not None:
-            self.stack.append(arg)
+        self.items[depth] = arg
+        self.depth = depth + 1
+
     def pop(self):
-        if len(self.stack) == 0:
-            return None
-        return self.stack.pop(-1)
+        depth = self.depth - 1
+        if depth < 0:
+            raise StackUnderflowError
+        self.depth = depth
+        return self.items[depth]
+
+    def __len__(self):
+        return self.depth
+
+    def peek(self, count):
+        # top first
+        return self.items[max(self.depth - count, 0):self.depth][::-1]
 
     def __repr__(self):
-        buff = ""
-        for i in range(len(self.stack)-1, 0, -1):
-            buff += str(self.stack[i]) + " "
-        return buff
+        # from the top, the bottom cell is not printed
+        return "".join(str(value) + " " for value in self.items[1:self.depth][::-1])
@@ -1,27 +1,114 @@
+from array import array
+
+DATA_WORD = "l"
+OBJECT_NUMBER = "i"
+NO_OBJECT = -1
+
+
 class Memory:
-    memory = None
-    start_of_variables = None
-    value = None
+    # data words live in a typed array, everything that is not a plain machine word (instructions,
+    # values out of word range) is kept in the objects table and referenced from the parallel code array
+    __slots__ = ("data", "code", "objects", "start_of_variables", "_object_numbers")
+    # memory with read statistics, engines must not read it beyond the reads of the program
+    counts_reads = False
 
     def __init__(self, code, start_of_variables, buff_size):
         self.start_of_variables = start_of_variables
-        self.memory = [0] * (len(code) + buff_size)
-        self.value = 0
+        size = len(code) + buff_size
+        self.data = array(DATA_WORD, bytes(size * array(DATA_WORD).itemsize))
+        self.code = array(OBJECT_NUMBER, [NO_OBJECT]) * size
+        self.objects = []
+        self._object_numbers = {}
         for number, instruction in enumerate(code, 0):
-            self.memory[number] = instruction
+            self.write(number, instruction)
+
+    def __len__(self):
+        return len(self.data)
+
+    def object_number(self, obj):
+        number = self._object_numbers.get(id(obj))
+        if number is None:
+            number = len(self.objects)
+            self.objects.append(obj)
+            self._object_numbers[id(obj)] = number
+        return number
 
     def read(self, adr):
-        self.value = self.memory[adr]
+        number = self.code[adr]
+        if number == NO_OBJECT:
+            return self.data[adr]
+        return self.objects[number]
+
+    def write(self, adr, value):
+        if isinstance(value, int):
+            try:
+                self.data[adr] = value
+            except OverflowError:
+                pass
+            else:
+                self.code[adr] = NO_OBJECT
+                return
+        self.code[adr] = self.object_number(value)
+        self.data[adr] = 0
+
+    def check_block(self, adr, count):
+        if adr < 0 or adr + count > len(self):
+            raise IndexError("memory block [{}, {}) is out of range".format(adr, adr + count))
+
+    def read_block(self, adr, count):
+        if count <= 0:
+            return []
+        self.check_block(adr, count)
+        end = adr + count
+        if self.code[adr:end].count(NO_OBJECT) == count:
+            return self.data[adr:end].tolist()
+        return [self.read(i) for i in range(adr, end)]
+
+    def write_block(self, adr, values):
+        count = len(values)
+        if count == 0:
+            return
+        self.check_block(adr, count)
+        end = adr + count
+        try:
+            self.data[adr:end] = array(DATA_WORD, values)
+        except (OverflowError, TypeError):
+            # objects and values out of word range
+            for i, value in enumerate(values):
+                self.write(adr + i, value)
+        else:
+            self.code[adr:end] = array(OBJECT_NUMBER, [NO_OBJECT]) * count
+
+    def move(self, src, dst, count):
+        # overlapping ranges are copied as if through a buffer
+        self.write_block(dst, self.read_block(src, count))
+
+    def addresses(self):
+        return range(len(self))
+
+    def object_addresses(self):
+        # instructions and values out of word range
+        return [adr for adr, number in enumerate(self.code) if number != NO_OBJECT]
+
+    def __getstate__(self):
+        # the id map is rebuilt, ids are not valid in another process
+        return {name: getattr(self, name) for name in self.__slots__ if name != "_object_numbers"}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._object_numbers = {id(obj): number for number, obj in enumerate(self.objects)}
 
-    def write(self, adr):
-        self.memory[adr] = self.value
+    def dump(self):
+        return memoryview(self.data)
 
     def __repr__(self):
         out = ""
-        for i in range(len(self.memory)):
-            if isinstance(self.memory[i], int):
-                buff = str(self.memory[i])
+        for i in range(len(self.data)):
+            value = self.read(i)
+            if isinstance(value, int):
+                buff = str(value)
             else:
-                buff = self.memory[i].get_short_note()
+                buff = value.get_short_note()
             out += "{:4} : \t {}\n".format(i, buff)
         return out
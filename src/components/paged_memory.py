@@ -0,0 +1,196 @@
+from array import array
+from collections import Counter
+
+from src.components.memory import DATA_WORD, NO_OBJECT, OBJECT_NUMBER, Memory
+
+PAGE_SIZE = 1024
+DEFAULT_ADDRESS_SPACE = 1 << 24
+
+
+class Page:
+    __slots__ = ("data", "code", "reads", "writes")
+
+    def __init__(self, size):
+        self.data = array(DATA_WORD, bytes(size * array(DATA_WORD).itemsize))
+        self.code = array(OBJECT_NUMBER, [NO_OBJECT]) * size
+        self.reads = 0
+        self.writes = 0
+
+
+class PageCodeView:
+    # memory.code[adr] is the instruction fetch of the fast engine, a found object is counted as a read
+    # of the page like the fetch of ControlUnit; otherwise the engine falls back to ControlUnit, which reads itself
+    __slots__ = ("memory",)
+
+    def __init__(self, memory):
+        self.memory = memory
+
+    def __getitem__(self, adr):
+        page = self.memory.pages.get(adr >> self.memory.shift)
+        if page is None:
+            return NO_OBJECT
+        number = page.code[adr & self.memory.mask]
+        if number != NO_OBJECT:
+            page.reads += 1
+        return number
+
+
+class PagedMemory(Memory):
+    # sparse address space: pages are allocated on the first write, missing pages are read as zeros
+    __slots__ = ("size", "page_size", "shift", "mask", "pages", "missed_reads")
+    counts_reads = True
+
+    def __init__(self, code, start_of_variables, size=DEFAULT_ADDRESS_SPACE, page_size=PAGE_SIZE):
+        assert page_size > 0, "Page size must be positive: {}".format(page_size)
+        assert page_size & (page_size - 1) == 0, "Page size must be a power of 2: {}".format(page_size)
+        assert len(code) <= size, "Code does not fit the address space: {} > {}".format(len(code), size)
+        self.start_of_variables = start_of_variables
+        self.size = size
+        self.page_size = page_size
+        self.shift = page_size.bit_length() - 1
+        self.mask = page_size - 1
+        self.pages = {}
+        self.missed_reads = Counter()  # page number -> reads before the page was allocated
+        self.code = PageCodeView(self)
+        self.objects = []
+        self._object_numbers = {}
+        for number, instruction in enumerate(code, 0):
+            self.write(number, instruction)
+
+    def __len__(self):
+        return self.size
+
+    def check(self, adr):
+        if not 0 <= adr < self.size:
+            raise IndexError("memory address {} is out of range".format(adr))
+
+    def page(self, number):
+        page = self.pages.get(number)
+        if page is None:
+            page = self.pages[number] = Page(self.page_size)
+        return page
+
+    def read(self, adr):
+        self.check(adr)
+        page = self.pages.get(adr >> self.shift)
+        if page is None:
+            self.missed_reads[adr >> self.shift] += 1
+            return 0
+        page.reads += 1
+        return self.cell(page, adr & self.mask)
+
+    def cell(self, page, offset):
+        number = page.code[offset]
+        if number == NO_OBJECT:
+            return page.data[offset]
+        return self.objects[number]
+
+    def write(self, adr, value):
+        self.check(adr)
+        page = self.page(adr >> self.shift)
+        page.writes += 1
+        offset = adr & self.mask
+        if isinstance(value, int):
+            try:
+                page.data[offset] = value
+            except OverflowError:
+                pass
+            else:
+                page.code[offset] = NO_OBJECT
+                return
+        page.code[offset] = self.object_number(value)
+        page.data[offset] = 0
+
+    def spans(self, adr, count):
+        # (page number, first offset, last offset + 1) of a range
+        end = adr + count
+        while adr < end:
+            number, offset = adr >> self.shift, adr & self.mask
+            length = min(self.page_size - offset, end - adr)
+            yield number, offset, offset + length
+            adr += length
+
+    def read_block(self, adr, count):
+        if count <= 0:
+            return []
+        self.check_block(adr, count)
+        out = []
+        for number, start, end in self.spans(adr, count):
+            page = self.pages.get(number)
+            if page is None:
+                self.missed_reads[number] += end - start
+                out += [0] * (end - start)
+                continue
+            page.reads += end - start
+            if page.code[start:end].count(NO_OBJECT) == end - start:
+                out += page.data[start:end].tolist()
+            else:
+                out += [self.cell(page, offset) for offset in range(start, end)]
+        return out
+
+    def write_block(self, adr, values):
+        if not values:
+            return
+        self.check_block(adr, len(values))
+        position = 0
+        for number, start, end in self.spans(adr, len(values)):
+            chunk = values[position:position + end - start]
+            page = self.page(number)
+            try:
+                page.data[start:end] = array(DATA_WORD, chunk)
+            except (OverflowError, TypeError):
+                for i, value in enumerate(chunk):
+                    self.write((number << self.shift) + start + i, value)
+            else:
+                page.code[start:end] = array(OBJECT_NUMBER, [NO_OBJECT]) * (end - start)
+                page.writes += end - start
+            position += end - start
+
+    def addresses(self):
+        # missing pages hold zeros only
+        for number in sorted(self.pages):
+            yield from range(number << self.shift, (number + 1) << self.shift)
+
+    def object_addresses(self):
+        for number in sorted(self.pages):
+            code = self.pages[number].code
+            yield from ((number << self.shift) + offset for offset, value in enumerate(code) if value != NO_OBJECT)
+
+    def stats(self):
+        # page number -> (reads, writes), reads of a page before its allocation are counted too
+        out = {number: (self.missed_reads[number], 0) for number in self.missed_reads}
+        for number, page in self.pages.items():
+            out[number] = (page.reads + self.missed_reads[number], page.writes)
+        return out
+
+    def report(self):
+        allocated = len(self.pages) * self.page_size * array(DATA_WORD).itemsize
+        out = ["pages: {} of {} allocated ({:.1f} KiB), page size: {} words".format(
+            len(self.pages), -(-self.size // self.page_size), allocated / 1024, self.page_size), ""]
+        out.append("{:>8} {:>12} {:>12} {:>12}".format("page", "address", "reads", "writes"))
+        for number, (reads, writes) in sorted(self.stats().items()):
+            out.append("{:>8} {:>12} {:>12} {:>12}".format(number, number << self.shift, reads, writes))
+        return "\n".join(out) + "\n"
+
+    def __getstate__(self):
+        names = ("start_of_variables", "objects", *self.__slots__)
+        return {name: getattr(self, name) for name in names}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.code = PageCodeView(self)
+        self._object_numbers = {id(obj): number for number, obj in enumerate(self.objects)}
+
+    def dump(self):
+        return {number: memoryview(page.data) for number, page in sorted(self.pages.items())}
+
+    def __repr__(self):
+        # allocated pages only, statistics are not changed
+        out = ""
+        for number in sorted(self.pages):
+            for offset in range(self.page_size):
+                value = self.cell(self.pages[number], offset)
+                out += "{:4} : \t {}\n".format((number << self.shift) + offset,
+                                               value if isinstance(value, int) else value.get_short_note())
+        return out
@@ -0,0 +1,293 @@
+import sys
+
+from src.isa import (
+    ADDRESSING_TICKS,
+    BLOCK_WORD_TICKS,
+    BRANCH_TAKEN_TICKS,
+    FETCH_TICKS,
+    ISA,
+    Addressing,
+    Instruction,
+    Opcode,
+    OpcodeKind,
+)
+from src.machine import load_code
+from src.translator import load_source_map
+
+# Static tick-cost analyzer: works on translated code without running it. The cost of an instruction
+# depends only on its opcode and addressing, a taken branch adds BRANCH_TAKEN_TICKS and block instructions
+# add BLOCK_WORD_TICKS per moved word. Basic blocks are built from the cells reachable from the start,
+# loops are found by the DFS edges which return to a block on the DFS stack, the worst-case path is
+# the most expensive path without those edges. A CALL costs the worst-case path of the called code.
+# Code is taken as it is in memory: self-modifying programs and JUMP/CALL targets known only at run
+# time (IP relative and post inc/dec addressing) are not followed, such paths are marked as partial.
+START = 1  # DataPath starts from the cell after IOVALUE
+BLOCK_TERMINATORS = {Opcode.JUMP, Opcode.CALL, Opcode.RET, Opcode.HLT}
+BLOCK_WORD_OPCODES = {Opcode.INB, Opcode.OUTB, Opcode.MOVB}
+
+
+def instruction_ticks(cell):
+    # ticks of an instruction when a branch is not taken and a block instruction moves nothing
+    return FETCH_TICKS + ADDRESSING_TICKS[cell.addressing] + ISA[cell.opcode].ticks
+
+
+def ticks_note(cell):
+    note = str(instruction_ticks(cell))
+    if ISA[cell.opcode].kind is OpcodeKind.BRANCH:
+        note += " (+{})".format(BRANCH_TAKEN_TICKS)
+    elif ISA[cell.opcode].opcode in BLOCK_WORD_OPCODES:
+        note += " +{}/w".format(BLOCK_WORD_TICKS)
+    return note
+
+
+def target(cell):
+    if cell.addressing in {Addressing.DIRECT_ABS.value, Addressing.LOAD.value}:
+        return cell.get_arg()
+    return None
+
+
+def transfers(adr, cell):
+    # (next address, extra ticks) of an instruction, the called code of CALL is not included
+    info = ISA[cell.opcode]
+    if info.kind is OpcodeKind.BRANCH:
+        return [(adr + 1, 0), (adr + 2, BRANCH_TAKEN_TICKS)]
+    if info.opcode is Opcode.JUMP:
+        return [] if target(cell) is None else [(target(cell), 0)]
+    if info.opcode in {Opcode.RET, Opcode.HLT}:
+        return []
+    return [(adr + 1, 0)]
+
+
+class BasicBlock:
+    def __init__(self, start):
+        self.start = start
+        self.end = start  # address after the last instruction
+        self.ticks = 0
+        self.word_ticks = 0  # ticks per word moved by every block instruction of the block
+        self.successors = []  # (start of the next block, extra ticks)
+        self.call = None  # called address
+        self.partial = False  # a JUMP/CALL target or the next cell is unknown
+
+    def add(self, cell):
+        self.ticks += instruction_ticks(cell)
+        if ISA[cell.opcode].opcode in BLOCK_WORD_OPCODES:
+            self.word_ticks += BLOCK_WORD_TICKS
+        self.end += 1
+
+
+class Path:
+    def __init__(self, blocks, ticks, word_ticks, partial):
+        self.blocks = blocks
+        self.ticks = ticks
+        self.word_ticks = word_ticks
+        self.partial = partial
+
+    def extend(self, block, ticks, word_ticks, partial):
+        return Path([*self.blocks, block], self.ticks + ticks, self.word_ticks + word_ticks,
+                    self.partial or partial)
+
+    def __repr__(self):
+        out = "{}{} ticks".format(">=" if self.partial else "", self.ticks)
+        if self.word_ticks:
+            out += " +{}/w".format(self.word_ticks)
+        return out
+
+
+class Loop:
+    def __init__(self, header, tail, body, iteration):
+        self.header = header
+        self.tail = tail  # the block which jumps back to the header
+        self.body = body
+        self.iteration = iteration  # the most expensive way around the loop
+
+
+class Analysis:
+    def __init__(self, code, start=START):
+        self.code = code
+        self.start = start
+        self.cells = {}  # reachable address -> instruction
+        self.leaders = {start}
+        self.entries = {start}  # start of the program and called addresses
+        self.explore()
+        self.blocks = self.split()
+        self.loops = {}  # (header, tail) -> Loop
+        self.paths = {}  # entry -> worst-case Path
+        self._visiting = set()
+        for entry in sorted(self.entries):
+            self.path(entry)
+
+    def instruction(self, adr):
+        cell = self.code[adr] if 0 <= adr < len(self.code) else None
+        if isinstance(cell, Instruction) and cell.opcode in ISA:
+            return cell
+        return None
+
+    def explore(self):
+        pending = [self.start]
+        while pending:
+            adr = pending.pop()
+            cell = self.instruction(adr)
+            if cell is None or adr in self.cells:
+                continue
+            self.cells[adr] = cell
+            following = [next_adr for next_adr, _ in transfers(adr, cell)]
+            info = ISA[cell.opcode]
+            if info.opcode is Opcode.CALL and target(cell) is not None:
+                self.entries.add(target(cell))
+                following.append(target(cell))
+            if info.kind is OpcodeKind.BRANCH or info.opcode in BLOCK_TERMINATORS:
+                self.leaders.update(following)
+            pending += following
+
+    def split(self):
+        blocks = {}
+        for leader in sorted(self.leaders & self.cells.keys()):
+            block = blocks[leader] = BasicBlock(leader)
+            adr = leader
+            while True:
+                cell = self.cells[adr]
+                block.add(cell)
+                info = ISA[cell.opcode]
+                if info.kind is OpcodeKind.BRANCH or info.opcode in BLOCK_TERMINATORS:
+                    break
+                if adr + 1 in self.leaders or adr + 1 not in self.cells:
+                    break
+                adr += 1
+            following = transfers(adr, cell)
+            block.successors = [(next_adr, extra) for next_adr, extra in following if next_adr in self.cells]
+            block.partial = len(block.successors) < len(following) or (
+                    info.opcode in {Opcode.JUMP, Opcode.CALL} and target(cell) is None)
+            if info.opcode is Opcode.CALL:
+                block.call = target(cell)
+        return blocks
+
+    def walk(self, entry):
+        # DFS postorder of the blocks reachable from the entry and the edges back to the DFS stack
+        order, back = [], set()
+        on_stack = {entry: True}
+        stack = [(entry, iter(self.blocks[entry].successors))]
+        while stack:
+            start, edges = stack[-1]
+            for next_adr, _ in edges:
+                if next_adr not in on_stack:
+                    on_stack[next_adr] = True
+                    stack.append((next_adr, iter(self.blocks[next_adr].successors)))
+                    break
+                if on_stack[next_adr]:
+                    back.add((start, next_adr))
+            else:
+                stack.pop()
+                on_stack[start] = False
+                order.append(start)
+        return order, back
+
+    def cost(self, block):
+        # ticks, word ticks and partial flag of a block with the called code
+        ticks, word_ticks, partial = block.ticks, block.word_ticks, block.partial
+        if block.call is not None:
+            called = self.path(block.call)
+            if called is None:  # recursion
+                return ticks, word_ticks, True
+            ticks, word_ticks, partial = ticks + called.ticks, word_ticks + called.word_ticks, partial or called.partial
+        return ticks, word_ticks, partial
+
+    def longest(self, order, back, source, inside=None):
+        # the most expensive paths from the source without back edges, order is DFS postorder
+        paths = {source: Path([], 0, 0, False).extend(source, *self.cost(self.blocks[source]))}
+        for start in reversed(order):
+            if start not in paths:
+                continue
+            for next_adr, extra in self.blocks[start].successors:
+                if (start, next_adr) in back or (inside is not None and next_adr not in inside):
+                    continue
+                ticks, word_ticks, partial = self.cost(self.blocks[next_adr])
+                path = paths[start].extend(next_adr, ticks + extra, word_ticks, partial)
+                if next_adr not in paths or path.ticks > paths[next_adr].ticks:
+                    paths[next_adr] = path
+        return paths
+
+    def path(self, entry):
+        # worst-case path from the entry to a block without forward successors, None inside of recursion
+        if entry in self.paths:
+            return self.paths[entry]
+        if entry not in self.blocks:  # no instruction at the entry
+            return Path([], 0, 0, True)
+        if entry in self._visiting:
+            return None
+        self._visiting.add(entry)
+        order, back = self.walk(entry)
+        paths = self.longest(order, back, entry)
+        ends = [start for start in paths
+                if all((start, next_adr) in back for next_adr, _ in self.blocks[start].successors)]
+        self.paths[entry] = max((paths[start] for start in ends), key=lambda path: path.ticks)
+
+        for tail, header in sorted(back):
+            if (header, tail) not in self.loops:
+                self.loops[header, tail] = self.loop(order, back, header, tail)
+        self._visiting.discard(entry)
+        return self.paths[entry]
+
+    def loop(self, order, back, header, tail):
+        predecessors = {}
+        for start in order:
+            for next_adr, _ in self.blocks[start].successors:
+                predecessors.setdefault(next_adr, []).append(start)
+        body, pending = {header, tail}, [tail]
+        while pending:
+            for start in predecessors.get(pending.pop(), []):
+                if start not in body:
+                    body.add(start)
+                    pending.append(start)
+        around = self.longest(order, back, header, body)[tail]
+        extra = sum(extra for next_adr, extra in self.blocks[tail].successors if next_adr == header)
+        return Loop(header, tail, sorted(body), Path(around.blocks, around.ticks + extra, around.word_ticks,
+                                                    around.partial))
+
+    def worst(self):
+        return self.paths[self.start]
+
+    def report(self, source_map=None):
+        def name(address):
+            if source_map is None:
+                return str(address)
+            return "{} {}".format(address, source_map.describe(address))
+
+        worst = self.worst()
+        out = ["blocks: {} loops: {} worst-case path: {}".format(len(self.blocks), len(self.loops), worst), ""]
+        out.append("{:>6} {:>10}  {}".format("ip", "ticks", "instruction"))
+        for adr, cell in sorted(self.cells.items()):
+            block = self.blocks.get(adr)
+            if block is not None:
+                following = ", ".join(str(next_adr) for next_adr, _ in block.successors) or "-"
+                calls = "" if block.call is None else " call {}".format(block.call)
+                # own ticks of the block, paths include the called code
+                out.append("block {}..{}: {}{} -> {}".format(
+                    adr, block.end - 1, Path([], block.ticks, block.word_ticks, block.partial), calls, following))
+            instruction = cell.opcode if cell.arg is None else "{} {} {}".format(
+                cell.opcode, cell.arg, Addressing(cell.addressing).name)
+            note = "" if source_map is None else "  " + source_map.describe(adr)
+            out.append("{:>6} {:>10}  {}{}".format(adr, ticks_note(cell), instruction, note))
+
+        out += ["", "loops:"]
+        for (header, tail), loop in sorted(self.loops.items()):
+            out.append("  {} (back from {}): {} per iteration, blocks {}".format(
+                name(header), tail, loop.iteration, " ".join(map(str, loop.body))))
+
+        out += ["", "worst-case paths:"]
+        for entry, path in sorted(self.paths.items()):
+            out.append("  {}: {}, blocks {}".format(name(entry), path, " -> ".join(map(str, path.blocks))))
+        return "\n".join(out) + "\n"
+
+
+def main(code_file, report_file, source_map_file=None):
+    source_map = load_source_map(source_map_file) if source_map_file is not None else None
+    analysis = Analysis(load_code(code_file))
+    with open(report_file, "w", encoding="utf-8") as file:
+        file.write(analysis.report(source_map))
+    print("blocks: {} loops: {} worst-case path: {}".format(
+        len(analysis.blocks), len(analysis.loops), analysis.worst()))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (3, 4), "Wrong arguments: cost.py <code_file> <report_file> [<source_map_file>]"
+    main(*sys.argv[1:])
@@ -0,0 +1,172 @@
+import asyncio
+import functools
+import json
+import re
+import socket
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from src.batch import simulate_case
+from src.fast import predecode_code
+from src.isa import Instruction
+from src.machine import INSTRUCTION_LIMIT, load_input, to_machine_code
+from src.run import assemble_code, input_tokens
+
+# Local simulation daemon: newline-delimited JSON requests on a Unix socket or a localhost TCP port.
+# A job is {"source": assembly} or {"code": translator output} with "input" (a string is text input,
+# a list is numeric input), "output_mode" and "limit". A request is a job or {"jobs": [...]} with fields
+# shared by the jobs, the answer is a batch.simulate_case result or {"results": [...]}. Jobs run on a process pool, every worker keeps
+# an LRU cache of translated programs with their fast engine records, so a repeated program is not translated
+# and decoded again. The client "limit" is clamped to MAX_LIMIT.
+PROGRAM_CACHE_SIZE = 256
+MAX_LIMIT = INSTRUCTION_LIMIT
+CHUNK_SIZE = 16
+REQUEST_LIMIT = 64 * 1024 * 1024  # bytes in one request line
+DEFAULT_HOST = "127.0.0.1"
+TCP_ADDRESS = re.compile(r"^([\w.\-]*):(\d+)$")
+
+
+@functools.lru_cache(maxsize=PROGRAM_CACHE_SIZE)
+def load_program(kind, text):
+    if kind == "source":
+        code = assemble_code(text)
+    else:
+        code = to_machine_code([Instruction(**fields) for fields in json.loads(text)])
+    return code, predecode_code(code)
+
+
+def run_job(job):
+    try:
+        assert isinstance(job, dict), "Job must be an object"
+        kind = "source" if "source" in job else "code"
+        code, program = load_program(kind, job[kind])
+        tokens = input_tokens(job.get("input", ""))
+        limit = min(int(job.get("limit", MAX_LIMIT)), MAX_LIMIT)
+    except Exception as e:
+        return {"error": "{}: {}".format(type(e).__name__, e)}
+    return simulate_case(code, tokens, job.get("output_mode", "text"), limit, program)
+
+
+def run_jobs(jobs):
+    return [run_job(job) for job in jobs]
+
+
+def parse_address(address):
+    # "host:port" or "port" for TCP, anything else is a Unix socket path
+    match = TCP_ADDRESS.match(address)
+    if match is not None:
+        return match[1] or DEFAULT_HOST, int(match[2])
+    if address.isdigit():
+        return DEFAULT_HOST, int(address)
+    return address
+
+
+class Daemon:
+    def __init__(self, executor):
+        self.executor = executor
+        self.jobs = 0
+
+    async def submit(self, jobs):
+        loop = asyncio.get_running_loop()
+        chunks = [jobs[start:start + CHUNK_SIZE] for start in range(0, len(jobs), CHUNK_SIZE)]
+        results = await asyncio.gather(*(loop.run_in_executor(self.executor, run_jobs, chunk) for chunk in chunks))
+        self.jobs += len(jobs)
+        return [result for chunk in results for result in chunk]
+
+    async def answer(self, line):
+        try:
+            request = json.loads(line)
+            assert isinstance(request, dict), "Request must be an object"
+            assert isinstance(request.get("jobs", []), list), "Jobs must be a list"
+        except (ValueError, AssertionError) as e:
+            return {"error": "{}: {}".format(type(e).__name__, e)}
+        if "jobs" in request:
+            # the other fields of a batch are shared by its jobs, e.g. one source for many inputs
+            shared = {key: value for key, value in request.items() if key != "jobs"}
+            jobs = [{**shared, **job} if isinstance(job, dict) else job for job in request["jobs"]]
+            return {"results": await self.submit(jobs)}
+        return (await self.submit([request]))[0]
+
+    async def handle(self, reader, writer):
+        # requests of one connection are answered in order
+        try:
+            while line := await reader.readline():
+                writer.write(json.dumps(await self.answer(line)).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, address, started=None):
+        address = parse_address(address)
+        if isinstance(address, tuple):
+            server = await asyncio.start_server(self.handle, *address, limit=REQUEST_LIMIT)
+        else:
+            server = await asyncio.start_unix_server(self.handle, address, limit=REQUEST_LIMIT)
+        async with server:
+            if started is not None:
+                started.set()
+            await server.serve_forever()
+
+
+class Client:
+    def __init__(self, address):
+        address = parse_address(address)
+        family = socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.connect(address)
+        self.file = self.socket.makefile("rwb")
+
+    def request(self, request):
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        return json.loads(self.file.readline())
+
+    def run(self, job):
+        return self.request(job)
+
+    def run_batch(self, jobs, **shared):
+        return self.request({**shared, "jobs": jobs})["results"]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main_serve(address, workers=None):
+    with ProcessPoolExecutor(max_workers=None if workers is None else int(workers)) as executor:
+        asyncio.run(Daemon(executor).serve(address))
+
+
+def main_run(address, program_file, input_file, output_mode):
+    with open(program_file, encoding="utf-8") as file:
+        text = file.read()
+    # text input goes as character codes, the daemon writes them to memory the same way
+    job = {"source" if program_file.endswith(".asm") else "code": text, "output_mode": output_mode,
+           "input": load_input(input_file)[1:].tolist()}
+    with Client(address) as client:
+        result = client.run(job)
+    if "error" in result:
+        print(result["error"])
+        return
+    print(result["output"])
+    print("instructions_executed: {} ticks: {}".format(result["instructions"], result["ticks"]))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 3, (
+        "Wrong arguments: daemon.py serve <address> [<workers>] | "
+        "daemon.py run <address> <asm_or_code_file> <input_file> <output_mode>")
+    if sys.argv[1] == "serve":
+        assert len(sys.argv) in (3, 4), "Wrong arguments: daemon.py serve <address> [<workers>]"
+        main_serve(*sys.argv[2:])
+    else:
+        assert sys.argv[1] == "run", "Unknown command: {}".format(sys.argv[1])
+        assert len(sys.argv) == 6, (
+            "Wrong arguments: daemon.py run <address> <asm_or_code_file> <input_file> <output_mode>")
+        main_run(*sys.argv[2:])
@@ -0,0 +1,328 @@
+import logging
+import sys
+
+import src.machine as machine
+from src.components.alu import MAX_NUMBER
+from src.components.memory import NO_OBJECT, Memory
+from src.isa import ADDRESSING_TICKS, BLOCK_WORD_TICKS, FETCH_TICKS, ISA, Addressing, Instruction, Opcode, OpcodeKind
+from src.machine import ControlUnit, DataPath, IOController
+
+# Predecoded execution engine: every instruction object of the memory is decoded once into
+# a record (instruction, handler, arg, ticks). The handlers reproduce the microsteps of
+# ControlUnit.address_fetch / execution_fetch directly on the DataPath registers, so the
+# architectural state, tick and instruction counters stay exactly the same as in simulation().
+
+
+def _operand_fetch(dp):
+    dp.ar = dp.alu.value
+    dp.dr = dp.memory.read(dp.ar)
+
+
+def _addr_direct_abs(cu, dp, arg):
+    dp.data_stack.push(dp.tos)
+    dp.alu.first_value = dp.alu.value = dp.dr = arg
+    dp.tos = dp.data_stack.pop()
+    _operand_fetch(dp)
+
+
+def _addr_load(cu, dp, arg):
+    dp.alu.first_value = dp.alu.value = dp.dr = arg
+
+
+def _addr_direct_shift(cu, dp, arg):
+    dp.data_stack.push(dp.tos)
+    dp.data_stack.push(dp.ip)
+    dp.tos = arg
+    alu = dp.alu
+    alu.second_value = dp.data_stack.pop()
+    alu.value = alu.set_flags(ISA[Opcode.ADD].alu(alu.first_value, alu.second_value))
+    _operand_fetch(dp)
+
+
+def _make_addr_post(step):
+    def handler(cu, dp, arg):
+        dp.data_stack.push(dp.tos)
+        dp.ar = arg
+        dp.tos = dp.dr = dp.memory.read(arg)
+        alu = dp.alu
+        alu.first_value = dp.tos
+        dp.dr = alu.value = alu.set_flags(dp.tos + step)
+        dp.memory.write(arg, dp.dr)
+        alu.value = dp.tos
+        dp.tos = dp.data_stack.pop()
+        _operand_fetch(dp)
+
+    return handler
+
+
+ADDRESSING_HANDLERS = {
+    Addressing.NONE.value: None,
+    Addressing.DIRECT_ABS.value: _addr_direct_abs,
+    Addressing.LOAD.value: _addr_load,
+    Addressing.DIRECT_SHIFT.value: _addr_direct_shift,
+    Addressing.POST_INC.value: _make_addr_post(1),
+    Addressing.POST_DEC.value: _make_addr_post(-1),
+}
+
+
+def _make_alu(info):
+    operation = info.alu
+    binary = info.operands == 2
+
+    def handler(cu, dp, arg):
+        alu = dp.alu
+        alu.first_value = dp.tos
+        if binary:
+            alu.second_value = dp.data_stack.pop()
+        dp.tos = alu.value = alu.set_flags(operation(alu.first_value, alu.second_value))
+
+    return handler
+
+
+def _make_branch(info):
+    operation = info.alu
+
+    def handler(cu, dp, arg):
+        alu = dp.alu
+        alu.first_value = dp.tos
+        alu.second_value = dp.data_stack.pop()
+        alu.value = alu.set_flags(operation(alu.first_value, alu.second_value))
+        if alu.value == 1:
+            cu._tick += 1
+            alu.first_value = dp.ip
+            dp.ip = alu.value = alu.set_flags(dp.ip + 1)
+
+    return handler
+
+
+def _exec_ld(cu, dp, arg):
+    dp.data_stack.push(dp.tos)
+    dp.tos = dp.dr
+
+
+def _exec_st(cu, dp, arg):
+    dp.alu.first_value = dp.alu.value = dp.dr = dp.tos
+    dp.memory.write(dp.ar, dp.dr)
+
+
+def _exec_jump(cu, dp, arg):
+    dp.ip = dp.alu.value
+
+
+def _exec_call(cu, dp, arg):
+    cu.return_stack.push(dp.ip)
+    dp.ip = dp.alu.value
+
+
+def _exec_ret(cu, dp, arg):
+    dp.ip = cu.return_stack.pop()
+
+
+def _exec_swap(cu, dp, arg):
+    dp.br = dp.data_stack.pop()
+    dp.data_stack.push(dp.tos)
+    dp.tos = dp.br
+
+
+def _exec_dup(cu, dp, arg):
+    dp.data_stack.push(dp.tos)
+
+
+def _exec_pop(cu, dp, arg):
+    dp.tos = dp.data_stack.pop()
+
+
+def _exec_in(cu, dp, arg):
+    cu.io_controller.get()
+
+
+def _exec_out(cu, dp, arg):
+    cu.io_controller.send()
+
+
+def _block_operands(dp):
+    alu = dp.alu
+    alu.first_value = count = dp.tos
+    alu.second_value = adr = dp.data_stack.pop()
+    alu.value = alu.set_flags(count + adr)
+    return count, adr
+
+
+def _block_done(cu, dp, count):
+    cu._tick += max(count, 0) * BLOCK_WORD_TICKS
+    dp.tos = dp.alu.value
+
+
+def _exec_inb(cu, dp, arg):
+    count, adr = _block_operands(dp)
+    cu.io_controller.get_block(adr, count)
+    _block_done(cu, dp, count)
+
+
+def _exec_outb(cu, dp, arg):
+    count, adr = _block_operands(dp)
+    cu.io_controller.send_block(adr, count)
+    _block_done(cu, dp, count)
+
+
+def _exec_movb(cu, dp, arg):
+    count, adr = _block_operands(dp)
+    dp.br = dp.data_stack.pop()
+    dp.memory.move(dp.br, adr, count)
+    _block_done(cu, dp, count)
+
+
+def _exec_hlt(cu, dp, arg):
+    raise StopIteration
+
+
+def _exec_nop(cu, dp, arg):
+    pass
+
+
+EXECUTION_HANDLERS = {
+    Opcode.LD: _exec_ld,
+    Opcode.ST: _exec_st,
+    Opcode.JUMP: _exec_jump,
+    Opcode.CALL: _exec_call,
+    Opcode.RET: _exec_ret,
+    Opcode.SWAP: _exec_swap,
+    Opcode.DUP: _exec_dup,
+    Opcode.POP: _exec_pop,
+    Opcode.IN: _exec_in,
+    Opcode.OUT: _exec_out,
+    Opcode.HLT: _exec_hlt,
+    Opcode.NOP: _exec_nop,
+    Opcode.INB: _exec_inb,
+    Opcode.OUTB: _exec_outb,
+    Opcode.MOVB: _exec_movb,
+}
+for _info in ISA.values():
+    if _info.kind is OpcodeKind.ALU:
+        EXECUTION_HANDLERS[_info.opcode] = _make_alu(_info)
+    elif _info.kind is OpcodeKind.BRANCH:
+        EXECUTION_HANDLERS[_info.opcode] = _make_branch(_info)
+
+_handler_cache = {}
+
+
+def _combine(address, execute):
+    if address is None:
+        return execute
+
+    def handler(cu, dp, arg):
+        address(cu, dp, arg)
+        execute(cu, dp, arg)
+
+    return handler
+
+
+def decode(cell):
+    # returns None for everything that has to go through the reference ControlUnit
+    if not isinstance(cell, Instruction):
+        return None
+    info = ISA.get(cell.opcode)
+    if info is None or cell.addressing not in ADDRESSING_HANDLERS:
+        return None
+    try:
+        arg = None if cell.addressing == Addressing.NONE.value else cell.get_arg()
+    except (ValueError, TypeError):
+        return None
+
+    key = (info.opcode, cell.addressing)
+    if key not in _handler_cache:
+        handler = _combine(ADDRESSING_HANDLERS[cell.addressing], EXECUTION_HANDLERS[info.opcode])
+        _handler_cache[key] = (handler, FETCH_TICKS + ADDRESSING_TICKS[cell.addressing] + info.ticks)
+    handler, ticks = _handler_cache[key]
+    return cell, handler, arg, ticks
+
+
+def predecode(memory, program=None):
+    # records are kept parallel to the memory objects table, new objects get decoded on demand
+    program = [] if program is None else program
+    program.extend(decode(obj) for obj in memory.objects[len(program):])
+    return program
+
+
+def predecode_code(code):
+    # records of a memory loaded with this code, the objects table is filled in code order
+    return predecode(Memory(code, len(code), 0))
+
+
+class FastControlUnit(ControlUnit):
+    def __init__(self, data_path: DataPath, io_controller: IOController, program=None):
+        super().__init__(data_path, io_controller)
+        # program is a predecode_code result of the same code, records of new objects go to a copy
+        self.program = predecode(data_path.memory, None if program is None else list(program))
+        self.halted = False
+
+    def execute(self):
+        dp = self.data_path
+        ip = dp.ip
+        number = dp.memory.code[ip]
+        if number >= len(self.program):
+            predecode(dp.memory, self.program)
+        record = None if number == NO_OBJECT else self.program[number]
+        if record is None:
+            super().execute()
+            return
+        cell, handler, arg, ticks = record
+
+        # instruction fetch
+        dp.ar = ip
+        dp.dr = self.cr = cell
+        alu = dp.alu
+        alu.first_value = ip
+        ip += 1
+        if 0 < ip <= MAX_NUMBER:
+            alu.n_flag = alu.z_flag = alu.v_flag = 0
+            alu.value = ip
+        else:
+            alu.value = ip = alu.set_flags(ip)
+        dp.ip = ip
+
+        self._tick += ticks
+        handler(self, dp, arg)
+
+    def run(self, limit, trace=None):
+        execute = self.execute
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        instr_counter = 0
+        try:
+            while instr_counter < limit:
+                execute()
+                instr_counter += 1
+                if debug:
+                    logging.debug("%s", self)
+                if trace is not None:
+                    trace.record(self)
+        except (StopIteration, EOFError):
+            self.halted = True
+        return instr_counter
+
+
+def fast_simulation(code, input_tokens, limit, output_file, output_mode, trace=None, memory=None, program=None):
+    data_path = DataPath(code, limit, input_tokens[0], memory)
+    io_controller = IOController(data_path, input_tokens, 0, output_file, output_mode)
+    control_unit = FastControlUnit(data_path, io_controller, program)
+
+    logging.debug("%s", control_unit)
+    if trace is not None:
+        trace.record(control_unit)
+    instr_counter = control_unit.run(limit, trace)
+    if control_unit.halted:
+        io_controller.finish()
+
+    if instr_counter >= limit:
+        logging.warning("Limit exceeded!")
+    return instr_counter, control_unit._tick
+
+
+def main(code_file, input_file, output_file, output_mode, trace_file=None):
+    machine.main(code_file, input_file, output_file, output_mode, trace_file, fast_simulation)
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (5, 6), (
+        "Wrong arguments: fast.py <code_file> <input_file> <output_file> <output_mode> [<trace_file>]")
+    main(*sys.argv[1:])
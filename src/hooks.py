@@ -0,0 +1,167 @@
+import logging
+import sys
+
+from src.fast import FastControlUnit, fast_simulation
+from src.isa import ISA, Addressing, Opcode, OpcodeKind
+from src.machine import INSTRUCTION_LIMIT, DataPath, IOController, load_code, load_input
+
+# Instrumentation: breakpoints on IP, watchpoints on memory writes and callbacks on opcodes, opcode kinds,
+# I/O, CALL and RET. Hooks run in a separate ControlUnit subclass, without hooks hooked_simulation is
+# fast_simulation, so normal runs do not check anything per instruction.
+# Callbacks:
+#   breakpoint(control_unit, ip) - before the instruction at ip
+#   watchpoint(control_unit, ip, address) - after the instruction at ip wrote the address
+#   opcode(control_unit, ip, instruction) - after the instruction, on_io is opcode for IN, OUT, INB, OUTB
+#   call(control_unit, ip, target) and return(control_unit, ip, return_address) - after CALL and RET
+# A callback returning True stops the run, the next run goes on from the same place.
+# HLT ends the run before its hooks.
+
+
+class Hooks:
+    def __init__(self):
+        self.breakpoints = {}  # ip -> callbacks
+        self.watchpoints = {}  # address -> callbacks
+        self.opcodes = {}  # Opcode -> callbacks
+        self.calls = []
+        self.returns = []
+
+    def __bool__(self):
+        return any((self.breakpoints, self.watchpoints, self.opcodes, self.calls, self.returns))
+
+    def add_breakpoint(self, ip, callback):
+        self.breakpoints.setdefault(ip, []).append(callback)
+
+    def add_watchpoint(self, address, callback):
+        self.watchpoints.setdefault(address, []).append(callback)
+
+    def on_opcode(self, opcode, callback):
+        # an Opcode, a mnemonic or a whole OpcodeKind
+        if isinstance(opcode, OpcodeKind):
+            opcodes = [info.opcode for info in ISA.values() if info.kind is opcode]
+        else:
+            opcodes = [ISA[opcode].opcode]
+        for one in opcodes:
+            self.opcodes.setdefault(one, []).append(callback)
+
+    def on_io(self, callback):
+        self.on_opcode(OpcodeKind.IO, callback)
+
+    def on_call(self, callback):
+        self.calls.append(callback)
+
+    def on_return(self, callback):
+        self.returns.append(callback)
+
+
+def written(control_unit, cell):
+    # memory addresses written by the executed instruction
+    dp = control_unit.data_path
+    opcode = ISA[cell.opcode].opcode
+    out = []
+    if cell.addressing in {Addressing.POST_INC.value, Addressing.POST_DEC.value}:
+        out.append(cell.get_arg())
+    if opcode is Opcode.ST:
+        out.append(dp.ar)
+    elif opcode is Opcode.IN:
+        out.append(control_unit.io_controller.memAddr)
+    elif opcode in {Opcode.INB, Opcode.MOVB}:
+        # block operands stay in the ALU: count and destination address
+        return range(dp.alu.second_value, dp.alu.second_value + max(dp.alu.first_value, 0))
+    return out
+
+
+class HookedControlUnit(FastControlUnit):
+    def __init__(self, data_path: DataPath, io_controller: IOController, hooks: Hooks):
+        super().__init__(data_path, io_controller)
+        self.hooks = hooks
+        self.stopped = None  # ip of the breakpoint the last run stopped at
+
+    def fire(self, callbacks, *args):
+        stop = False
+        for callback in callbacks:
+            stop = bool(callback(self, *args)) or stop
+        return stop
+
+    def after(self, ip, cell):
+        hooks = self.hooks
+        opcode = ISA[cell.opcode].opcode
+        stop = self.fire(hooks.opcodes.get(opcode, ()), ip, cell)
+        if opcode is Opcode.CALL:
+            stop = self.fire(hooks.calls, ip, self.data_path.ip) or stop
+        elif opcode is Opcode.RET:
+            stop = self.fire(hooks.returns, ip, self.data_path.ip) or stop
+        if hooks.watchpoints:
+            addresses = written(self, cell)
+            for address in sorted(address for address in hooks.watchpoints if address in addresses):
+                stop = self.fire(hooks.watchpoints[address], ip, address) or stop
+        return stop
+
+    def run(self, limit, trace=None):
+        dp = self.data_path
+        breakpoints = self.hooks.breakpoints
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        # the breakpoint the previous run stopped at is passed
+        resume, self.stopped = self.stopped, None
+        instr_counter = 0
+        try:
+            while instr_counter < limit:
+                ip = dp.ip
+                if ip in breakpoints and ip != resume and self.fire(breakpoints[ip], ip):
+                    self.stopped = ip
+                    break
+                resume = None
+                self.execute()
+                instr_counter += 1
+                if debug:
+                    logging.debug("%s", self)
+                if trace is not None:
+                    trace.record(self)
+                if self.after(ip, self.cr):
+                    break
+        except (StopIteration, EOFError):
+            self.halted = True
+        return instr_counter
+
+
+def hooked_simulation(code, input_tokens, limit, output_file, output_mode, hooks, trace=None, memory=None):
+    if not hooks:
+        return fast_simulation(code, input_tokens, limit, output_file, output_mode, trace, memory)
+    data_path = DataPath(code, limit, input_tokens[0], memory)
+    io_controller = IOController(data_path, input_tokens, 0, output_file, output_mode)
+    control_unit = HookedControlUnit(data_path, io_controller, hooks)
+
+    logging.debug("%s", control_unit)
+    if trace is not None:
+        trace.record(control_unit)
+    instr_counter = control_unit.run(limit, trace)
+    if control_unit.halted:
+        io_controller.finish()
+
+    if instr_counter >= limit:
+        logging.warning("Limit exceeded!")
+    return instr_counter, control_unit._tick
+
+
+def print_state(control_unit, ip, *args):
+    print("{} {}: {}".format("watch" if args else "break", args[-1] if args else ip, control_unit))
+
+
+def parse_addresses(text):
+    return [int(address) for address in text.split(",") if address]
+
+
+def main(code_file, input_file, output_file, output_mode, breakpoints, watchpoints=""):
+    hooks = Hooks()
+    for ip in parse_addresses(breakpoints):
+        hooks.add_breakpoint(ip, print_state)
+    for address in parse_addresses(watchpoints):
+        hooks.add_watchpoint(address, print_state)
+    instr_counter, ticks = hooked_simulation(
+        load_code(code_file), load_input(input_file), INSTRUCTION_LIMIT, output_file, output_mode, hooks)
+    print("instructions_executed: {} ticks: {}".format(instr_counter, ticks))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (6, 7), (
+        "Wrong arguments: hooks.py <code_file> <input_file> <output_file> <output_mode> <ip,...> [<address,...>]")
+    main(*sys.argv[1:])
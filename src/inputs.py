@@ -0,0 +1,124 @@
+import mmap
+import sys
+from array import array
+from pathlib import Path
+
+# Input loading: the tokens of a file are stored in one typed array with the count of tokens first,
+# IOController reads the array directly. Formats:
+#   text    - every character of the file (all lines), code points in int32 words
+#   numeric - "[1, 2, -3]": decimal integers separated by commas and/or whitespace, any number of lines
+#   binary  - raw little-endian int32 words, read through mmap
+# Numeric input is parsed with int(), nothing from the file is evaluated.
+INPUT_CHUNK = 1 << 16
+TEXT_WORD = "i"
+NUMBER_WORD = "q"
+BINARY_WORD = "i"
+BINARY_SUFFIX = ".bin"
+INPUT_FORMATS = ("text", "numeric", "binary")
+TEXT_ENCODING = "utf-32-le" if sys.byteorder == "little" else "utf-32-be"
+SEPARATORS = (b" ", b",", b"\n", b"\r", b"\t")
+
+
+class InputFormatError(Exception):
+    def __init__(self, input_file, reason):
+        super().__init__(f"Error: unable to load input {input_file} - {reason}")
+
+
+def detect_format(input_file):
+    if Path(input_file).suffix == BINARY_SUFFIX:
+        return "binary"
+    with open(input_file, "rb") as file:
+        return "numeric" if file.read(1) == b"[" else "text"
+
+
+def load_text(input_file):
+    tokens = array(TEXT_WORD, [0])
+    with open(input_file, encoding="utf-8") as file:
+        while chunk := file.read(INPUT_CHUNK):
+            tokens.frombytes(chunk.encode(TEXT_ENCODING))
+    tokens[0] = len(tokens) - 1
+    return tokens
+
+
+def parse_numbers(input_file, data, tokens):
+    # data is split in chunks at the last separator, a number is never cut
+    tail = b""
+    for start in range(0, len(data), INPUT_CHUNK):
+        chunk = tail + data[start:start + INPUT_CHUNK]
+        cut = len(chunk)
+        if start + INPUT_CHUNK < len(data):
+            cut = max(chunk.rfind(separator) for separator in SEPARATORS) + 1
+        words = chunk[:cut].replace(b",", b" ").split()
+        tail = chunk[cut:]
+        try:
+            tokens.extend(map(int, words))
+        except (ValueError, OverflowError):
+            for word in words:
+                try:
+                    array(NUMBER_WORD, [int(word)])
+                except (ValueError, OverflowError):
+                    raise InputFormatError(input_file, "invalid number: {!r}".format(word.decode(
+                        errors="replace"))) from None
+            raise
+
+
+def load_numeric(input_file):
+    tokens = array(NUMBER_WORD, [0])
+    with open(input_file, "rb") as file:
+        if file.seek(0, 2) == 0:
+            raise InputFormatError(input_file, "numeric input must be enclosed in []")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            start, end = buffer.find(b"["), buffer.rfind(b"]")
+            if start < 0 or end < start or buffer[:start].strip() or buffer[end + 1:].strip():
+                raise InputFormatError(input_file, "numeric input must be enclosed in []")
+            with memoryview(buffer) as data, data[start + 1:end] as body:
+                parse_numbers(input_file, body, tokens)
+    tokens[0] = len(tokens) - 1
+    return tokens
+
+
+def load_binary(input_file):
+    tokens = array(BINARY_WORD, [0])
+    with open(input_file, "rb") as file:
+        if file.seek(0, 2) == 0:
+            return tokens
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if len(buffer) % tokens.itemsize != 0:
+                raise InputFormatError(input_file, "size is not a multiple of {}".format(tokens.itemsize))
+            # the whole file is copied once, from the page cache to the array
+            tokens.frombytes(buffer)
+    if sys.byteorder != "little":
+        tokens.byteswap()
+    tokens[0] = len(tokens) - 1
+    return tokens
+
+
+LOADERS = {
+    "text": load_text,
+    "numeric": load_numeric,
+    "binary": load_binary,
+}
+
+
+def load_input(input_file, input_format=None):
+    input_format = detect_format(input_file) if input_format is None else input_format
+    assert input_format in LOADERS, "Unknown input format: {}".format(input_format)
+    return LOADERS[input_format](input_file)
+
+
+def write_binary(input_file, binary_file, input_format=None):
+    tokens = load_input(input_file, input_format)
+    try:
+        words = array(BINARY_WORD, tokens[1:])
+    except OverflowError:
+        raise InputFormatError(input_file, "number is out of int32 range") from None
+    if sys.byteorder != "little":
+        words.byteswap()
+    with open(binary_file, "wb") as file:
+        words.tofile(file)
+    return len(words)
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (3, 4), "Wrong arguments: inputs.py <input_file> <binary_file> [<input_format>]"
+    print("tokens: {}".format(write_binary(*sys.argv[1:])))
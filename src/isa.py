@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import struct
 from enum import Enum
 
 
@@ -50,11 +51,16 @@ class Opcode(str, Enum):
     HLT = "HLT"
     NOP = "NOP"
 
+    # blocks: count in TOS, addresses on DataStack
+    INB = "INB"  # input -> memory range
+    OUTB = "OUTB"  # memory range -> output
+    MOVB = "MOVB"  # memory range -> memory range
+
     def __str__(self):
         return str(self.value)
 
     def index(self):
-        return list(Opcode).index(self.value)
+        return ISA[self].code
 
 
 class Addressing(Enum):
@@ -66,6 +72,88 @@ class Addressing(Enum):
     NONE = 5
 
 
+class OpcodeKind(Enum):
+    ALU = 0
+    BRANCH = 1
+    MEMORY = 2
+    STACK = 3
+    CONTROL = 4
+    IO = 5
+    SYSTEM = 6
+
+
+class OpcodeInfo:
+    def __init__(self, code, opcode, kind, args, operands, alu, ticks):
+        self.code = code  # dense opcode number
+        self.opcode = opcode
+        self.kind = kind
+        self.args = args  # arguments in assembly
+        self.operands = operands  # values taken by ALU from TOS and DataStack
+        self.alu = alu
+        self.ticks = ticks  # ticks of execution stage
+
+
+FETCH_TICKS = 4
+BRANCH_TAKEN_TICKS = 1
+# ticks per moved word of INB, OUTB and MOVB
+BLOCK_WORD_TICKS = 1
+# ticks of address stage including operand fetch
+ADDRESSING_TICKS = {
+    Addressing.DIRECT_ABS.value: 5,
+    Addressing.DIRECT_SHIFT.value: 7,
+    Addressing.LOAD.value: 1,
+    Addressing.POST_INC.value: 11,
+    Addressing.POST_DEC.value: 11,
+    Addressing.NONE.value: 0,
+}
+
+
+def div_toward_zero(x, y):
+    # integer division truncated toward zero, like in two's complement hardware
+    quotient = abs(x) // abs(y)
+    return quotient if (x < 0) == (y < 0) else -quotient
+
+
+ISA_TABLE = [
+    # opcode      kind                 args  operands  alu                                           ticks
+    (Opcode.CLA,  OpcodeKind.ALU,      0,    1,        lambda x, y: 0,                               2),
+    (Opcode.NEG,  OpcodeKind.ALU,      0,    1,        lambda x, y: -x,                              2),
+    (Opcode.INC,  OpcodeKind.ALU,      0,    1,        lambda x, y: x + 1,                           2),
+    (Opcode.DEC,  OpcodeKind.ALU,      0,    1,        lambda x, y: x - 1,                           2),
+    (Opcode.NOT,  OpcodeKind.ALU,      0,    1,        lambda x, y: ~x,                              2),
+    (Opcode.AND,  OpcodeKind.ALU,      0,    2,        lambda x, y: x & y,                           2),
+    (Opcode.OR,   OpcodeKind.ALU,      0,    2,        lambda x, y: x | y,                           2),
+    (Opcode.ADD,  OpcodeKind.ALU,      0,    2,        lambda x, y: x + y,                           2),
+    (Opcode.SUB,  OpcodeKind.ALU,      0,    2,        lambda x, y: x - y,                           2),
+    (Opcode.CMP,  OpcodeKind.ALU,      0,    2,        lambda x, y: x - y,                           2),
+    (Opcode.MUL,  OpcodeKind.ALU,      0,    2,        lambda x, y: x * y,                           2),
+    (Opcode.DIV,  OpcodeKind.ALU,      0,    2,        lambda x, y: div_toward_zero(x, y),           2),
+    (Opcode.SXTB, OpcodeKind.ALU,      0,    1,        lambda x, y: ((x & 0xFF) ^ 0x80) - 0x80,      2),
+    (Opcode.BEQ,  OpcodeKind.BRANCH,   0,    2,        lambda x, y: 1 if x == y else 0,              2),
+    (Opcode.BGT,  OpcodeKind.BRANCH,   0,    2,        lambda x, y: 1 if x >= y else 0,              2),
+    (Opcode.BLT,  OpcodeKind.BRANCH,   0,    2,        lambda x, y: 1 if x <= y else 0,              2),
+    (Opcode.LD,   OpcodeKind.MEMORY,   1,    0,        None,                                         2),
+    (Opcode.ST,   OpcodeKind.MEMORY,   1,    0,        None,                                         2),
+    (Opcode.SWAP, OpcodeKind.STACK,    0,    0,        None,                                         3),
+    (Opcode.DUP,  OpcodeKind.STACK,    0,    0,        None,                                         1),
+    (Opcode.POP,  OpcodeKind.STACK,    0,    0,        None,                                         1),
+    (Opcode.CALL, OpcodeKind.CONTROL,  1,    0,        None,                                         2),
+    (Opcode.JUMP, OpcodeKind.CONTROL,  1,    0,        None,                                         1),
+    (Opcode.RET,  OpcodeKind.CONTROL,  0,    0,        None,                                         1),
+    (Opcode.IN,   OpcodeKind.IO,       0,    0,        None,                                         1),
+    (Opcode.OUT,  OpcodeKind.IO,       0,    0,        None,                                         1),
+    (Opcode.HLT,  OpcodeKind.SYSTEM,   0,    0,        None,                                         0),
+    (Opcode.NOP,  OpcodeKind.SYSTEM,   0,    0,        None,                                         1),
+    (Opcode.INB,  OpcodeKind.IO,       0,    2,        None,                                         2),
+    (Opcode.OUTB, OpcodeKind.IO,       0,    2,        None,                                         2),
+    (Opcode.MOVB, OpcodeKind.MEMORY,   0,    2,        None,                                         3),
+]
+assert [row[0] for row in ISA_TABLE] == list(Opcode), "ISA table must follow Opcode order"
+
+# Opcode is a str enum, so both Opcode members and raw mnemonics are valid keys
+ISA = {row[0]: OpcodeInfo(code, *row) for code, row in enumerate(ISA_TABLE)}
+
+
 class Instruction:
     def __init__(self, index: int, opcode: Opcode, arg: str | None = None, addressing: int = 0):
         self.index = index
@@ -96,3 +184,67 @@ class CodeEncoder(json.JSONEncoder):
         if isinstance(obj, Instruction):
             return obj.__dict__
         return json.JSONEncoder.default(self, obj)
+
+
+# Binary machine code: header (magic, version, words count) followed by fixed-width words
+# (opcode number, addressing, flags, arg). Data words are stored as NOP with the value in arg.
+BINARY_MAGIC = b"CSA3"
+BINARY_VERSION = 2
+BINARY_HEADER = struct.Struct("<4sHxxI")
+BINARY_WORD = struct.Struct("<BBBxq")
+BINARY_HAS_ARG = 1
+BINARY_ARG_MIN = -(1 << 63)
+BINARY_ARG_MAX = (1 << 63) - 1
+
+OPCODES = [info.opcode for info in ISA.values()]
+
+
+class WrongBinaryFormatError(Exception):
+    def __init__(self, reason):
+        super().__init__(f"Error: unable to load binary code - {reason}")
+
+
+class WordRangeError(ValueError):
+    def __init__(self, index, value):
+        super().__init__(f"Error: word {index} value {value} does not fit the 64-bit argument of binary code")
+        self.index = index
+        self.value = value
+
+
+def encode_word(instruction: Instruction) -> bytes:
+    flags = 0 if instruction.arg is None else BINARY_HAS_ARG
+    arg = 0 if instruction.arg is None else int(instruction.arg)
+    if not BINARY_ARG_MIN <= arg <= BINARY_ARG_MAX:
+        raise WordRangeError(instruction.index, arg)
+    return BINARY_WORD.pack(ISA[instruction.opcode].code, instruction.addressing, flags, arg)
+
+
+def encode_code(code: list) -> bytes:
+    out = bytearray(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(code)))
+    for instruction in code:
+        out += encode_word(instruction)
+    return bytes(out)
+
+
+def decode_code(buffer) -> list:
+    if len(buffer) < BINARY_HEADER.size:
+        raise WrongBinaryFormatError("header is truncated")
+    magic, version, size = BINARY_HEADER.unpack_from(buffer)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise WrongBinaryFormatError(f"unsupported format {magic!r} v{version}")
+    end = BINARY_HEADER.size + size * BINARY_WORD.size
+    if len(buffer) < end:
+        raise WrongBinaryFormatError("code is truncated")
+
+    code = []
+    words = BINARY_WORD.iter_unpack(memoryview(buffer)[BINARY_HEADER.size:end])
+    for index, (number, addressing, flags, arg) in enumerate(words):
+        if number >= len(OPCODES):
+            raise WrongBinaryFormatError(f"unknown opcode {number} in word {index}")
+        opcode = OPCODES[number].value
+        if not flags & BINARY_HAS_ARG:
+            arg = None
+        elif opcode != Opcode.NOP.value:
+            arg = str(arg)
+        code.append(Instruction(index, opcode, arg, addressing))
+    return code
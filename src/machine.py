@@ -1,12 +1,15 @@
 import json
 import logging
+import mmap
 import sys
 
 from src.components.alu import ALU
 from src.components.data_stack import Stack
 from src.components.memory import Memory
 from src.components.signals import ALUMux, ARMux, DRSig, IPMux, TOSMux
-from src.isa import Addressing, Instruction, Opcode
+from src.inputs import load_input
+from src.isa import BINARY_MAGIC, BLOCK_WORD_TICKS, ISA, Addressing, Instruction, Opcode, OpcodeKind, decode_code
+from src.trace import STATE_FORMAT, TraceRecorder
 
 INSTRUCTION_LIMIT = 100000
 SIZE_FOR_VARS = 150
@@ -18,10 +21,13 @@ class WrongInstructionFormatError(Exception):
 
 
 class DataPath:
-    def __init__(self, code, start_of_variables, input_tokens_size=SIZE_FOR_VARS):
+    __slots__ = ("data_stack", "alu", "memory", "ip", "tos", "ar", "dr", "br")
+
+    def __init__(self, code, start_of_variables, input_tokens_size=SIZE_FOR_VARS, memory=None):
+        # memory is a prepared memory model with the code loaded, e.g. PagedMemory
         self.data_stack = Stack(STACK_SIZE)
         self.alu = ALU()
-        self.memory = Memory(code, start_of_variables, input_tokens_size)
+        self.memory = Memory(code, start_of_variables, input_tokens_size) if memory is None else memory
         self.ip = 1
         self.tos = 0
         self.ar = 0
@@ -36,11 +42,9 @@ class DataPath:
             return
         match signal:
             case DRSig.READ:
-                self.memory.read(self.ar)
-                self.dr = self.memory.value
+                self.dr = self.memory.read(self.ar)
             case DRSig.WRITE:
-                self.memory.value = self.dr
-                self.memory.write(self.ar)
+                self.memory.write(self.ar, self.dr)
             case DRSig.ALU:
                 self.dr = self.alu.value
 
@@ -93,7 +97,7 @@ class DataPath:
 
     def alu_operation(self, command: Opcode = None):
         if command is not None:
-            if Opcode.AND.index() <= Opcode(command).index() <= Opcode.BLT.index():
+            if ISA[command].operands == 2:
                 self.alu.second_value = self.data_stack.pop()
         self.alu.do_operation(command)
 
@@ -119,25 +123,37 @@ class IOController:
             "Internal error: not enough symbols at buffer to read {} >= {}".format(self.iter, len(self.input_buffer)))
 
         if not isinstance(self.input_buffer[self.iter], int):
-            self.data_path.memory.value = ord(self.input_buffer[self.iter])
+            self.data_path.memory.write(self.memAddr, ord(self.input_buffer[self.iter]))
         else:
-            self.data_path.memory.value = self.input_buffer[self.iter]
-        self.data_path.memory.write(self.memAddr)
+            self.data_path.memory.write(self.memAddr, self.input_buffer[self.iter])
         self.iter += 1
 
     def send(self):
-        self.data_path.memory.read(self.memAddr)
-        self.outputBuffer.append(self.data_path.memory.value)
+        self.outputBuffer.append(self.data_path.memory.read(self.memAddr))
+
+    def get_block(self, adr, count):
+        count = max(count, 0)
+        assert self.iter + count <= len(self.input_buffer), (
+            "Internal error: not enough symbols at buffer to read {} from {}".format(count, self.iter))
+
+        tokens = self.input_buffer[self.iter:self.iter + count]
+        self.data_path.memory.write_block(adr, [token if isinstance(token, int) else ord(token) for token in tokens])
+        self.iter += count
+
+    def send_block(self, adr, count):
+        self.outputBuffer += self.data_path.memory.read_block(adr, count)
+
+    def format_output(self, values):
+        if self.output_mode == "text":
+            return "".join(map(chr, values))
+        return "".join(str(s) + " " for s in values)
 
     def finish(self):
-        file = open(self.output_file, "w+", encoding="utf-8")
-        for s in self.outputBuffer:
-            if self.output_mode == "text":
-                file.write(chr(s))
-            else:
-                file.write(str(s))
-                file.write(" ")
-        file.close()
+        # output_file is either a path or an already opened text stream
+        file = open(self.output_file, "w+", encoding="utf-8") if isinstance(self.output_file, str) else self.output_file
+        file.write(self.format_output(self.outputBuffer))
+        if file is not self.output_file:
+            file.close()
 
 
 class ControlUnit:
@@ -152,7 +168,7 @@ class ControlUnit:
         self._tick += 1
 
     def __repr__(self):
-        return "  TICK: {:4} \tIP: {:4} \tCR: {:4} \tAR: {:4} \tDR: {:4} \tBR: {:4} \tSTACK: {}".format(
+        return STATE_FORMAT.format(
             self._tick,
             self.data_path.ip,
             self.cr.get_short_note() if isinstance(self.cr, Instruction) else self.cr,
@@ -261,14 +277,15 @@ class ControlUnit:
         self.tick()
 
     def execution_fetch(self, cmd: Instruction):
+        kind = ISA[cmd.opcode].kind
 
         # math \ logic \ if instructions
-        if Opcode(cmd.opcode).index() <= Opcode.BLT.index():
+        if kind in {OpcodeKind.ALU, OpcodeKind.BRANCH}:
             self.data_path.signal_latch_alu(ALUMux.TOS)
             self.data_path.alu_operation(cmd.opcode)
 
             # extra actions for if
-            if Opcode(cmd.opcode).index() >= Opcode.BEQ.index():
+            if kind is OpcodeKind.BRANCH:
                 if self.data_path.alu.value == 1:  # inc ip
                     self.tick()  # tick for read argument from stack
                     self.data_path.signal_latch_alu(ALUMux.IP)
@@ -294,7 +311,7 @@ class ControlUnit:
 
         # JMP + CALL
         elif cmd.opcode in {Opcode.JUMP, Opcode.CALL}:
-            if cmd.opcode is Opcode.CALL:
+            if cmd.opcode == Opcode.CALL:
                 self.return_stack.push(self.data_path.ip)
                 self.tick()
 
@@ -327,6 +344,24 @@ class ControlUnit:
         elif cmd.opcode == Opcode.OUT:
             self.io_controller.send()
 
+        # INB, OUTB, MOVB: count in TOS, (destination) address on DataStack, TOS <- end of the range
+        elif cmd.opcode in {Opcode.INB, Opcode.OUTB, Opcode.MOVB}:
+            self.data_path.signal_latch_alu(ALUMux.TOS)
+            self.data_path.alu_operation(Opcode.ADD)
+            self.tick()
+            count, adr = self.data_path.alu.first_value, self.data_path.alu.second_value
+            if cmd.opcode == Opcode.INB:
+                self.io_controller.get_block(adr, count)
+            elif cmd.opcode == Opcode.OUTB:
+                self.io_controller.send_block(adr, count)
+            else:
+                # source address
+                self.data_path.signal_latch_br()
+                self.tick()
+                self.data_path.memory.move(self.data_path.br, adr, count)
+            self._tick += max(count, 0) * BLOCK_WORD_TICKS
+            self.data_path.signal_latch_tos(TOSMux.ALU)
+
         elif cmd.opcode == Opcode.HLT:
             raise StopIteration
         self.tick()
@@ -338,18 +373,26 @@ class ControlUnit:
         self.execution_fetch(cmd)
 
 
-def simulation(code, input_tokens, limit, output_file, output_mode):
-    data_path = DataPath(code, limit, input_tokens[0])
+def simulation(code, input_tokens, limit, output_file, output_mode, trace=None, memory=None, engine=ControlUnit):
+    data_path = DataPath(code, limit, input_tokens[0], memory)
     io_controller = IOController(data_path, input_tokens, 0, output_file, output_mode)
-    control_unit = ControlUnit(data_path, io_controller)
+    # engine builds the control unit from the data path and IO, subclasses of ControlUnit fit as is
+    control_unit = engine(data_path, io_controller)
     instr_counter = 0
+    # checked once, a disabled logging.debug call still costs a call per instruction
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
 
     logging.debug("%s", control_unit)
+    if trace is not None:
+        trace.record(control_unit)
     try:
         while instr_counter < limit:
             control_unit.execute()
             instr_counter += 1
-            logging.debug("%s", control_unit)
+            if debug:
+                logging.debug("%s", control_unit)
+            if trace is not None:
+                trace.record(control_unit)
     except (StopIteration, EOFError):
         io_controller.finish()
         pass
@@ -359,33 +402,51 @@ def simulation(code, input_tokens, limit, output_file, output_mode):
     return instr_counter, control_unit._tick
 
 
-def main(code_file, input_file, output_file, output_mode):
+def load_json_code(code_file):
     with open(code_file, encoding="utf-8") as file:
         code = json.loads(file.read())
-        machine_code = list(map(lambda d: Instruction(**d), code))
+        return list(map(lambda d: Instruction(**d), code))
+
+
+def load_binary_code(code_file):
+    with open(code_file, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return decode_code(buffer)
+
+
+def load_code(code_file):
+    with open(code_file, "rb") as file:
+        is_binary = file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    machine_code = load_binary_code(code_file) if is_binary else load_json_code(code_file)
+    return to_machine_code(machine_code)
 
+
+def to_machine_code(code):
     # change NOP commands-signature to row data
-    for i in range(len(machine_code)):
-        if machine_code[i].opcode == Opcode.NOP.value:
-            machine_code[i] = machine_code[i].arg
-
-    input_text = []
-    with open(input_file, encoding="utf-8") as file:
-        buff = file.readline()
-        if buff.startswith("["):
-            input_text += eval(buff)
-        else:
-            input_text += list(buff)
-    input_text = [len(input_text), *input_text]
+    return [instr.arg if instr.opcode == Opcode.NOP.value else instr for instr in code]
+
 
-    instr_counter, ticks = simulation(
-        machine_code, input_text, INSTRUCTION_LIMIT, output_file, output_mode
-    )
+def main(code_file, input_file, output_file, output_mode, trace_file=None, simulate=simulation):
+    machine_code = load_code(code_file)
+    input_text = load_input(input_file)
+
+    if trace_file is None:
+        instr_counter, ticks = simulate(
+            machine_code, input_text, INSTRUCTION_LIMIT, output_file, output_mode
+        )
+    else:
+        with open(trace_file, "wb") as file:
+            trace = TraceRecorder(file=file)
+            instr_counter, ticks = simulate(
+                machine_code, input_text, INSTRUCTION_LIMIT, output_file, output_mode, trace
+            )
+            trace.flush()
     print("instructions_executed: {} ticks: {}".format(instr_counter, ticks))
 
 
 if __name__ == "__main__":
-    logging.getLogger().setLevel(logging.DEBUG)
-    assert len(sys.argv) == 5, "Wrong arguments: machine.py <code_file> <input_file> <output_file> <output_mode>"
-    _, code_file, input_file, output_file, output_mode = sys.argv
-    main(code_file, input_file, output_file, output_mode)
+    assert len(sys.argv) in (5, 6), (
+        "Wrong arguments: machine.py <code_file> <input_file> <output_file> <output_mode> [<trace_file>]")
+    # with a binary trace file the per-instruction state goes there instead of the debug log
+    if len(sys.argv) == 5:
+        logging.getLogger().setLevel(logging.DEBUG)
+    main(*sys.argv[1:])
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import sys
+from collections import Counter
+
+import src.translator as translator
+from src.isa import ADDRESSING_TICKS, FETCH_TICKS, ISA, Addressing, Opcode, OpcodeKind
+
+# Opt-in peephole pass over source lines, runs before the assembler resolves labels.
+# A rewrite never crosses an entry point: a label, the cell after a branch (skipped when the branch is
+# taken) or the cell after it (where the taken branch lands). The cell after a branch is never changed.
+# Labels of removed instructions move to the next instruction.
+# IP relative `[X]` addressing depends on distances between cells, such programs are left unchanged.
+# Absolute addresses written as numbers (not labels) are not relocated either.
+PATTERNS = ("ST X; POP; LD X", "SWAP; SWAP", "DUP; POP", "JUMP next")
+
+
+class Statement:
+    def __init__(self, number: int, text: str, mnemonic: str | None, arg: str | None):
+        self.number = number
+        self.text = text
+        self.mnemonic = mnemonic
+        self.arg = arg
+        self.prefix = []  # (number, text) of the labels right above
+        self.labels = set()
+        self.entry = False
+        self.pinned = False
+
+    def is_branch(self) -> bool:
+        return self.mnemonic in ISA and ISA[self.mnemonic].kind is OpcodeKind.BRANCH
+
+    def addressing(self) -> Addressing:
+        if self.arg is None:
+            return Addressing.NONE
+        return translator.parse_argument(self.arg)[0]
+
+    def ticks(self) -> int:
+        return FETCH_TICKS + ADDRESSING_TICKS[self.addressing().value] + ISA[self.mnemonic].ticks
+
+    def is_op(self, opcode: Opcode, arg=None) -> bool:
+        return self.mnemonic == opcode.value and (arg is None or self.arg == arg)
+
+
+class OptimizationReport:
+    def __init__(self):
+        self.rewrites = Counter()
+        self.removed = 0
+        self.ticks = 0  # saved ticks if every rewritten place is executed once
+        self.skipped = None
+
+    def remove(self, pattern: str, statements: list):
+        self.rewrites[pattern] += 1
+        self.removed += len(statements)
+        self.ticks += sum(statement.ticks() for statement in statements)
+
+    def __repr__(self):
+        if self.skipped is not None:
+            return "peephole: skipped - {}".format(self.skipped)
+        rewrites = ", ".join("{}: {}".format(pattern, self.rewrites[pattern]) for pattern in PATTERNS)
+        return "peephole: removed instr: {} saved ticks per pass: {} ({})".format(self.removed, self.ticks, rewrites)
+
+
+def parse(numbered_lines):
+    statements = []
+    prefix = []
+    for number, text in numbered_lines:
+        token = text.split(";", 1)[0].strip()
+        if token == "":
+            continue
+        if token.endswith(":"):
+            prefix.append((number, text))
+            continue
+        sub_tokens = token.split(" ")
+        # malformed lines are passed as is, the assembler reports them
+        mnemonic = sub_tokens[0] if len(sub_tokens) <= 2 else None
+        statement = Statement(number, text, mnemonic, sub_tokens[1] if len(sub_tokens) == 2 else None)
+        statement.prefix = prefix
+        statement.labels = {line.split(";", 1)[0].strip().strip(":") for _, line in prefix}
+        statements.append(statement)
+        prefix = []
+    return statements, prefix
+
+
+def mark_entries(statements: list):
+    for i, statement in enumerate(statements):
+        statement.entry = bool(statement.labels)
+        if i >= 1 and statements[i - 1].is_branch():
+            statement.pinned = True
+        if i >= 2 and statements[i - 2].is_branch():
+            statement.entry = True
+
+
+def inner(statements: list) -> bool:
+    # statements after the first one of a rewrite must not be entry points
+    return not statements[0].pinned and not any(s.pinned or s.entry for s in statements[1:])
+
+
+def move_prefix(removed: list, target: Statement):
+    for statement in reversed(removed):
+        target.prefix = statement.prefix + target.prefix
+        target.labels |= statement.labels
+        target.entry = target.entry or statement.entry
+
+
+def reduce_tail(out: list, carry: list, report: OptimizationReport) -> bool:
+    tail = out[-3:]
+    if len(tail) == 3 and inner(tail) and tail[0].is_op(Opcode.ST) and tail[1].is_op(Opcode.POP) \
+            and tail[2].is_op(Opcode.LD, tail[0].arg) and tail[0].addressing() is Addressing.DIRECT_ABS:
+        report.remove(PATTERNS[0], tail[1:])
+        del out[-2:]
+        return True
+
+    tail = out[-2:]
+    if len(tail) == 2 and inner(tail) and (tail[0].is_op(Opcode.SWAP) and tail[1].is_op(Opcode.SWAP)
+                                           or tail[0].is_op(Opcode.DUP) and tail[1].is_op(Opcode.POP)):
+        report.remove(PATTERNS[1] if tail[0].is_op(Opcode.SWAP) else PATTERNS[2], tail)
+        del out[-2:]
+        carry.extend(tail)
+        return True
+
+    if len(tail) == 2 and not tail[0].pinned and tail[0].is_op(Opcode.JUMP) \
+            and tail[0].addressing() is Addressing.DIRECT_ABS and tail[0].arg in tail[1].labels:
+        report.remove(PATTERNS[3], tail[:1])
+        move_prefix(tail[:1], tail[1])
+        del out[-2]
+        return True
+    return False
+
+
+def optimize(numbered_lines):
+    # returns optimized (line number, line) pairs and the report
+    statements, trailing = parse(numbered_lines)
+    report = OptimizationReport()
+    out = []
+    carry = []
+    if any(statement.addressing() is Addressing.DIRECT_SHIFT for statement in statements
+           if statement.mnemonic in ISA and statement.arg is not None):
+        report.skipped = "IP relative addressing is used"
+        out = statements
+    else:
+        mark_entries(statements)
+        for statement in statements:
+            move_prefix(carry, statement)
+            carry.clear()
+            out.append(statement)
+            while reduce_tail(out, carry, report):
+                pass
+
+    lines = []
+    for statement in out:
+        lines += statement.prefix
+        lines.append((statement.number, statement.text))
+    for statement in carry:
+        lines += statement.prefix
+    return lines + trailing, report
+
+
+def optimized_translate(text: str):
+    lines, report = optimize(enumerate(text.splitlines(), 1))
+    return translator.assemble_numbered(lines), report
+
+
+def main(source: str, target: str, binary_target: str | None = None):
+    def translate_text(text):
+        code, report = optimized_translate(text)
+        print(report)
+        return code
+
+    translator.main(source, target, binary_target, translate_text)
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (3, 4), "Wrong arguments: optimizer.py <input_file> <target_file> [<binary_file>]"
+    main(*sys.argv[1:])
@@ -0,0 +1,33 @@
+import sys
+
+from src.components.paged_memory import DEFAULT_ADDRESS_SPACE, PAGE_SIZE, PagedMemory
+from src.fast import fast_simulation
+from src.machine import INSTRUCTION_LIMIT, load_code, load_input
+
+# Runs a program on the sparse paged memory: the address space does not depend on the input size and
+# pages are allocated on the first write. Per page read/write statistics go to the report file.
+
+
+def paged_simulation(code, input_tokens, limit, output_file, output_mode, size=DEFAULT_ADDRESS_SPACE,
+                     page_size=PAGE_SIZE, simulate=fast_simulation):
+    memory = PagedMemory(code, limit, size, page_size)
+    instr_counter, ticks = simulate(code, input_tokens, limit, output_file, output_mode, memory=memory)
+    return instr_counter, ticks, memory
+
+
+def main(code_file, input_file, output_file, output_mode, report_file, size=DEFAULT_ADDRESS_SPACE,
+         page_size=PAGE_SIZE):
+    instr_counter, ticks, memory = paged_simulation(
+        load_code(code_file), load_input(input_file), INSTRUCTION_LIMIT, output_file, output_mode,
+        int(size), int(page_size))
+
+    with open(report_file, "w", encoding="utf-8") as file:
+        file.write(memory.report())
+    print("instructions_executed: {} ticks: {}".format(instr_counter, ticks))
+
+
+if __name__ == "__main__":
+    assert 6 <= len(sys.argv) <= 8, (
+        "Wrong arguments: paged.py <code_file> <input_file> <output_file> <output_mode> <report_file>"
+        " [<address_space>] [<page_size>]")
+    main(*sys.argv[1:])
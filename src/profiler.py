@@ -0,0 +1,135 @@
+import functools
+import sys
+
+from src.isa import ISA, Addressing, Instruction
+from src.machine import INSTRUCTION_LIMIT, ControlUnit, DataPath, IOController, load_code, load_input, simulation
+from src.translator import load_source_map
+
+# Execution profiler: per IP and per (opcode, addressing) counters of executions and ticks, and ticks
+# per CALL stack. The CALL stack is a shadow of the return stack: it grows with the return stack on CALL
+# and shrinks on RET, every frame is named by the called address.
+# Profiling is a separate ControlUnit subclass, the plain ControlUnit has no profiling overhead.
+REPORT_TOP = 30
+
+
+class Profile:
+    def __init__(self, source_map=None):
+        self.source_map = source_map
+        self.by_ip = {}  # ip -> [count, ticks]
+        self.by_operation = {}  # (opcode, addressing) -> [count, ticks]
+        self.by_stack = {}  # (root, called addresses...) -> self ticks
+        self.instructions = {}  # ip -> last executed instruction
+        self.frames = []
+        self.stack = None
+
+    def start(self, ip):
+        self.frames = [ip]
+        self.stack = (ip,)
+
+    def record(self, ip, instruction, ticks, depth, next_ip):
+        counters = self.by_ip.get(ip)
+        if counters is None:
+            counters = self.by_ip[ip] = [0, 0]
+        counters[0] += 1
+        counters[1] += ticks
+
+        if isinstance(instruction, Instruction):
+            self.instructions[ip] = instruction
+            key = (ISA[instruction.opcode].opcode.value, instruction.addressing)
+            counters = self.by_operation.get(key)
+            if counters is None:
+                counters = self.by_operation[key] = [0, 0]
+            counters[0] += 1
+            counters[1] += ticks
+
+        self.by_stack[self.stack] = self.by_stack.get(self.stack, 0) + ticks
+        # the first frame is the program itself, the others match the return stack
+        if depth != len(self.frames) - 1:
+            if depth > len(self.frames) - 1:
+                self.frames.append(next_ip)
+            else:
+                del self.frames[depth + 1:]
+            self.stack = tuple(self.frames)
+
+    def name(self, address):
+        if self.source_map is None:
+            return str(address)
+        return self.source_map.describe(address).split(" ", 1)[0].removesuffix("+0")
+
+    def inclusive(self):
+        # ticks of a frame with everything it called, recursive frames are counted once
+        out = {}
+        for stack, ticks in self.by_stack.items():
+            for address in set(stack):
+                out[address] = out.get(address, 0) + ticks
+        return out
+
+    def collapsed(self):
+        # flamegraph.pl / speedscope collapsed stacks: "root;called;called ticks"
+        return ["{} {}".format(";".join(map(self.name, stack)), ticks)
+                for stack, ticks in sorted(self.by_stack.items()) if ticks]
+
+    def report(self, top=REPORT_TOP):
+        total = sum(ticks for _, ticks in self.by_ip.values()) or 1
+        out = ["ticks: {} instructions: {} (HLT included)".format(
+            sum(ticks for _, ticks in self.by_ip.values()), sum(count for count, _ in self.by_ip.values())), ""]
+
+        out.append("{:>10} {:>6} {:>10} {:>6}  {}".format("ticks", "%", "count", "ip", "instruction"))
+        for ip, (count, ticks) in sorted(self.by_ip.items(), key=lambda item: -item[1][1])[:top]:
+            instruction = self.instructions.get(ip)
+            note = instruction.get_short_note() if instruction is not None else "?"
+            if self.source_map is not None:
+                note += "  " + self.source_map.describe(ip)
+            out.append("{:>10} {:>6.2f} {:>10} {:>6}  {}".format(ticks, ticks * 100 / total, count, ip, note))
+
+        out += ["", "{:>10} {:>6} {:>10}  {}".format("ticks", "%", "count", "opcode/addressing")]
+        for (opcode, addressing), (count, ticks) in sorted(self.by_operation.items(), key=lambda item: -item[1][1]):
+            out.append("{:>10} {:>6.2f} {:>10}  {} {}".format(
+                ticks, ticks * 100 / total, count, opcode, Addressing(addressing).name))
+
+        out += ["", "{:>10} {:>6}  {}".format("inclusive", "%", "call")]
+        for address, ticks in sorted(self.inclusive().items(), key=lambda item: -item[1]):
+            out.append("{:>10} {:>6.2f}  {}".format(ticks, ticks * 100 / total, self.name(address)))
+        return "\n".join(out) + "\n"
+
+
+class ProfilingControlUnit(ControlUnit):
+    def __init__(self, data_path: DataPath, io_controller: IOController, profile: Profile):
+        super().__init__(data_path, io_controller)
+        self.profile = profile
+        profile.start(data_path.ip)
+
+    def execute(self):
+        ip = self.data_path.ip
+        tick = self._tick
+        try:
+            super().execute()
+        finally:
+            # HLT is recorded too, its fetch ticks are spent
+            self.profile.record(ip, self.cr, self._tick - tick, len(self.return_stack), self.data_path.ip)
+
+
+def profile_simulation(code, input_tokens, limit, output_file, output_mode, profile):
+    engine = functools.partial(ProfilingControlUnit, profile=profile)
+    return simulation(code, input_tokens, limit, output_file, output_mode, engine=engine)
+
+
+def main(code_file, input_file, output_file, output_mode, report_file, collapsed_file=None, source_map_file=None):
+    source_map = load_source_map(source_map_file) if source_map_file is not None else None
+    profile = Profile(source_map)
+    instr_counter, ticks = profile_simulation(
+        load_code(code_file), load_input(input_file), INSTRUCTION_LIMIT, output_file, output_mode, profile)
+
+    with open(report_file, "w", encoding="utf-8") as file:
+        file.write(profile.report())
+    if collapsed_file is not None:
+        with open(collapsed_file, "w", encoding="utf-8") as file:
+            file.write("\n".join(profile.collapsed()) + "\n")
+    print("instructions_executed: {} ticks: {}".format(instr_counter, ticks))
+
+
+if __name__ == "__main__":
+    assert 6 <= len(sys.argv) <= 8, (
+        "Wrong arguments: profiler.py <code_file> <input_file> <output_file> <output_mode> <report_file>"
+        " [<collapsed_file>] [<source_map_file>]")
+    main(*sys.argv[1:])
@@ -0,0 +1,48 @@
+import io
+import sys
+
+import src.translator as translator
+from src.compiler import compiled_simulation
+from src.fast import fast_simulation
+from src.machine import INSTRUCTION_LIMIT, load_input, simulation
+
+# One-shot pipeline in memory: assembly text is assembled straight into machine code (data words as raw
+# values) and run, without the translator output file, JSON and the NOP conversion of machine.load_code.
+ENGINES = {
+    "reference": simulation,
+    "fast": fast_simulation,
+    "compiled": compiled_simulation,
+}
+
+
+def assemble_code(text):
+    return translator.assemble(text.splitlines(), translator.MachineCodeSink())
+
+
+def input_tokens(data):
+    # a string is text input, a list of numbers is numeric input; the input length goes first
+    if isinstance(data, str):
+        return [len(data), *data]
+    assert isinstance(data, list), "Input must be a string or a list of numbers"
+    assert all(isinstance(token, int) for token in data), "Numeric input must be a list of numbers"
+    return [len(data), *data]
+
+
+def run_source(text, data="", output_mode="text", limit=INSTRUCTION_LIMIT, engine="fast"):
+    # returns the output text, the executed instructions and the ticks
+    output = io.StringIO()
+    instr_counter, ticks = ENGINES[engine](assemble_code(text), input_tokens(data), limit, output, output_mode)
+    return output.getvalue(), instr_counter, ticks
+
+
+def main(source_file, input_file, output_file, output_mode, engine="fast"):
+    with open(source_file, encoding="utf-8") as file:
+        code = assemble_code(file.read())
+    instr_counter, ticks = ENGINES[engine](code, load_input(input_file), INSTRUCTION_LIMIT, output_file, output_mode)
+    print("instructions_executed: {} ticks: {}".format(instr_counter, ticks))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (5, 6), (
+        "Wrong arguments: run.py <source_file> <input_file> <output_file> <output_mode> [reference|fast|compiled]")
+    main(*sys.argv[1:])
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import sys
+from collections import deque
+
+from src.fast import FastControlUnit
+from src.machine import INSTRUCTION_LIMIT, SIZE_FOR_VARS, DataPath, IOController, load_code
+
+# asyncio sessions: a machine runs as a coroutine and gives control to the event loop every YIELD_EVERY
+# instructions. Input tokens come from an async iterator and output goes to an async sink, so many
+# interactive machines can share one process and one thread.
+# IN and INB without enough tokens do not block: the instruction completes and its memory write waits
+# for the tokens. The next instruction runs only after the write, so the program sees the same state.
+YIELD_EVERY = 1000
+
+
+class AsyncIOController(IOController):
+    def __init__(self, data_path, mem_addr, output_mode):
+        super().__init__(data_path, deque(), mem_addr, None, output_mode)
+        self.pending = None  # (address, count) of the write waiting for input tokens
+
+    def __repr__(self):
+        return "IN: {} read, {} buffered OUT: {}".format(self.iter, len(self.input_buffer), self.outputBuffer)
+
+    def get(self):
+        self.get_block(self.memAddr, 1)
+
+    def get_block(self, adr, count):
+        count = max(count, 0)
+        if len(self.input_buffer) < count:
+            self.pending = (adr, count)
+            return
+        self.write(adr, count)
+
+    def write(self, adr, count):
+        tokens = [self.input_buffer.popleft() for _ in range(count)]
+        values = [token if isinstance(token, int) else ord(token) for token in tokens]
+        if count == 1 and adr == self.memAddr:
+            self.data_path.memory.write(adr, values[0])
+        else:
+            self.data_path.memory.write_block(adr, values)
+        self.iter += count
+
+    def complete(self):
+        adr, count = self.pending
+        self.pending = None
+        self.write(adr, count)
+
+    def take_output(self):
+        text = self.format_output(self.outputBuffer)
+        self.outputBuffer.clear()
+        return text
+
+
+class AsyncControlUnit(FastControlUnit):
+    def run(self, limit, trace=None):
+        # stops right after an instruction waiting for input
+        execute = self.execute
+        io_controller = self.io_controller
+        instr_counter = 0
+        try:
+            while instr_counter < limit:
+                execute()
+                instr_counter += 1
+                if io_controller.pending is not None:
+                    break
+        except (StopIteration, EOFError):
+            self.halted = True
+        return instr_counter
+
+
+class Session:
+    def __init__(self, code, source, sink, output_mode, limit=INSTRUCTION_LIMIT, buff_size=SIZE_FOR_VARS,
+                 yield_every=YIELD_EVERY, memory=None):
+        # source: async iterator of tokens, the program gets the input length from it like any other token
+        # sink: coroutine function, awaited with the formatted output
+        self.source = source
+        self.sink = sink
+        self.limit = limit
+        self.yield_every = yield_every
+        data_path = DataPath(code, limit, buff_size, memory)
+        self.io_controller = AsyncIOController(data_path, 0, output_mode)
+        self.control_unit = AsyncControlUnit(data_path, self.io_controller)
+        self.instructions = 0
+
+    async def receive(self):
+        adr, count = self.io_controller.pending
+        buffer = self.io_controller.input_buffer
+        while len(buffer) < count:
+            token = await anext(self.source, None)
+            assert token is not None, "Internal error: not enough symbols at source to read {} from {}".format(
+                count, self.io_controller.iter)
+            buffer.append(token)
+        self.io_controller.complete()
+
+    async def flush(self):
+        if self.io_controller.outputBuffer:
+            await self.sink(self.io_controller.take_output())
+
+    async def run(self):
+        control_unit = self.control_unit
+        try:
+            while self.instructions < self.limit and not control_unit.halted:
+                self.instructions += control_unit.run(min(self.yield_every, self.limit - self.instructions))
+                if self.io_controller.pending is not None:
+                    # the output asked for this input is delivered first
+                    await self.flush()
+                    await self.receive()
+                else:
+                    await asyncio.sleep(0)
+        finally:
+            await self.flush()
+
+        if self.instructions >= self.limit:
+            logging.warning("Limit exceeded!")
+        return self.instructions, control_unit._tick
+
+
+async def async_simulation(code, source, sink, output_mode, limit=INSTRUCTION_LIMIT, buff_size=SIZE_FOR_VARS,
+                           yield_every=YIELD_EVERY, memory=None):
+    session = Session(code, source, sink, output_mode, limit, buff_size, yield_every, memory)
+    return await session.run()
+
+
+async def read_lines(file):
+    # every line is sent as its length and characters without the line break, like a line of input.txt
+    loop = asyncio.get_running_loop()
+    while line := await loop.run_in_executor(None, file.readline):
+        line = line.rstrip("\n")
+        yield len(line)
+        for char in line:
+            yield char
+
+
+async def write_stdout(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def main(code_file, output_mode):
+    instr_counter, ticks = asyncio.run(
+        async_simulation(load_code(code_file), read_lines(sys.stdin), write_stdout, output_mode))
+    print("\ninstructions_executed: {} ticks: {}".format(instr_counter, ticks))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 3, "Wrong arguments: session.py <code_file> <output_mode>"
+    main(*sys.argv[1:])
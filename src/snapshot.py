@@ -0,0 +1,198 @@
+import io
+import pickle
+import sys
+import zlib
+
+from src.components.data_stack import Stack
+from src.isa import Instruction
+from src.machine import INSTRUCTION_LIMIT, STACK_SIZE, ControlUnit, DataPath, IOController, load_code, load_input
+
+# Machine state snapshot: registers, memory, both stacks, ALU, ControlUnit and IOController cursor/output.
+# The input itself is not stored, a snapshot is restored together with the same input tokens.
+SNAPSHOT_VERSION = 1
+DATA_PATH_REGISTERS = ("ip", "tos", "ar", "dr", "br")
+ALU_REGISTERS = ("n_flag", "z_flag", "v_flag", "value", "first_value", "second_value")
+
+
+class WrongSnapshotError(Exception):
+    def __init__(self, reason):
+        super().__init__(f"Error: unable to restore snapshot - {reason}")
+
+
+def capture(control_unit, instructions=0, halted=False):
+    dp = control_unit.data_path
+    io_controller = control_unit.io_controller
+    return {
+        "version": SNAPSHOT_VERSION,
+        "instructions": instructions,
+        "halted": halted,
+        "tick": control_unit._tick,
+        "cr": control_unit.cr,
+        "registers": {name: getattr(dp, name) for name in DATA_PATH_REGISTERS},
+        "alu": {name: getattr(dp.alu, name) for name in ALU_REGISTERS},
+        "data_stack": dp.data_stack.peek(len(dp.data_stack))[::-1],
+        "return_stack": control_unit.return_stack.peek(len(control_unit.return_stack))[::-1],
+        "memory": _copy_memory(dp.memory),
+        "io": {"iter": io_controller.iter, "mem_addr": io_controller.memAddr, "output": list(io_controller.outputBuffer)},
+    }
+
+
+def _copy_memory(memory):
+    return pickle.loads(pickle.dumps(memory, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _fill_stack(values):
+    stack = Stack(STACK_SIZE)
+    for value in values:
+        stack.push(value)
+    return stack
+
+
+def restore(state, input_tokens, output_file, output_mode, engine=ControlUnit):
+    if state.get("version") != SNAPSHOT_VERSION:
+        raise WrongSnapshotError("unsupported version {}".format(state.get("version")))
+
+    data_path = DataPath([], 0, 0)
+    data_path.memory = _copy_memory(state["memory"])
+    for name, value in state["registers"].items():
+        setattr(data_path, name, value)
+    for name, value in state["alu"].items():
+        setattr(data_path.alu, name, value)
+    data_path.data_stack = _fill_stack(state["data_stack"])
+
+    io_state = state["io"]
+    io_controller = IOController(data_path, input_tokens, io_state["mem_addr"], output_file, output_mode)
+    io_controller.iter = io_state["iter"]
+    io_controller.outputBuffer = list(io_state["output"])
+
+    control_unit = engine(data_path, io_controller)
+    control_unit.return_stack = _fill_stack(state["return_stack"])
+    control_unit.cr = state["cr"]
+    control_unit._tick = state["tick"]
+    return control_unit
+
+
+def save(state, snapshot_file):
+    with open(snapshot_file, "wb") as file:
+        file.write(zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)))
+
+
+def load(snapshot_file):
+    with open(snapshot_file, "rb") as file:
+        return pickle.loads(zlib.decompress(file.read()))
+
+
+def run_instructions(control_unit, count):
+    # returns executed instructions count and whether the machine halted
+    executed = 0
+    try:
+        while executed < count:
+            control_unit.execute()
+            executed += 1
+    except (StopIteration, EOFError):
+        return executed, True
+    return executed, False
+
+
+def run_until_tick(control_unit, tick, limit):
+    # stops on the first instruction boundary at or after `tick`
+    executed = 0
+    try:
+        while control_unit._tick < tick and executed < limit:
+            control_unit.execute()
+            executed += 1
+    except (StopIteration, EOFError):
+        return executed, True
+    return executed, False
+
+
+def advance(state, count, input_tokens, engine=ControlUnit):
+    if state["halted"]:
+        return state
+    control_unit = restore(state, input_tokens, io.StringIO(), "numeric", engine)
+    executed, halted = run_instructions(control_unit, count)
+    return capture(control_unit, state["instructions"] + executed, halted)
+
+
+def _comparable(value):
+    if isinstance(value, Instruction):
+        return "instr", str(value.opcode), value.arg, value.addressing
+    return value
+
+
+def diff(first, second):
+    # names of the state parts which differ between two snapshots
+    out = []
+    for key in ("instructions", "halted", "tick", "data_stack", "return_stack", "io"):
+        if first[key] != second[key]:
+            out.append(key)
+    if _comparable(first["cr"]) != _comparable(second["cr"]):
+        out.append("cr")
+    for group in ("registers", "alu"):
+        for name in first[group]:
+            if _comparable(first[group][name]) != _comparable(second[group][name]):
+                out.append(name)
+    first_memory, second_memory = first["memory"], second["memory"]
+    if len(first_memory) != len(second_memory) or any(
+            _comparable(first_memory.read(adr)) != _comparable(second_memory.read(adr))
+            for adr in sorted({*first_memory.addresses(), *second_memory.addresses()})):
+        out.append("memory")
+    return out
+
+
+def bisect(first, second, input_tokens, limit, first_engine=ControlUnit, second_engine=ControlUnit):
+    # first and second are snapshots taken at the same instruction count, e.g. the initial state of two runs.
+    # Returns (first diverged instruction count, first state, second state, diff) or None.
+    if diff(first, second):
+        return first["instructions"], first, second, diff(first, second)
+    start = first["instructions"]
+    first_high = advance(first, limit, input_tokens, first_engine)
+    second_high = advance(second, limit, input_tokens, second_engine)
+    if not diff(first_high, second_high):
+        return None
+
+    low, high = 0, limit
+    while high - low > 1:
+        middle = (low + high) // 2
+        first_middle = advance(first, middle - low, input_tokens, first_engine)
+        second_middle = advance(second, middle - low, input_tokens, second_engine)
+        if diff(first_middle, second_middle):
+            high, first_high, second_high = middle, first_middle, second_middle
+        else:
+            low, first, second = middle, first_middle, second_middle
+    return start + high, first_high, second_high, diff(first_high, second_high)
+
+
+def initial_state(code, input_tokens):
+    data_path = DataPath(code, INSTRUCTION_LIMIT, input_tokens[0])
+    io_controller = IOController(data_path, input_tokens, 0, io.StringIO(), "numeric")
+    return capture(ControlUnit(data_path, io_controller))
+
+
+def main_save(code_file, input_file, tick, snapshot_file):
+    input_tokens = load_input(input_file)
+    data_path = DataPath(load_code(code_file), INSTRUCTION_LIMIT, input_tokens[0])
+    control_unit = ControlUnit(data_path, IOController(data_path, input_tokens, 0, io.StringIO(), "numeric"))
+    executed, halted = run_until_tick(control_unit, int(tick), INSTRUCTION_LIMIT)
+    save(capture(control_unit, executed, halted), snapshot_file)
+    print("instructions_executed: {} ticks: {}".format(executed, control_unit._tick))
+
+
+def main_resume(snapshot_file, input_file, output_file, output_mode):
+    state = load(snapshot_file)
+    control_unit = restore(state, load_input(input_file), output_file, output_mode)
+    executed, halted = run_instructions(control_unit, INSTRUCTION_LIMIT - state["instructions"])
+    if halted:
+        control_unit.io_controller.finish()
+    print("instructions_executed: {} ticks: {}".format(state["instructions"] + executed, control_unit._tick))
+
+
+if __name__ == "__main__":
+    usage = ("Wrong arguments: snapshot.py save <code_file> <input_file> <tick> <snapshot_file>"
+             " | snapshot.py resume <snapshot_file> <input_file> <output_file> <output_mode>")
+    assert len(sys.argv) == 6, usage
+    assert sys.argv[1] in ("save", "resume"), usage
+    if sys.argv[1] == "save":
+        main_save(*sys.argv[2:])
+    else:
+        main_resume(*sys.argv[2:])
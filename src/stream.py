@@ -0,0 +1,110 @@
+import itertools
+import logging
+import sys
+
+from src.fast import FastControlUnit
+from src.machine import INSTRUCTION_LIMIT, SIZE_FOR_VARS, DataPath, IOController, load_code
+
+# Streaming I/O: input tokens are pulled lazily from an iterator, output is written
+# to the stream in chunks, so memory used by the I/O does not depend on the data size.
+# Machine memory is bounded too: the buffer after the code is SIZE_FOR_VARS words by default, not the input
+# size. A program that keeps the whole input in memory (e.g. INB into one buffer) needs a larger buff_size.
+INPUT_CHUNK = 1 << 16
+OUTPUT_CHUNK = 1 << 12
+
+
+class StreamIOController(IOController):
+    def __init__(self, data_path, input_tokens, mem_addr, output, output_mode):
+        super().__init__(data_path, iter(input_tokens), mem_addr, output, output_mode)
+        self.written = 0
+
+    def __repr__(self):
+        return "IN: {} read OUT: {} written {}".format(self.iter, self.written, self.outputBuffer)
+
+    def get(self):
+        token = next(self.input_buffer, None)
+        assert token is not None, "Internal error: not enough symbols at stream to read {}".format(self.iter)
+
+        if not isinstance(token, int):
+            token = ord(token)
+        self.data_path.memory.write(self.memAddr, token)
+        self.iter += 1
+
+    def get_block(self, adr, count):
+        count = max(count, 0)
+        tokens = list(itertools.islice(self.input_buffer, count))
+        assert len(tokens) == count, "Internal error: not enough symbols at stream to read {} from {}".format(
+            count, self.iter)
+
+        self.data_path.memory.write_block(adr, [token if isinstance(token, int) else ord(token) for token in tokens])
+        self.iter += count
+
+    def send_block(self, adr, count):
+        self.outputBuffer += self.data_path.memory.read_block(adr, count)
+        if len(self.outputBuffer) >= OUTPUT_CHUNK:
+            self.flush()
+
+    def send(self):
+        self.outputBuffer.append(self.data_path.memory.read(self.memAddr))
+        if len(self.outputBuffer) >= OUTPUT_CHUNK:
+            self.flush()
+
+    def flush(self):
+        self.output_file.write(self.format_output(self.outputBuffer))
+        self.written += len(self.outputBuffer)
+        self.outputBuffer.clear()
+
+    def finish(self):
+        self.flush()
+        self.output_file.flush()
+
+
+def read_chars(input_file):
+    with open(input_file, encoding="utf-8") as file:
+        while chunk := file.read(INPUT_CHUNK):
+            yield from chunk
+
+
+def count_chars(input_file):
+    return sum(1 for _ in read_chars(input_file))
+
+
+def stream_input(input_file):
+    # the program reads input length first, like with machine.load_input
+    size = count_chars(input_file)
+    return size, itertools.chain([size], read_chars(input_file))
+
+
+def stream_simulation(code, input_tokens, limit, output, output_mode, buff_size=SIZE_FOR_VARS):
+    data_path = DataPath(code, limit, buff_size)
+    io_controller = StreamIOController(data_path, input_tokens, 0, output, output_mode)
+    control_unit = FastControlUnit(data_path, io_controller)
+
+    logging.debug("%s", control_unit)
+    try:
+        instr_counter = control_unit.run(limit)
+    finally:
+        # output produced before a crash or the limit is kept
+        io_controller.finish()
+
+    if instr_counter >= limit:
+        logging.warning("Limit exceeded!")
+    return instr_counter, control_unit._tick
+
+
+def main(code_file, input_file, output_file, output_mode, buff_size=None):
+    machine_code = load_code(code_file)
+    _, input_tokens = stream_input(input_file)
+    buff_size = SIZE_FOR_VARS if buff_size is None else int(buff_size)
+
+    with open(output_file, "w", encoding="utf-8") as output:
+        instr_counter, ticks = stream_simulation(
+            machine_code, input_tokens, INSTRUCTION_LIMIT, output, output_mode, buff_size
+        )
+    print("instructions_executed: {} ticks: {}".format(instr_counter, ticks))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (5, 6), (
+        "Wrong arguments: stream.py <code_file> <input_file> <output_file> <output_mode> [<buff_size>]")
+    main(*sys.argv[1:])
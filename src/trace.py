@@ -0,0 +1,149 @@
+import hashlib
+import mmap
+import struct
+import sys
+
+from src.isa import ISA, OPCODES, Instruction
+
+# Binary trace: fixed-size records with register snapshot after every instruction.
+# Every register value is stored as (tag, int64), the tag tells how to render it back.
+STATE_FORMAT = "  TICK: {:4} \tIP: {:4} \tCR: {:4} \tAR: {:4} \tDR: {:4} \tBR: {:4} \tSTACK: {}"
+
+TRACE_MAGIC = b"CSAT"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<4sHH")
+TRACE_STACK_WORDS = 7
+TRACE_VALUES = 6 + TRACE_STACK_WORDS  # IP, CR, AR, DR, BR, TOS + top of DataStack
+TRACE_RECORD = struct.Struct("<qH{}B{}q".format(TRACE_VALUES, TRACE_VALUES) + "x")
+DEFAULT_CAPACITY = 4096
+DIGEST_EVERY = 1024
+
+TAG_INT = 0
+TAG_NONE = 1
+TAG_OTHER = 2
+TAG_INSTRUCTION = 16  # + opcode number * 2 + has arg
+
+
+class WrongTraceFormatError(Exception):
+    def __init__(self, reason):
+        super().__init__(f"Error: unable to read trace - {reason}")
+
+
+def encode_value(value):
+    if isinstance(value, Instruction):
+        has_arg = value.arg is not None
+        return TAG_INSTRUCTION + ISA[value.opcode].code * 2 + has_arg, int(value.arg) if has_arg else 0
+    if value is None:
+        return TAG_NONE, 0
+    if isinstance(value, int):
+        return TAG_INT, value
+    return TAG_OTHER, int(value)
+
+
+def decode_value(tag, value):
+    if tag >= TAG_INSTRUCTION:
+        code, has_arg = divmod(tag - TAG_INSTRUCTION, 2)
+        return OPCODES[code].value + str(value) if has_arg else OPCODES[code].value
+    if tag == TAG_NONE:
+        return None
+    return value
+
+
+def snapshot(control_unit):
+    dp = control_unit.data_path
+    values = [dp.ip, control_unit.cr, dp.ar, dp.dr, dp.br, dp.tos, *dp.data_stack.peek(TRACE_STACK_WORDS)]
+    values += [0] * (TRACE_VALUES - len(values))
+    tags, words = zip(*map(encode_value, values))
+    return control_unit._tick, len(dp.data_stack), tags, words
+
+
+class TraceRecorder:
+    # without a file keeps the last `capacity` records in a ring buffer,
+    # with a file the buffer is a chunk of the append-only trace file
+    def __init__(self, capacity=DEFAULT_CAPACITY, file=None):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * TRACE_RECORD.size)
+        self.count = 0
+        self.file = file
+        if file is not None:
+            file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, TRACE_RECORD.size))
+
+    def record(self, control_unit):
+        tick, depth, tags, words = snapshot(control_unit)
+        position = self.count % self.capacity
+        TRACE_RECORD.pack_into(self.buffer, position * TRACE_RECORD.size, tick, depth, *tags, *words)
+        self.count += 1
+        if self.file is not None and position == self.capacity - 1:
+            self.file.write(self.buffer)
+
+    def flush(self):
+        if self.file is None:
+            return
+        tail = self.count % self.capacity
+        if tail:
+            self.file.write(memoryview(self.buffer)[:tail * TRACE_RECORD.size])
+        self.file.flush()
+
+    def raw_records(self):
+        size = min(self.count, self.capacity)
+        start = self.count - size
+        view = memoryview(self.buffer)
+        for i in range(start, self.count):
+            position = (i % self.capacity) * TRACE_RECORD.size
+            yield view[position:position + TRACE_RECORD.size]
+
+    def records(self):
+        for raw in self.raw_records():
+            yield TRACE_RECORD.unpack(raw)
+
+
+def read_trace(trace_file):
+    with open(trace_file, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        magic, version, record_size = TRACE_HEADER.unpack_from(buffer)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION or record_size != TRACE_RECORD.size:
+            raise WrongTraceFormatError(f"unsupported format {magic!r} v{version}")
+        end = len(buffer) - (len(buffer) - TRACE_HEADER.size) % TRACE_RECORD.size
+        for offset in range(TRACE_HEADER.size, end, TRACE_RECORD.size):
+            yield buffer[offset:offset + TRACE_RECORD.size]
+
+
+def render(raw):
+    tick, depth, *fields = TRACE_RECORD.unpack(raw)
+    tags, words = fields[:TRACE_VALUES], fields[TRACE_VALUES:]
+    ip, cr, ar, dr, br, tos, *stack = map(decode_value, tags, words)
+    # DataStack is printed from the top without its bottom cell, like Stack.__repr__
+    shown = depth - 1
+    stack_text = "".join(str(value) + " " for value in stack[:max(shown, 0)])
+    if shown > TRACE_STACK_WORDS:
+        stack_text += "... "
+    return STATE_FORMAT.format(tick, ip, cr, ar, dr, br, "[" + str(tos) + " " + stack_text + "]")
+
+
+def digest(raw_records, every=DIGEST_EVERY):
+    # rolling sha256 over the records, intermediate digests allow to find the first diverged chunk
+    hasher = hashlib.sha256()
+    checkpoints = []
+    count = 0
+    for raw in raw_records:
+        hasher.update(raw)
+        count += 1
+        if count % every == 0:
+            checkpoints.append((count, hasher.hexdigest()))
+    return hasher.hexdigest(), checkpoints
+
+
+def main(trace_file, log_file=None):
+    if log_file is not None:
+        with open(log_file, "w", encoding="utf-8") as file:
+            for raw in read_trace(trace_file):
+                file.write(render(raw))
+                file.write("\n")
+    final, checkpoints = digest(read_trace(trace_file))
+    for count, value in checkpoints:
+        print("records: {} digest: {}".format(count, value))
+    print("digest:", final)
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (2, 3), "Wrong arguments: trace.py <trace_file> [<log_file>]"
+    main(*sys.argv[1:])
@@ -3,67 +3,251 @@ from __future__ import annotations
 import json
 import sys
 
-from src.isa import Addressing, CodeEncoder, Instruction, Opcode
+from src.isa import (
+    BINARY_HEADER,
+    BINARY_MAGIC,
+    BINARY_VERSION,
+    BINARY_WORD,
+    ISA,
+    Addressing,
+    CodeEncoder,
+    Instruction,
+    Opcode,
+    WordRangeError,
+    encode_code,
+    encode_word,
+)
 
+# bump on every change of the translation result, invalidates the translation cache
+TRANSLATOR_VERSION = 1
+
+# Single pass: source lines are read one by one, labels used before their definition are
+# remembered and backpatched when the label appears. Only unresolved references are kept in memory.
+PLACEHOLDER_ARG = "0"
+BINARY_SINK_CHUNK = 4096
+
+
+class TranslationError(Exception):
+    def __init__(self, line, reason):
+        super().__init__(f"Error: line {line}: {reason}")
+        self.line = line
+
+
+class CodeSink:
+    # keeps translated code in memory
+    def __init__(self):
+        self.code = []
+
+    def emit(self, instruction: Instruction):
+        self.code.append(instruction)
+
+    def patch(self, instruction: Instruction):
+        pass
+
+    def finish(self):
+        return self.code
+
+
+class MachineCodeSink(CodeSink):
+    # keeps code ready for DataPath: data words are stored as raw values, not as NOP instructions
+    def emit(self, instruction: Instruction):
+        self.code.append(instruction.arg if instruction.opcode is Opcode.NOP else instruction)
+
+
+class BinarySink:
+    # writes binary code straight to a seekable file, the last `chunk` words are kept in a buffer,
+    # so near forward references are patched in memory and only far ones seek back in the file
+    def __init__(self, file, chunk=BINARY_SINK_CHUNK):
+        self.file = file
+        self.chunk = chunk
+        self.start = file.tell()
+        self.count = 0
+        self.buffer = bytearray()
+        self.buffer_start = 0
+        file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0))
+
+    def emit(self, instruction: Instruction):
+        self.buffer += encode_word(instruction)
+        self.count += 1
+        if self.count - self.buffer_start >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+        self.buffer_start = self.count
+
+    def patch(self, instruction: Instruction):
+        if instruction.index >= self.buffer_start:
+            offset = (instruction.index - self.buffer_start) * BINARY_WORD.size
+            self.buffer[offset:offset + BINARY_WORD.size] = encode_word(instruction)
+            return
+        position = self.file.tell()
+        self.file.seek(self.start + BINARY_HEADER.size + instruction.index * BINARY_WORD.size)
+        self.file.write(encode_word(instruction))
+        self.file.seek(position)
+
+    def finish(self):
+        self.flush()
+        position = self.file.tell()
+        self.file.seek(self.start)
+        self.file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, self.count))
+        self.file.seek(position)
+        return self.count
+
+
+class SourceMap:
+    # machine address -> (source line, nearest label above, offset from the label)
+    # with a file every entry is written as a "address line label offset" row
+    def __init__(self, file=None):
+        self.file = file
+        self.entries = []
+
+    def add(self, address: int, line: int, label: str, offset: int):
+        if self.file is None:
+            self.entries.append((line, label, offset))
+        else:
+            self.file.write("{}\t{}\t{}\t{}\n".format(address, line, label, offset))
+
+    def describe(self, address: int) -> str:
+        if not 0 <= address < len(self.entries):
+            return "?"
+        line, label, offset = self.entries[address]
+        return "{}+{} (line {})".format(label, offset, line) if label else "line {}".format(line)
+
+
+def load_source_map(filename: str) -> SourceMap:
+    source_map = SourceMap()
+    with open(filename, encoding="utf-8") as file:
+        for row in file:
+            address, line, label, offset = row.rstrip("\n").split("\t")
+            assert int(address) == len(source_map.entries), "Source map is not ordered: {}".format(address)
+            source_map.entries.append((int(line), label, int(offset)))
+    return source_map
 
-def translate(text: str):
-    code = []
-    labels: dict[str, int] = {}
-    prog_position: int = 0
 
-    for line in text.splitlines():
+class Assembler:
+    def __init__(self, sink=None, source_map: SourceMap | None = None):
+        self.sink = CodeSink() if sink is None else sink
+        self.source_map = source_map
+        self.labels: dict[str, int] = {}
+        self.pending: dict[str, list] = {}  # label -> [(instruction, line)]
+        self.position = 0
+        self.label = ""
+        self.label_position = 0
+
+    def feed(self, number: int, line: str):
         token = line.split(";", 1)[0].strip()
         if token == "":
-            continue
+            return
 
         if token.endswith(":"):
-            label = token.strip(":")
-            assert label not in labels, "Redefinition of label: {}".format(label)
-            labels[label] = prog_position
+            self.define(number, token.strip(":"))
 
         elif " " in token:
             sub_tokens = token.split(" ")
-            assert len(sub_tokens) == 2, "Invalid instruction: {}".format(token)
+            if len(sub_tokens) != 2:
+                raise TranslationError(number, "invalid instruction: {}".format(token))
             mnemonic, arg = sub_tokens
             if mnemonic == "WORD":
-                code.append(Instruction(prog_position, Opcode.NOP, parse_number(arg)))
+                try:
+                    value = parse_number(arg)
+                except ValueError:
+                    raise TranslationError(number, "invalid number: {}".format(arg)) from None
+                self.emit(number, Instruction(self.position, Opcode.NOP, value))
             else:
-                opcode = Opcode(mnemonic)
-                code.append(Instruction(prog_position, opcode, arg))
-            prog_position += 1
+                instruction = Instruction(self.position, self.opcode(number, mnemonic, 1), arg)
+                self.resolve(number, instruction)
+                self.emit(number, instruction)
+        else:
+            self.emit(number, Instruction(self.position, self.opcode(number, token, 0),
+                                          addressing=Addressing.NONE.value))
+
+    def opcode(self, number: int, mnemonic: str, args: int) -> Opcode:
+        try:
+            return parse_opcode(mnemonic, args)
+        except ValueError as e:
+            raise TranslationError(number, str(e)) from None
+
+    def define(self, number: int, label: str):
+        if label in self.labels:
+            raise TranslationError(number, "redefinition of label: {}".format(label))
+        self.labels[label] = self.position
+        self.label, self.label_position = label, self.position
+        for instruction, _ in self.pending.pop(label, ()):
+            instruction.arg = str(self.position)
+            self.sink.patch(instruction)
+
+    def resolve(self, number: int, instruction: Instruction):
+        addressing, label = parse_argument(instruction.arg)
+        instruction.addressing = addressing.value
+        try:
+            instruction.arg = str(parse_number(label))
+        except ValueError:
+            pass
+        else:
+            return
+        if label in self.labels:
+            instruction.arg = str(self.labels[label])
         else:
-            opcode = Opcode(token)
-            code.append(Instruction(prog_position, opcode, addressing=Addressing.NONE.value))
-            prog_position += 1
-    return second_stage(code, labels)
-
-
-def second_stage(code: list, labels: dict[str, int]):
-    for instruction in code:
-        if instruction.opcode is Opcode.NOP:
-            continue
-        if instruction.arg is not None:
-            label = instruction.arg
-            addressing = Addressing.DIRECT_ABS
-            if label.startswith("["):
-                if label.endswith("]"):
-                    addressing = Addressing.DIRECT_SHIFT
-                elif label.endswith("]+"):
-                    addressing = Addressing.POST_INC
-                elif label.endswith("]-"):
-                    addressing = Addressing.POST_DEC
-            elif label.startswith("#"):
-                addressing = Addressing.LOAD
-            label = label.strip("#[]+-")
-            instruction.addressing = addressing.value
-            try:
-                instruction.arg = str(parse_number(label))
-                continue
-            except ValueError:
-                pass
-            assert label in labels, "Label not defined: {}".format(label)
-            instruction.arg = str(labels[label])
-    return code
+            instruction.arg = PLACEHOLDER_ARG
+            self.pending.setdefault(label, []).append((instruction, number))
+
+    def emit(self, number: int, instruction: Instruction):
+        try:
+            self.sink.emit(instruction)
+        except WordRangeError as e:
+            raise TranslationError(number, "value {} of word {} does not fit binary code".format(
+                e.value, e.index)) from None
+        if self.source_map is not None:
+            self.source_map.add(self.position, number, self.label, self.position - self.label_position)
+        self.position += 1
+
+    def finish(self):
+        if self.pending:
+            label, uses = min(self.pending.items(), key=lambda item: item[1][0][1])
+            raise TranslationError(uses[0][1], "label not defined: {}".format(label))
+        return self.sink.finish()
+
+
+def assemble(lines, sink=None, source_map: SourceMap | None = None):
+    # lines is any iterable of source lines, e.g. an opened file
+    return assemble_numbered(enumerate(lines, 1), sink, source_map)
+
+
+def assemble_numbered(numbered_lines, sink=None, source_map: SourceMap | None = None):
+    # (line number, line) pairs, lines may be skipped or rewritten by earlier stages
+    assembler = Assembler(sink, source_map)
+    for number, line in numbered_lines:
+        assembler.feed(number, line)
+    return assembler.finish()
+
+
+def translate(text: str):
+    return assemble(text.splitlines())
+
+
+def parse_argument(arg: str) -> tuple[Addressing, str]:
+    addressing = Addressing.DIRECT_ABS
+    if arg.startswith("["):
+        if arg.endswith("]"):
+            addressing = Addressing.DIRECT_SHIFT
+        elif arg.endswith("]+"):
+            addressing = Addressing.POST_INC
+        elif arg.endswith("]-"):
+            addressing = Addressing.POST_DEC
+    elif arg.startswith("#"):
+        addressing = Addressing.LOAD
+    return addressing, arg.strip("#[]+-")
+
+
+def parse_opcode(mnemonic: str, args: int) -> Opcode:
+    if mnemonic not in ISA:
+        raise ValueError("unknown instruction: {}".format(mnemonic))
+    info = ISA[mnemonic]
+    if info.args != args:
+        raise ValueError("instruction {} expects {} argument(s)".format(mnemonic, info.args))
+    return info.opcode
 
 
 def parse_number(label: str) -> int:
@@ -77,17 +261,41 @@ def write_code(filename: str, code: list):
         file.write(json.dumps(code, cls=CodeEncoder, indent=4))
 
 
-def main(source: str, target: str):
+def write_binary_code(filename: str, code: list):
+    # encoded before the file is opened, so a word out of range does not leave a broken file
+    binary = encode_code(code)
+    with open(filename, "wb") as file:
+        file.write(binary)
+
+
+def main(source: str, target: str, binary_target: str | None = None, translate_text=translate):
     with open(source, encoding="utf-8") as f:
         source_text = f.read()
 
-    code = translate(source_text)
+    code = translate_text(source_text)
 
     write_code(target, code)
+    if binary_target is not None:
+        write_binary_code(binary_target, code)
     print("source LoC:", len(source.split("\n")), "code instr:", len(code))
 
 
+def main_stream(source: str, binary_target: str, source_map_target: str | None = None):
+    # bounded memory: neither the source nor the code is kept, only unresolved references
+    with open(source, encoding="utf-8") as f, open(binary_target, "wb") as target:
+        if source_map_target is None:
+            count = assemble(f, BinarySink(target))
+        else:
+            with open(source_map_target, "w", encoding="utf-8") as map_file:
+                count = assemble(f, BinarySink(target), SourceMap(map_file))
+    print("code instr:", count)
+
+
 if __name__ == "__main__":
-    assert len(sys.argv) == 3, "Wrong arguments: translator.py <input_file> <target_file>"
-    _, src, tar = sys.argv
-    main(src, tar)
+    if len(sys.argv) > 1 and sys.argv[1] == "--stream":
+        assert len(sys.argv) in (4, 5), (
+            "Wrong arguments: translator.py --stream <input_file> <binary_file> [<source_map_file>]")
+        main_stream(*sys.argv[2:])
+    else:
+        assert len(sys.argv) in (3, 4), "Wrong arguments: translator.py <input_file> <target_file> [<binary_file>]"
+        main(*sys.argv[1:])
@@ -0,0 +1,452 @@
+import io
+import json
+import logging
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # optional, `poetry install -E vector`
+    np = None
+
+from src.batch import list_inputs, simulate_case
+from src.components.alu import SIGN_BIT, WORD_MASK
+from src.isa import (
+    ADDRESSING_TICKS,
+    BLOCK_WORD_TICKS,
+    BRANCH_TAKEN_TICKS,
+    FETCH_TICKS,
+    ISA,
+    Addressing,
+    Instruction,
+    Opcode,
+    OpcodeKind,
+)
+from src.machine import INSTRUCTION_LIMIT, STACK_SIZE, IOController, load_code, load_input
+
+# Lockstep engine for one program and many inputs: IP, TOS, both stacks, memory, input and output of N
+# machine instances are rows of NumPy arrays. Every step executes one instruction on every running instance,
+# instances are grouped by (opcode, addressing) of the cell at their IP and a group is executed with array
+# operations. The microsteps of ControlUnit are folded into their net effect: AR, DR, BR and the ALU latches
+# do not outlive an instruction, the next fetch recomputes them.
+# An instance that leaves the supported subset (writes to instruction cells, instruction cells read as data,
+# addresses out of memory, stack errors, exhausted input, division by zero) is rerun from the start with the
+# fast engine, so its result or error is the one of a separate run.
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+OUTPUT_CHUNK = 16
+
+STACK_EFFECTS = {
+    Addressing.NONE.value: "",
+    Addressing.DIRECT_ABS.value: "+-",
+    Addressing.LOAD.value: "",
+    Addressing.DIRECT_SHIFT.value: "++-",
+    Addressing.POST_INC.value: "+-",
+    Addressing.POST_DEC.value: "+-",
+    Opcode.LD: "+",
+    Opcode.SWAP: "-+",
+    Opcode.DUP: "+",
+    Opcode.POP: "-",
+    Opcode.INB: "-",
+    Opcode.OUTB: "-",
+    Opcode.MOVB: "--",
+}
+
+
+def word(values):
+    # ALU.set_flags truncation, int64 arithmetic wraps modulo 2**64 so the low 32 bits are exact
+    return ((values + SIGN_BIT) & WORD_MASK) - SIGN_BIT
+
+
+def div_toward_zero(x, y):
+    quotient = np.abs(x) // np.abs(y)
+    return np.where((x < 0) == (y < 0), quotient, -quotient)
+
+
+# ISA lambdas work on arrays except the ones with Python conditionals
+VECTOR_ALU = {
+    Opcode.DIV: div_toward_zero,
+    Opcode.BEQ: lambda x, y: x == y,
+    Opcode.BGT: lambda x, y: x >= y,
+    Opcode.BLT: lambda x, y: x <= y,
+}
+
+
+class NumpyRequiredError(Exception):
+    def __init__(self):
+        super().__init__("Error: vector engine requires numpy (poetry install -E vector)")
+
+
+class Operation:
+    # one (opcode, addressing) pair of the program
+    def __init__(self, opcode, addressing):
+        self.info = ISA[opcode]
+        self.opcode = self.info.opcode
+        self.addressing = addressing
+        self.ticks = FETCH_TICKS + ADDRESSING_TICKS[addressing] + self.info.ticks
+        self.alu = VECTOR_ALU.get(self.opcode, self.info.alu)
+        effects = STACK_EFFECTS[addressing] + STACK_EFFECTS.get(self.opcode, "")
+        if self.info.kind in {OpcodeKind.ALU, OpcodeKind.BRANCH} and self.info.operands == 2:
+            effects += "-"
+        self.low, self.high = stack_bounds(effects)
+
+
+def stack_bounds(effects):
+    # data stack depths before the instruction for which no push overflows and no pop underflows
+    depth, low, high = 0, 0, STACK_SIZE
+    for effect in effects:
+        if effect == "+":
+            high = min(high, STACK_SIZE - 1 - depth)
+            depth += 1
+        else:
+            low = max(low, 1 - depth)
+            depth -= 1
+    return low, high
+
+
+def fits(value):
+    return isinstance(value, int) and INT64_MIN <= value <= INT64_MAX
+
+
+def decode(cell):
+    if not isinstance(cell, Instruction):
+        return None
+    info = ISA.get(cell.opcode)
+    if info is None or cell.addressing not in ADDRESSING_TICKS:
+        return None
+    try:
+        arg = 0 if cell.addressing == Addressing.NONE.value else cell.get_arg()
+    except (ValueError, TypeError):
+        return None
+    return (info.opcode, cell.addressing, arg) if fits(arg) else None
+
+
+def token_values(input_tokens):
+    # IOController.get writes characters as their codes, None if a token can not be a memory word
+    if not input_tokens or not isinstance(input_tokens[0], int) or input_tokens[0] < 0:
+        return None
+    try:
+        values = [token if isinstance(token, int) else ord(token) for token in input_tokens]
+    except TypeError:
+        return None
+    return values if all(map(fits, values)) else None
+
+
+class VectorMachine:
+    def __init__(self, code, inputs, limit):
+        count = len(inputs)
+        self.limit = limit
+        self.fallback = np.zeros(count, dtype=bool)
+        values = []
+        for number, input_tokens in enumerate(inputs):
+            values.append(token_values(input_tokens))
+            if values[-1] is None:
+                self.fallback[number] = True
+        self.size = np.array([len(code) + (v[0] if v is not None else 0) for v in values], dtype=np.int64)
+        width = max(int(self.size.max(initial=0)), len(code), 1)
+
+        # static per cell tables, instructions are never changed by an instance that stays here
+        self.operations = []
+        keys = {}
+        self.cells = np.full(width, -1, dtype=np.int64)
+        self.args = np.zeros(width, dtype=np.int64)
+        self.objects = np.zeros(width, dtype=bool)
+        row = np.zeros(width, dtype=np.int64)
+        for address, cell in enumerate(code):
+            if fits(cell):
+                row[address] = cell
+                continue
+            self.objects[address] = True
+            decoded = decode(cell)
+            if decoded is None:
+                continue
+            opcode, addressing, arg = decoded
+            if (opcode, addressing) not in keys:
+                keys[opcode, addressing] = len(self.operations)
+                self.operations.append(Operation(opcode, addressing))
+            self.cells[address] = keys[opcode, addressing]
+            self.args[address] = arg
+
+        self.object_prefix = np.concatenate([[0], np.cumsum(self.objects)])
+        self.memory = np.tile(row, (count, 1))
+        self.ip = np.ones(count, dtype=np.int64)
+        self.tos = np.zeros(count, dtype=np.int64)
+        self.stack = np.zeros((count, STACK_SIZE), dtype=np.int64)
+        self.depth = np.zeros(count, dtype=np.int64)
+        self.return_stack = np.zeros((count, STACK_SIZE), dtype=np.int64)
+        self.return_depth = np.zeros(count, dtype=np.int64)
+        self.ticks = np.zeros(count, dtype=np.int64)
+        self.instructions = np.zeros(count, dtype=np.int64)
+        self.halted = np.zeros(count, dtype=bool)
+
+        self.input = np.zeros((count, max((len(v) for v in values if v is not None), default=1)), dtype=np.int64)
+        self.input_length = np.zeros(count, dtype=np.int64)
+        for number, tokens in enumerate(values):
+            if tokens is not None:
+                self.input[number, :len(tokens)] = tokens
+                self.input_length[number] = len(tokens)
+        self.input_position = np.zeros(count, dtype=np.int64)
+        self.output = np.zeros((count, OUTPUT_CHUNK), dtype=np.int64)
+        self.output_length = np.zeros(count, dtype=np.int64)
+
+    def running(self):
+        return np.flatnonzero(~(self.fallback | self.halted))
+
+    def run(self):
+        step = 0
+        active = self.running()
+        while active.size and step < self.limit:
+            ip = self.ip[active]
+            inside = (ip >= 0) & (ip < self.size[active])
+            keys = np.where(inside, self.cells[np.where(inside, ip, 0)], -1)
+            # data words and cells the table does not support
+            self.fallback[active[keys < 0]] = True
+
+            order = np.argsort(keys, kind="stable")
+            keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            for start, end in zip(starts, [*starts[1:], keys.size]):
+                if keys[start] >= 0:
+                    self.execute(self.operations[keys[start]], active[order[start:end]], step)
+            step += 1
+            active = self.running()
+        self.instructions[active] = step
+
+    def outside(self, sel, address):
+        return (address < 0) | (address >= self.size[sel])
+
+    def address(self, operation, sel):
+        # (AR, value of the address stage, DR, DR is not a word, POST_INC/POST_DEC update, errors)
+        ip = self.ip[sel]
+        arg = self.args[ip]
+        addressing = operation.addressing
+        bad = (self.depth[sel] < operation.low) | (self.depth[sel] > operation.high)
+        if addressing == Addressing.NONE.value:
+            return ip, ip + 1, None, np.ones(sel.size, dtype=bool), None, bad
+        if addressing == Addressing.LOAD.value:
+            return ip, arg, arg, np.zeros(sel.size, dtype=bool), None, bad
+
+        update = None
+        if addressing == Addressing.DIRECT_ABS.value:
+            value = arg
+        elif addressing == Addressing.DIRECT_SHIFT.value:
+            # the ALU still holds IP of the fetch as the first operand
+            value = word(ip + ip + 1)
+        else:
+            bad |= self.outside(sel, arg)
+            arg = np.where(bad, 0, arg)
+            bad |= self.objects[arg]
+            value = self.memory[sel, arg]
+            step = 1 if addressing == Addressing.POST_INC.value else -1
+            update = (arg, word(value + step))
+        bad |= self.outside(sel, value)
+        value = np.where(bad, 0, value)
+        data = self.memory[sel, value]
+        if update is not None:
+            data = np.where(value == update[0], update[1], data)
+        return value, value, data, self.objects[value], update, bad
+
+    def check(self, operation, sel, ar, dr_object):
+        opcode = operation.opcode
+        if opcode == Opcode.LD:
+            return dr_object
+        if opcode == Opcode.ST:
+            return self.outside(sel, ar) | self.objects[np.where(self.outside(sel, ar), 0, ar)]
+        if opcode == Opcode.CALL:
+            return self.return_depth[sel] >= STACK_SIZE
+        if opcode == Opcode.RET:
+            return self.return_depth[sel] == 0
+        if opcode in {Opcode.IN, Opcode.OUT}:
+            bad = self.outside(sel, 0) | self.objects[0]
+            if opcode == Opcode.IN:
+                bad |= self.input_position[sel] >= self.input_length[sel]
+            return bad
+        if opcode == Opcode.DIV:
+            x, y, _ = self.operands(operation, sel)
+            return (y == 0) | (x == INT64_MIN) | (y == INT64_MIN)
+        if opcode in {Opcode.INB, Opcode.OUTB, Opcode.MOVB}:
+            count, adr, source = self.operands(operation, sel)
+            bad = self.bad_range(sel, adr, count)
+            if opcode == Opcode.INB:
+                bad |= (count > 0) & (self.input_position[sel] + count > self.input_length[sel])
+            elif opcode == Opcode.MOVB:
+                bad |= self.bad_range(sel, source, count)
+            return bad
+        return np.zeros(sel.size, dtype=bool)
+
+    def operands(self, operation, sel):
+        # TOS and two cells of DataStack below it as they are after the address stage
+        depth = self.depth[sel]
+        if operation.addressing == Addressing.DIRECT_SHIFT.value:
+            return self.args[self.ip[sel]], self.tos[sel], self.stack[sel, np.maximum(depth - 1, 0)]
+        return self.tos[sel], self.stack[sel, np.maximum(depth - 1, 0)], self.stack[sel, np.maximum(depth - 2, 0)]
+
+    def bad_range(self, sel, start, count):
+        # a nonempty range out of memory or with objects in it
+        end = start + count
+        outside = (start < 0) | (end > self.size[sel])
+        skip = outside | (count <= 0)
+        objects = self.object_prefix[np.where(skip, 0, end)] - self.object_prefix[np.where(skip, 0, start)]
+        return (count > 0) & (outside | (objects > 0))
+
+    def push(self, sel, values):
+        depth = self.depth[sel]
+        self.stack[sel, depth] = values
+        self.depth[sel] = depth + 1
+
+    def pop(self, sel):
+        depth = self.depth[sel] - 1
+        self.depth[sel] = depth
+        return self.stack[sel, depth]
+
+    def execute(self, operation, sel, step):
+        ar, value, dr, dr_object, update, bad = self.address(operation, sel)
+        bad |= self.check(operation, sel, ar, dr_object)
+        if bad.any():
+            self.fallback[sel[bad]] = True
+            sel = sel[~bad]
+            ar, value, dr, dr_object, update, bad = self.address(operation, sel)
+
+        ip = self.ip[sel] + 1
+        if operation.addressing == Addressing.DIRECT_SHIFT.value:
+            self.push(sel, self.tos[sel])
+            self.tos[sel] = self.args[ip - 1]
+        elif update is not None:
+            self.memory[sel, update[0]] = update[1]
+        self.ip[sel] = ip
+        self.ticks[sel] += operation.ticks
+
+        opcode = operation.opcode
+        kind = operation.info.kind
+        if kind is OpcodeKind.ALU:
+            second = self.pop(sel) if operation.info.operands == 2 else 0
+            self.tos[sel] = word(operation.alu(self.tos[sel], second))
+        elif kind is OpcodeKind.BRANCH:
+            taken = operation.alu(self.tos[sel], self.pop(sel)).astype(np.int64)
+            self.ip[sel] = ip + taken
+            self.ticks[sel] += taken * BRANCH_TAKEN_TICKS
+        elif opcode == Opcode.LD:
+            self.push(sel, self.tos[sel])
+            self.tos[sel] = dr
+        elif opcode == Opcode.ST:
+            self.memory[sel, ar] = self.tos[sel]
+        elif opcode in {Opcode.JUMP, Opcode.CALL}:
+            if opcode == Opcode.CALL:
+                depth = self.return_depth[sel]
+                self.return_stack[sel, depth] = ip
+                self.return_depth[sel] = depth + 1
+            self.ip[sel] = value
+        elif opcode == Opcode.RET:
+            depth = self.return_depth[sel] - 1
+            self.return_depth[sel] = depth
+            self.ip[sel] = self.return_stack[sel, depth]
+        elif opcode == Opcode.SWAP:
+            top = self.depth[sel] - 1
+            self.tos[sel], self.stack[sel, top] = self.stack[sel, top], self.tos[sel]
+        elif opcode == Opcode.DUP:
+            self.push(sel, self.tos[sel])
+        elif opcode == Opcode.POP:
+            self.tos[sel] = self.pop(sel)
+        elif opcode == Opcode.IN:
+            position = self.input_position[sel]
+            self.memory[sel, 0] = self.input[sel, position]
+            self.input_position[sel] = position + 1
+        elif opcode == Opcode.OUT:
+            self.send(sel)
+        elif opcode in {Opcode.INB, Opcode.OUTB, Opcode.MOVB}:
+            count = self.tos[sel]
+            adr = self.pop(sel)
+            source = self.pop(sel) if opcode == Opcode.MOVB else None
+            self.block(opcode, sel, adr, count, source)
+            self.ticks[sel] += np.maximum(count, 0) * BLOCK_WORD_TICKS
+            self.tos[sel] = word(count + adr)
+        elif opcode == Opcode.HLT:
+            # HLT is not counted, its fetch ticks are spent
+            self.halted[sel] = True
+            self.instructions[sel] = step
+
+    def send(self, sel):
+        length = self.output_length[sel]
+        self.reserve_output(int(length.max()) + 1)
+        self.output[sel, length] = self.memory[sel, 0]
+        self.output_length[sel] = length + 1
+
+    def reserve_output(self, length):
+        while length > self.output.shape[1]:
+            self.output = np.concatenate([self.output, np.zeros_like(self.output)], axis=1)
+
+    def block(self, opcode, sel, adr, count, source):
+        # ranges differ in length, so every instance copies its own slice
+        if opcode == Opcode.OUTB:
+            self.reserve_output(int((self.output_length[sel] + np.maximum(count, 0)).max()))
+        for i, number in enumerate(sel.tolist()):
+            start, length = int(adr[i]), int(count[i])
+            if length <= 0:
+                continue
+            if opcode == Opcode.INB:
+                position = self.input_position[number]
+                self.memory[number, start:start + length] = self.input[number, position:position + length]
+                self.input_position[number] = position + length
+            elif opcode == Opcode.OUTB:
+                position = self.output_length[number]
+                self.output[number, position:position + length] = self.memory[number, start:start + length]
+                self.output_length[number] = position + length
+            else:
+                first = int(source[i])
+                self.memory[number, start:start + length] = self.memory[number, first:first + length].copy()
+
+    def result(self, number, input_tokens, output_mode):
+        if not self.halted[number]:
+            logging.warning("Limit exceeded!")
+            return {"output": "", "instructions": int(self.instructions[number]), "ticks": int(self.ticks[number])}
+        output = io.StringIO()
+        io_controller = IOController(None, input_tokens, 0, output, output_mode)
+        io_controller.outputBuffer = self.output[number, :self.output_length[number]].tolist()
+        try:
+            io_controller.finish()
+        except Exception as e:
+            return {"error": "{}: {}".format(type(e).__name__, e)}
+        return {"output": output.getvalue(), "instructions": int(self.instructions[number]),
+                "ticks": int(self.ticks[number])}
+
+
+def vector_simulation(code, inputs, limit, output_mode):
+    # one result per input tokens list, the same dicts as batch.simulate_case returns
+    if np is None:
+        raise NumpyRequiredError
+    vector_machine = VectorMachine(code, inputs, limit)
+    vector_machine.run()
+    results = []
+    for number, input_tokens in enumerate(inputs):
+        if vector_machine.fallback[number]:
+            results.append(simulate_case(code, input_tokens, output_mode, limit))
+        else:
+            results.append(vector_machine.result(number, input_tokens, output_mode))
+    logging.info("vector engine: %d of %d instances rerun", int(vector_machine.fallback.sum()), len(inputs))
+    return results
+
+
+def main(code_file, inputs, result_file, output_mode):
+    results = []
+    loaded = []  # (result, input tokens) of the cases with a readable input
+    for name in list_inputs(inputs):
+        result = {"case": name}
+        results.append(result)
+        # a broken input fails its own case only, as in batch.run_case
+        try:
+            loaded.append((result, load_input(name)))
+        except Exception as e:
+            result["error"] = "{}: {}".format(type(e).__name__, e)
+    simulated = vector_simulation(load_code(code_file), [tokens for _, tokens in loaded], INSTRUCTION_LIMIT, output_mode)
+    for (result, _), case in zip(loaded, simulated):
+        result.update(case)
+
+    with open(result_file, "w", encoding="utf-8") as file:
+        file.write(json.dumps(results, indent=4))
+    failed = sum(1 for result in results if "error" in result)
+    print("cases: {} failed: {}".format(len(results), failed))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 5, (
+        "Wrong arguments: vector.py <code_file> <inputs_dir_or_manifest> <result_file> <output_mode>")
+    main(*sys.argv[1:])